@@ -0,0 +1,400 @@
+"""
+This code runs the analyses listed in one or more experiment manifests.
+
+A manifest (JSON) names a set of transfer functions and the analyses to run on them:
+
+    {
+        "name": "margins",
+        "systems": {
+            "G1": {"num": [1], "den": [1, 1], "label": "Stable 1st-Order"}
+        },
+        "analyses": [
+            {"analysis": "margin"},
+            {"analysis": "bode_plot", "params": {"omega": {"logspace": [-2, 2, 1000]}}},
+            {"analysis": "pzmap_plot", "systems": ["G1"]}
+        ]
+    }
+
+Every (system, analysis, parameters) triple becomes a node in a dependency graph, e.g.
+a Bode plot depends on the frequency response and the margins of the same system.
+Nodes are keyed on the normalized system coefficients, so identical nodes coming from
+different manifests (or from scaled copies of the same transfer function) are computed
+exactly once.  Independent nodes run in parallel worker processes.  Plots are written to
+<label>_<analysis>_<digest>.pdf, with a digest of the node key, so that different nodes
+whose systems share a label do not overwrite each other.
+
+Usage:
+    python analysis_tools/analysis_scheduler.py analysis_tools/manifests/*.json --output plots/
+
+With --cache-dir, numeric results are also kept on disk (result_cache.py) and reused by
+later runs; plots are always rendered.
+
+"""
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+import control as ct
+from matplotlib.figure import Figure
+
+
+# === Manifest parsing ===
+def load_manifest(path):
+    """Reads a manifest file and checks its structure."""
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    for name, spec in manifest.get('systems', {}).items():
+        if 'num' not in spec or 'den' not in spec:
+            raise ValueError(f"{path}: system '{name}' needs 'num' and 'den'")
+    for entry in manifest.get('analyses', []):
+        if entry.get('analysis') not in ANALYSES:
+            raise ValueError(f"{path}: unknown analysis '{entry.get('analysis')}'")
+        for name in entry.get('systems', []):
+            if name not in manifest['systems']:
+                raise ValueError(f"{path}: analysis refers to unknown system '{name}'")
+    return manifest
+
+
+def normalize_tf(num, den):
+    """Strips leading zeros and scales num/den so that den is monic."""
+    num = np.trim_zeros(np.asarray(num, dtype=float), 'f')
+    den = np.trim_zeros(np.asarray(den, dtype=float), 'f')
+    if len(den) == 0:
+        raise ValueError("denominator must be nonzero")
+    if len(num) == 0:
+        num = np.zeros(1)
+    return num / den[0], den / den[0]
+
+
+def system_key(num, den, digits=12):
+    """Canonical key of a SISO transfer function (scaled num/den pairs map to the same key)."""
+    num, den = normalize_tf(num, den)
+    fmt = lambda p: ','.join(f"{c:.{digits}g}" for c in p)
+    return f"tf[{fmt(num)}/{fmt(den)}]"
+
+
+def params_key(params):
+    return json.dumps(params or {}, sort_keys=True, separators=(',', ':'))
+
+
+def materialize(value):
+    """Expands grid specifications such as {"logspace": [-2, 2, 1000]} into arrays."""
+    if isinstance(value, dict) and len(value) == 1:
+        (kind, args), = value.items()
+        if kind in ('logspace', 'linspace'):
+            start, stop, num = args
+            return getattr(np, kind)(start, stop, int(num))
+    return value
+
+
+# === Analyses ===
+# Each analysis is a function f(system, deps, **params) and a function that lists its
+# dependencies as (analysis, params) pairs for the same system.
+def _poles(G, deps):
+    return ct.poles(G)
+
+
+def _zeros(G, deps):
+    return ct.zeros(G)
+
+
+def _margin(G, deps):
+    return tuple(float(v) for v in ct.margin(G))
+
+
+def _dcgain(G, deps):
+    return ct.dcgain(G)
+
+
+def _freqresp(G, deps, omega=None):
+    omega = np.logspace(-2, 2, 1000) if omega is None else materialize(omega)
+    response = ct.frequency_response(G, omega)
+    return np.asarray(response.magnitude), np.asarray(response.phase), np.asarray(response.omega)
+
+
+def _step(G, deps, T=None):
+    T = np.linspace(0, 10, 500) if T is None else materialize(T)
+    T, y = ct.step_response(G, T)
+    return np.asarray(T), np.asarray(y)
+
+
+def _bode_plot(G, deps, filename, label, omega=None):
+    mag, phase, omega_out = deps['freqresp']
+    gm, pm, wgc, wpc = deps['margin']
+
+    fig = Figure(figsize=(8, 6))
+    ax_mag, ax_phase = fig.subplots(2, 1, sharex=True)
+    ax_mag.semilogx(omega_out, 20 * np.log10(mag), label='|G(jω)| [dB]')
+    ax_phase.semilogx(omega_out, np.degrees(phase), label='∠G(jω) [deg]', color='orange')
+    if np.isfinite(wgc):
+        ax_phase.axvline(wgc, color='red', linestyle='--', label=f'PM ≈ {pm:.1f}° @ {wgc:.2f} rad/s')
+    if np.isfinite(wpc) and gm not in [np.inf, 0]:
+        ax_mag.axvline(wpc, color='green', linestyle='--',
+                       label=f'GM ≈ {20 * np.log10(gm):.1f} dB @ {wpc:.2f} rad/s')
+    ax_mag.set_title(f"Bode Plot: {label}")
+    ax_mag.set_ylabel("Magnitude (dB)")
+    ax_phase.set_ylabel("Phase (deg)")
+    ax_phase.set_xlabel("Frequency (rad/s)")
+    for ax in (ax_mag, ax_phase):
+        ax.grid(True)
+        ax.legend()
+    fig.savefig(filename, bbox_inches='tight')
+    return filename
+
+
+def _nyquist_plot(G, deps, filename, label, omega=None):
+    mag, phase, omega_out = deps['freqresp']
+    resp = mag * np.exp(1j * phase)
+
+    fig = Figure(figsize=(6, 6))
+    ax = fig.subplots()
+    ax.plot(resp.real, resp.imag, 'b', label='Nyquist Curve')
+    ax.plot(resp.real, -resp.imag, 'b--')
+    ax.plot(-1, 0, 'rx', markersize=10, label='Critical Point (-1)')
+    ax.axhline(0, color='k', linestyle='--', linewidth=0.5)
+    ax.axvline(0, color='k', linestyle='--', linewidth=0.5)
+    ax.set_title(f"Nyquist Plot: {label}")
+    ax.set_xlabel("Re[G(jω)]")
+    ax.set_ylabel("Im[G(jω)]")
+    ax.grid(True)
+    ax.legend()
+    fig.savefig(filename)
+    return filename
+
+
+def _pzmap_plot(G, deps, filename, label):
+    poles, zeros = deps['poles'], deps['zeros']
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(np.real(poles), np.imag(poles), 'x', markersize=10, label='Poles')
+    ax.plot(np.real(zeros), np.imag(zeros), 'o', fillstyle='none', markersize=10, label='Zeros')
+    ax.axhline(0, color='k', linestyle='--', linewidth=0.5)
+    ax.axvline(0, color='k', linestyle='--', linewidth=0.5)
+    ax.set_title(f"Pole-Zero Map: {label}")
+    ax.set_xlabel("Re(s)")
+    ax.set_ylabel("Im(s)")
+    ax.grid(True)
+    ax.legend()
+    fig.savefig(filename)
+    return filename
+
+
+def _step_plot(G, deps, filename, label, T=None):
+    T, y = deps['step']
+
+    fig = Figure()
+    ax = fig.subplots()
+    ax.plot(T, y)
+    ax.set_title(f"Step Response: {label}")
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("Output")
+    ax.grid(True)
+    fig.savefig(filename)
+    return filename
+
+
+def _freq_params(params):
+    return {'omega': params['omega']} if 'omega' in params else {}
+
+
+def _step_params(params):
+    return {'T': params['T']} if 'T' in params else {}
+
+
+# name: (function, dependencies, renders a file)
+ANALYSES = {
+    'poles': (_poles, lambda p: [], False),
+    'zeros': (_zeros, lambda p: [], False),
+    'margin': (_margin, lambda p: [], False),
+    'dcgain': (_dcgain, lambda p: [], False),
+    'freqresp': (_freqresp, lambda p: [], False),
+    'step': (_step, lambda p: [], False),
+    'bode_plot': (_bode_plot, lambda p: [('freqresp', _freq_params(p)), ('margin', {})], True),
+    'nyquist_plot': (_nyquist_plot, lambda p: [('freqresp', _freq_params(p))], True),
+    'pzmap_plot': (_pzmap_plot, lambda p: [('poles', {}), ('zeros', {})], True),
+    'step_plot': (_step_plot, lambda p: [('step', _step_params(p))], True),
+}
+
+
+# === Dependency graph ===
+class Node:
+    """One unique (system, analysis, parameters) computation."""
+
+    def __init__(self, key, system, analysis, params):
+        self.key = key
+        self.system = system        # (num, den), normalized
+        self.analysis = analysis
+        self.params = params
+        self.deps = {}              # analysis name -> Node
+        self.requested_by = []      # (manifest, system name) pairs
+        self.label = None
+
+
+class AnalysisGraph:
+    """Collects nodes from manifests and deduplicates them by key."""
+
+    def __init__(self):
+        self.nodes = {}
+        self.n_requested = 0
+
+    def add_manifest(self, manifest):
+        systems = manifest['systems']
+        for entry in manifest['analyses']:
+            names = entry.get('systems', list(systems))
+            for name in names:
+                spec = systems[name]
+                node = self._add(spec['num'], spec['den'], entry['analysis'], entry.get('params', {}))
+                node.requested_by.append((manifest['name'], name))
+                if node.label is None:
+                    node.label = spec.get('label', name)
+                self.n_requested += 1
+
+    def _add(self, num, den, analysis, params):
+        num, den = normalize_tf(num, den)
+        key = (system_key(num, den), analysis, params_key(params))
+        if key not in self.nodes:
+            node = Node(key, (num, den), analysis, params)
+            for dep_analysis, dep_params in ANALYSES[analysis][1](params):
+                node.deps[dep_analysis] = self._add(num, den, dep_analysis, dep_params)
+            self.nodes[key] = node
+        return self.nodes[key]
+
+
+def node_filename(key, label, output):
+    """Output file of a render node: its label and analysis, made unique by a digest of the key."""
+    stem = label.lower().replace(" ", "_").replace(",", "")
+    digest = hashlib.blake2b(json.dumps(list(key)).encode(), digest_size=4).hexdigest()
+    return os.path.join(output, f"{stem}_{key[1]}_{digest}.pdf")
+
+
+def _run_node(analysis, system, params, dep_results):
+    """Executes a single node (in a worker process); render nodes get label and filename in params."""
+    func = ANALYSES[analysis][0]
+    G = ct.tf(*system)
+    start = time.perf_counter()
+    result = func(G, dep_results, **params)
+    return result, time.perf_counter() - start
+
+
+def execute(graph, output=None, workers=None, executor='process', cache=None):
+    """
+    Runs every node of the graph once, as soon as its dependencies are available.
+
+    Render nodes are skipped when no output directory is given.  With a ResultCache,
+    numeric nodes are looked up there first and stored after running.  Returns a dict
+    mapping node keys to results and a dict of per-node run times.
+    """
+    nodes = [node for node in graph.nodes.values() if output is not None or not ANALYSES[node.analysis][2]]
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+
+    results, timings = {}, {}
+    pending = {node.key: node for node in nodes}
+    running = {}
+
+    pool_class = {'process': ProcessPoolExecutor, 'thread': ThreadPoolExecutor}.get(executor)
+    pool = pool_class(max_workers=workers) if pool_class else None
+    try:
+        while pending or running:
+            ready = [node for node in pending.values() if all(dep.key in results for dep in node.deps.values())]
+            for node in ready:
+                del pending[node.key]
+                cacheable = cache is not None and not ANALYSES[node.analysis][2]
+                if cacheable:
+                    value = cache.get(node.key)
+                    if value is not None:
+                        results[node.key], timings[node.key] = value, 0.0
+                        continue
+                dep_results = {name: results[dep.key] for name, dep in node.deps.items()}
+                params = dict(node.params)
+                if ANALYSES[node.analysis][2]:
+                    params['label'] = node.label
+                    params['filename'] = node_filename(node.key, node.label, output)
+                args = (node.analysis, node.system, params, dep_results)
+                if pool is None:
+                    results[node.key], timings[node.key] = _run_node(*args)
+                    if cacheable:
+                        cache.put(node.key, results[node.key])
+                else:
+                    running[pool.submit(_run_node, *args)] = node
+            if not running:
+                if pending and not ready:
+                    raise RuntimeError("dependency cycle in analysis graph")
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                node = running.pop(future)
+                results[node.key], timings[node.key] = future.result()
+                if cache is not None and not ANALYSES[node.analysis][2]:
+                    cache.put(node.key, results[node.key])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return results, timings
+
+
+def print_summary(graph, results):
+    """Prints poles, zeros and margins for every system, as the analysis scripts do."""
+    aliases = {}
+    for node in graph.nodes.values():
+        names = aliases.setdefault(node.key[0], [])
+        names.extend(alias for alias in node.requested_by if alias not in names)
+
+    for node in graph.nodes.values():
+        if node.analysis != 'margin' or node.key not in results:
+            continue
+        gm, pm, wgc, wpc = results[node.key]
+        names = ', '.join(f"{manifest}:{name}" for manifest, name in aliases.get(node.key[0], []))
+        print(f"\n=== {node.key[0]} ({names}) ===")
+        for analysis in ('poles', 'zeros'):
+            key = (node.key[0], analysis, params_key({}))
+            if key in results:
+                print(f"{analysis.capitalize()}:", results[key])
+        gm_db = 20 * np.log10(gm) if gm not in [np.inf, 0] else float('inf')
+        print(f"Gain Margin (dB): {gm_db:.2f}")
+        print(f"Phase Margin (deg): {pm:.2f}")
+        print(f"Gain crossover freq (rad/s): {wgc:.2f}")
+        print(f"Phase crossover freq (rad/s): {wpc:.2f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('manifests', nargs='+', help='manifest JSON files')
+    parser.add_argument('--output', default=os.environ.get('CONTROL_PLOT_DIR'),
+                        help='directory for rendered plots (default: $CONTROL_PLOT_DIR)')
+    parser.add_argument('--workers', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--executor', choices=['process', 'thread', 'serial'], default='process')
+    parser.add_argument('--cache-dir', default=os.environ.get('CONTROL_CACHE_DIR'),
+                        help='keep numeric results in this directory across runs (default: $CONTROL_CACHE_DIR)')
+    args = parser.parse_args()
+
+    cache = None
+    if args.cache_dir:
+        from result_cache import ResultCache
+        cache = ResultCache(args.cache_dir)
+
+    graph = AnalysisGraph()
+    for path in args.manifests:
+        graph.add_manifest(load_manifest(path))
+
+    start = time.perf_counter()
+    results, timings = execute(graph, output=args.output, workers=args.workers, executor=args.executor, cache=cache)
+    elapsed = time.perf_counter() - start
+
+    print_summary(graph, results)
+    print(f"\nRequested analyses: {graph.n_requested}, unique nodes (with dependencies): {len(graph.nodes)}, "
+          f"executed: {len(results)}")
+    print(f"Total node time: {sum(timings.values()):.2f} s, wall time: {elapsed:.2f} s")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Result cache: {stats['hits']} hits, {stats['misses']} misses (hit rate {stats['hit_rate']:.0%}), "
+              f"{stats['entries']} entries, {stats['bytes'] / 2 ** 10:.0f} kB")
+    if args.output is None:
+        print("No output directory given, plot nodes were skipped.", file=sys.stderr)
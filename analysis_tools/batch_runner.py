@@ -0,0 +1,171 @@
+"""
+Runs all analysis scripts of the repository headless and in parallel.
+
+Every directory next to analysis_tools/ that contains Python scripts is searched, and
+each script runs in its own worker process with the non-interactive Agg backend, its
+own CONTROL_PLOT_DIR (so plots are saved instead of shown) and PYCONTROL_TEST_EXAMPLES
+set (for public_examples/secord.py).  Wall time, peak memory, exit status and the
+produced artifacts of every script are collected into one report.
+
+With --report the plots of every script are collected into multi-page PDFs with a page
+index (report_pages.py) instead of one file per plot.
+
+Usage:
+    python analysis_tools/batch_runner.py --output build/ [--jobs N] [--profile] [--report] [--filter 'nyquist_plots/*']
+
+"""
+
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS_DIR = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+LOG_FILES = ('stdout.txt', 'stderr.txt', 'trace.json', 'profile.json')
+
+
+def discover_scripts(root=REPO_ROOT, patterns=None):
+    """Returns the relative paths of all scripts in the top-level script directories."""
+    scripts = []
+    for entry in sorted(os.listdir(root)):
+        directory = os.path.join(root, entry)
+        if not os.path.isdir(directory) or entry.startswith(('.', '_')) or entry == TOOLS_DIR:
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py') and not name.startswith('_'):
+                path = os.path.join(entry, name)
+                if not patterns or any(fnmatch.fnmatch(path, p) for p in patterns):
+                    scripts.append(path)
+    return scripts
+
+
+def _command(script_path, output_dir, profile, report=False):
+    command = [script_path]
+    if report:
+        command = [os.path.join(REPO_ROOT, TOOLS_DIR, 'report_pages.py'), script_path,
+                   '--output', os.path.join(output_dir, 'report')]
+    if profile:
+        profiler = os.path.join(REPO_ROOT, TOOLS_DIR, 'profiling.py')
+        command = [profiler] + command + ['--trace', os.path.join(output_dir, 'trace.json'),
+                                          '--summary-json', os.path.join(output_dir, 'profile.json')]
+    return [sys.executable] + command
+
+
+def run_script(script, output, profile=False, timeout=None, root=REPO_ROOT, report=False):
+    """Runs one script in a child process and returns its report entry."""
+    script_path = os.path.join(root, script)
+    output_dir = os.path.join(output, os.path.splitext(script)[0])
+    os.makedirs(output_dir, exist_ok=True)
+
+    env = dict(os.environ)
+    env.update({
+        'MPLBACKEND': 'Agg',
+        'CONTROL_PLOT_DIR': output_dir,
+        'PYCONTROL_TEST_EXAMPLES': '1',
+    })
+
+    start = time.perf_counter()
+    with open(os.path.join(output_dir, 'stdout.txt'), 'w') as out, \
+            open(os.path.join(output_dir, 'stderr.txt'), 'w') as err:
+        proc = subprocess.Popen(_command(script_path, output_dir, profile, report), cwd=os.path.dirname(script_path),
+                                env=env, stdout=out, stderr=err, stdin=subprocess.DEVNULL)
+        killed = threading.Event()
+
+        def kill():
+            killed.set()
+            proc.kill()
+
+        timer = threading.Timer(timeout, kill) if timeout else None
+        if timer:
+            timer.start()
+        try:
+            if hasattr(os, 'wait4'):
+                # reap the child ourselves to get its resource usage
+                _, status, usage = os.wait4(proc.pid, 0)
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                peak_kb = usage.ru_maxrss
+            else:
+                proc.wait()
+                peak_kb = None
+        finally:
+            if timer:
+                timer.cancel()
+    wall = time.perf_counter() - start
+
+    artifacts = [
+        {'file': name, 'bytes': os.path.getsize(os.path.join(output_dir, name))}
+        for name in sorted(os.listdir(output_dir)) if name not in LOG_FILES
+    ]
+    return {
+        'script': script,
+        'exit_status': proc.returncode,
+        'timed_out': killed.is_set(),
+        'wall_time_s': round(wall, 3),
+        'peak_memory_mb': None if peak_kb is None else round(peak_kb / 1024, 1),
+        'artifacts': artifacts,
+        'output_dir': output_dir,
+    }
+
+
+def run_all(scripts, output, jobs=None, profile=False, timeout=None, report=False):
+    """Runs the scripts concurrently, jobs at a time (default: one per core)."""
+    jobs = jobs or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(run_script, script, output, profile, timeout, report=report) for script in scripts]
+        for future in as_completed(futures):
+            r = future.result()
+            status = 'ok' if r['exit_status'] == 0 else f"FAILED ({r['exit_status']})"
+            print(f"{r['script']:72s} {status:12s} {r['wall_time_s']:8.2f} s", flush=True)
+    return [future.result() for future in futures]
+
+
+def print_report(results, wall_time, file=sys.stdout):
+    header = f"{'script':72s} {'status':>6s} {'wall s':>8s} {'peak MB':>8s} {'artifacts':>9s}"
+    print('\n' + header, file=file)
+    print('-' * len(header), file=file)
+    for r in results:
+        peak = '-' if r['peak_memory_mb'] is None else f"{r['peak_memory_mb']:.1f}"
+        print(f"{r['script']:72s} {r['exit_status']:6d} {r['wall_time_s']:8.2f} {peak:>8s} "
+              f"{len(r['artifacts']):9d}", file=file)
+    failed = [r for r in results if r['exit_status'] != 0]
+    total = sum(r['wall_time_s'] for r in results)
+    print(f"\n{len(results)} scripts, {len(failed)} failed, "
+          f"{sum(len(r['artifacts']) for r in results)} artifacts", file=file)
+    print(f"Sum of script times: {total:.1f} s, wall time: {wall_time:.1f} s", file=file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run all analysis scripts headless and in parallel.')
+    parser.add_argument('--output', default=os.environ.get('CONTROL_PLOT_DIR', 'build'),
+                        help='output directory (default: $CONTROL_PLOT_DIR or ./build)')
+    parser.add_argument('--jobs', type=int, default=None, help='number of concurrent scripts')
+    parser.add_argument('--filter', action='append', help='only run scripts matching this glob pattern')
+    parser.add_argument('--timeout', type=float, default=None, help='kill scripts running longer (s)')
+    parser.add_argument('--profile', action='store_true', help='profile every script stage by stage')
+    parser.add_argument('--report', action='store_true',
+                        help='collect the plots of every script into multi-page PDFs with a page index')
+    parser.add_argument('--list', action='store_true', help='only list the discovered scripts')
+    args = parser.parse_args()
+
+    scripts = discover_scripts(patterns=args.filter)
+    if args.list:
+        print('\n'.join(scripts))
+        sys.exit(0)
+
+    output = os.path.abspath(args.output)
+    start = time.perf_counter()
+    results = run_all(scripts, output, jobs=args.jobs, profile=args.profile, timeout=args.timeout, report=args.report)
+    wall_time = time.perf_counter() - start
+
+    report = {'wall_time_s': round(wall_time, 3), 'jobs': args.jobs or os.cpu_count(), 'scripts': results}
+    with open(os.path.join(output, 'report.json'), 'w') as f:
+        json.dump(report, f, indent=2)
+    print_report(results, wall_time)
+    print(f"Report written to {os.path.join(output, 'report.json')}")
+    sys.exit(1 if any(r['exit_status'] != 0 for r in results) else 0)
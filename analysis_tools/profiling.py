@@ -0,0 +1,285 @@
+"""
+Opt-in stage-level profiling for the analysis scripts.
+
+The profiler wraps the python-control analysis calls (ct.margin, ct.bode_plot,
+ct.step_response, ct.pzmap, ...) and the matplotlib rendering calls (savefig) with
+timers and optional memory counters.  Each measurement is tagged with a description
+of the system and the call parameters.  The results can be exported as a Chrome trace
+(open in chrome://tracing or https://ui.perfetto.dev) and summarized per stage.
+
+Profile a script without changing it:
+    python analysis_tools/profiling.py nyquist_plots/margins.py --trace margins_trace.json
+
+Or instrument a block of code:
+    profiler = Profiler()
+    with profiler.instrumented(), profiler.context(system='G1'):
+        ct.margin(G1)
+    profiler.print_summary()
+
+"""
+
+import os
+import sys
+import json
+import time
+import runpy
+import argparse
+import importlib
+import threading
+import functools
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# (module, attribute, category) of the calls that are wrapped by instrument();
+# the attribute may be a dotted path to a method, e.g. 'Figure.savefig'
+ANALYSIS_TARGETS = [
+    ('control', name, 'analysis') for name in (
+        'margin', 'stability_margins', 'poles', 'zeros', 'dcgain', 'feedback', 'place', 'ss2tf',
+        'frequency_response', 'step_response', 'forced_response', 'initial_response',
+        'impulse_response', 'step_info')
+] + [
+    ('control', name, 'plot') for name in (
+        'bode_plot', 'nyquist_plot', 'pzmap', 'pole_zero_plot', 'root_locus', 'root_locus_plot')
+] + [
+    ('control.matlab', name, 'analysis') for name in ('step', 'lsim', 'impulse', 'initial')
+] + [
+    ('control.matlab', name, 'plot') for name in ('bode', 'nyquist', 'rlocus', 'pzmap')
+] + [
+    ('matplotlib.pyplot', 'savefig', 'render'),
+    ('matplotlib.pyplot', 'show', 'render'),
+    ('matplotlib.figure', 'Figure.savefig', 'render'),
+]
+
+
+def describe_system(obj):
+    """Short label of a system argument, e.g. 'tf([1]/[1, 2, 1])' or 'ss(2x1x1)'."""
+    if hasattr(obj, 'num') and hasattr(obj, 'den') and getattr(obj, 'ninputs', 0) == 1 \
+            and getattr(obj, 'noutputs', 0) == 1:
+        fmt = lambda p: '[' + ', '.join(f"{c:.6g}" for c in p) + ']'
+        return f"tf({fmt(obj.num[0][0])}/{fmt(obj.den[0][0])})"
+    if hasattr(obj, 'A') and hasattr(obj, 'B'):
+        return f"ss({obj.nstates}x{obj.ninputs}x{obj.noutputs})"
+    if hasattr(obj, 'ninputs'):
+        return f"{type(obj).__name__}({obj.ninputs}x{obj.noutputs})"
+    return None
+
+
+def _describe_value(value):
+    label = describe_system(value)
+    if label is not None:
+        return label
+    if isinstance(value, (int, float, bool, str)) or value is None:
+        return value if not isinstance(value, str) else value[:200]
+    shape = getattr(value, 'shape', None)
+    if shape is not None:
+        return f"array{tuple(shape)}"
+    if isinstance(value, (list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+class Profiler:
+    """Collects timed (and optionally memory-tracked) stages."""
+
+    def __init__(self, track_memory=False):
+        self.track_memory = track_memory
+        self.events = []
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+        self._patched = []
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _context(self):
+        return getattr(self._local, 'context', {})
+
+    @contextmanager
+    def context(self, **tags):
+        """Adds tags (e.g. system='G1') to every stage recorded inside the block by this thread."""
+        previous = self._context()
+        self._local.context = {**previous, **tags}
+        try:
+            yield
+        finally:
+            self._local.context = previous
+
+    @contextmanager
+    def stage(self, name, category='analysis', **tags):
+        """Times the enclosed block as one stage."""
+        stack = self._stack()
+        frame = {'child_ns': 0, 'peak': 0}
+        if self.track_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+            tracemalloc.reset_peak()
+            frame['mem_start'] = current
+        stack.append(frame)
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            stack.pop()
+            duration = end - start
+            args = {**self._context(), **tags}
+            if self.track_memory and tracemalloc.is_tracing():
+                current, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame['peak'])
+                args['mem_delta_kb'] = (current - frame['mem_start']) / 1024
+                args['mem_peak_kb'] = (peak - frame['mem_start']) / 1024
+                if stack:
+                    stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+                tracemalloc.reset_peak()
+            if resource is not None:
+                args['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            if stack:
+                stack[-1]['child_ns'] += duration
+            self.events.append({
+                'name': name, 'cat': category, 'ph': 'X',
+                'ts': (start - self._origin) / 1e3, 'dur': duration / 1e3,
+                'self': (duration - frame['child_ns']) / 1e3,
+                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args,
+            })
+
+    def wrap(self, func, name, category='analysis'):
+        """Returns func wrapped in a stage tagged with its system and parameter arguments."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tags = {}
+            for i, value in enumerate(args):
+                label = describe_system(value)
+                if label is not None:
+                    tags.setdefault('system', label)
+                elif i > 0 or 'system' in tags:
+                    tags[f'arg{i}'] = _describe_value(value)
+            for key, value in kwargs.items():
+                tags[key] = _describe_value(value)
+            with self.stage(name, category, **tags):
+                return func(*args, **kwargs)
+        wrapper.__profiler_original__ = func
+        return wrapper
+
+    def instrument(self, targets=ANALYSIS_TARGETS):
+        """Wraps the target functions in place; undo with uninstrument()."""
+        for module_name, path, category in targets:
+            try:
+                owner = importlib.import_module(module_name)
+            except ImportError:
+                continue
+            *owners, attr = path.split('.')
+            for part in owners:
+                owner = getattr(owner, part)
+            func = getattr(owner, attr, None)
+            if func is None or hasattr(func, '__profiler_original__'):
+                continue
+            name = attr if module_name.startswith('control') else f"{module_name.split('.')[-1]}.{path}"
+            setattr(owner, attr, self.wrap(func, name, category))
+            self._patched.append((owner, attr, func))
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def uninstrument(self):
+        for owner, attr, func in reversed(self._patched):
+            setattr(owner, attr, func)
+        self._patched = []
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    @contextmanager
+    def instrumented(self, targets=ANALYSIS_TARGETS):
+        self.instrument(targets)
+        try:
+            yield self
+        finally:
+            self.uninstrument()
+
+    # === Export ===
+    def export_chrome_trace(self, path):
+        """Writes the stages in the Chrome trace event format."""
+        events = [{k: v for k, v in e.items() if k != 'self'} for e in self.events]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, default=str)
+
+    def summary(self):
+        """Per-stage count, total/self/mean/max time (ms) and share of the total self time."""
+        stages = {}
+        for e in self.events:
+            s = stages.setdefault(e['name'], {'stage': e['name'], 'category': e['cat'], 'count': 0,
+                                              'total_ms': 0.0, 'self_ms': 0.0, 'max_ms': 0.0,
+                                              'mem_peak_kb': 0.0})
+            s['count'] += 1
+            s['total_ms'] += e['dur'] / 1e3
+            s['self_ms'] += e['self'] / 1e3
+            s['max_ms'] = max(s['max_ms'], e['dur'] / 1e3)
+            s['mem_peak_kb'] = max(s['mem_peak_kb'], e['args'].get('mem_peak_kb', 0.0))
+        total_self = sum(s['self_ms'] for s in stages.values()) or 1.0
+        rows = sorted(stages.values(), key=lambda s: s['self_ms'], reverse=True)
+        for s in rows:
+            s['mean_ms'] = s['total_ms'] / s['count']
+            s['share'] = s['self_ms'] / total_self
+        return rows
+
+    def export_summary(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def print_summary(self, file=sys.stdout):
+        rows = self.summary()
+        header = f"{'stage':24s} {'category':9s} {'count':>6s} {'total ms':>10s} {'self ms':>10s} " \
+                 f"{'mean ms':>9s} {'max ms':>9s} {'share':>6s}"
+        if self.track_memory:
+            header += f" {'peak kB':>9s}"
+        print(header, file=file)
+        print('-' * len(header), file=file)
+        for s in rows:
+            line = f"{s['stage']:24s} {s['category']:9s} {s['count']:6d} {s['total_ms']:10.2f} " \
+                   f"{s['self_ms']:10.2f} {s['mean_ms']:9.2f} {s['max_ms']:9.2f} {100 * s['share']:5.1f}%"
+            if self.track_memory:
+                line += f" {s['mem_peak_kb']:9.1f}"
+            print(line, file=file)
+
+
+def profile_script(path, profiler=None, argv=()):
+    """Runs a script as __main__ with the analysis and rendering calls instrumented."""
+    import matplotlib
+    matplotlib.use('Agg')
+    profiler = Profiler() if profiler is None else profiler
+    saved_argv = sys.argv
+    sys.argv = [path] + list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    try:
+        with profiler.instrumented(), profiler.stage('script', 'script', path=path):
+            runpy.run_path(path, run_name='__main__')
+    finally:
+        sys.argv = saved_argv
+        sys.path.pop(0)
+    return profiler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Profile an analysis script stage by stage.')
+    parser.add_argument('script', help='path of the script to run')
+    parser.add_argument('--trace', help='write a Chrome trace (JSON) to this file')
+    parser.add_argument('--summary-json', help='write the per-stage summary (JSON) to this file')
+    parser.add_argument('--memory', action='store_true', help='track allocations with tracemalloc')
+    args, script_args = parser.parse_known_args()
+
+    profiler = Profiler(track_memory=args.memory)
+    try:
+        profile_script(args.script, profiler, script_args)
+    finally:
+        if args.trace:
+            profiler.export_chrome_trace(args.trace)
+        if args.summary_json:
+            profiler.export_summary(args.summary_json)
+        profiler.print_summary(file=sys.stderr)
@@ -0,0 +1,150 @@
+"""
+Collects all figures of a script run into a few multi-page PDF reports instead of one file
+per plot.
+
+The scripts save their plots with fig.savefig / plt.savefig into CONTROL_PLOT_DIR.  While a
+ReportPages is active, every such call appends the figure as a page of report.pdf instead
+(matplotlib.backends.backend_pdf.PdfPages, so fonts and other resources are embedded once per
+document and each page is written to disk as it is added).  After max_pages pages the report
+rolls over to report_002.pdf, report_003.pdf, ...  An index (report_index.json) maps every page
+to the file name the script asked for and to the (plot type, system) read from the figure
+title, e.g. "Bode Plot: Stable 1st-Order".
+
+Written figures are closed so that memory stays bounded, but one step late: the scripts often
+call plt.close() (the current figure) right after savefig, so a written figure is closed when
+the next page is written, or at the end.
+
+Run a script with its plots collected:
+    python analysis_tools/report_pages.py nyquist_plots/margins.py --output build/margins_report
+
+Or every script (one report per script):
+    python analysis_tools/batch_runner.py --output build --report
+
+"""
+
+import os
+import sys
+import json
+import runpy
+import argparse
+import matplotlib
+from matplotlib.figure import Figure
+
+
+def describe(fig, filename):
+    """(plot type, system) of a figure from its title ('Plot Type: System'), else from the file name."""
+    titles = [fig._suptitle.get_text() if fig._suptitle is not None else ''] + [ax.get_title() for ax in fig.axes]
+    titles = [title for title in titles if title]
+    for title in titles:
+        if ': ' in title:
+            plot_type, system = title.split(': ', 1)
+            return plot_type, system
+    return titles[0] if titles else os.path.splitext(os.path.basename(str(filename)))[0], None
+
+
+class ReportPages:
+    """
+    Redirects Figure.savefig into multi-page PDF reports while active (a context manager).
+
+    prefix is the path of the reports without extension ('build/report' gives
+    build/report.pdf, build/report_002.pdf, ... and build/report_index.json).
+    """
+
+    def __init__(self, prefix, max_pages=500):
+        self.prefix = prefix
+        self.max_pages = max_pages
+        self.documents = []
+        self.pages = []
+        self._pdf = None
+        self._page_in_document = 0
+        self._written = None
+        self._savefig = None
+
+    def _open_next(self):
+        from matplotlib.backends.backend_pdf import PdfPages
+        if self._pdf is not None:
+            self._pdf.close()
+        n = len(self.documents) + 1
+        path = f"{self.prefix}.pdf" if n == 1 else f"{self.prefix}_{n:03d}.pdf"
+        self._pdf = PdfPages(path)
+        self.documents.append(os.path.basename(path))
+        self._page_in_document = 0
+
+    def add(self, fig, filename='', **kwargs):
+        """Appends fig as a page; filename is only recorded in the index."""
+        if self._pdf is None or self._page_in_document >= self.max_pages:
+            self._open_next()
+        for key in ('format', 'metadata', 'backend'):
+            kwargs.pop(key, None)
+        self._pdf.savefig(fig, **kwargs)
+        self._page_in_document += 1
+        plot_type, system = describe(fig, filename)
+        self.pages.append({'document': self.documents[-1], 'page': self._page_in_document,
+                           'file': os.path.basename(str(filename)), 'plot_type': plot_type, 'system': system})
+        self._close_written(keep=fig)
+        self._written = fig
+
+    def _close_written(self, keep=None):
+        import matplotlib.pyplot as plt
+        if self._written is not None and self._written is not keep and plt.fignum_exists(self._written.number):
+            plt.close(self._written)
+        self._written = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.prefix)), exist_ok=True)
+        report = self
+        self._savefig = Figure.savefig
+
+        def savefig(fig, fname, *args, **kwargs):
+            if isinstance(fname, (str, os.PathLike)):
+                report.add(fig, fname, **kwargs)
+            else:  # file objects (e.g. in-memory buffers) are written as usual
+                report._savefig(fig, fname, *args, **kwargs)
+
+        Figure.savefig = savefig
+        return self
+
+    def __exit__(self, *exc):
+        Figure.savefig = self._savefig
+        self._close_written()
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        with open(f"{self.prefix}_index.json", 'w') as f:
+            json.dump({'documents': self.documents, 'pages': self.pages}, f, indent=2)
+        return False
+
+    def lookup(self, system=None, plot_type=None):
+        """Index entries of a system and/or plot type."""
+        return [p for p in self.pages
+                if (system is None or p['system'] == system) and (plot_type is None or p['plot_type'] == plot_type)]
+
+
+def run_with_report(path, prefix, argv=(), max_pages=500):
+    """Runs a script as __main__ with all of its saved figures collected into reports."""
+    matplotlib.use('Agg')
+    os.environ.setdefault('CONTROL_PLOT_DIR', os.path.dirname(os.path.abspath(prefix)))
+    saved_argv = sys.argv
+    sys.argv = [path] + list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(path)))
+    try:
+        with ReportPages(prefix, max_pages) as report:
+            runpy.run_path(path, run_name='__main__')
+    finally:
+        sys.argv = saved_argv
+        sys.path.pop(0)
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run a script with all saved figures collected into multi-page PDFs.')
+    parser.add_argument('script', help='path of the script to run')
+    parser.add_argument('--output', default=None,
+                        help='report path without extension (default: $CONTROL_PLOT_DIR/report)')
+    parser.add_argument('--max-pages', type=int, default=500, help='pages per document before rolling over')
+    args, script_args = parser.parse_known_args()
+
+    prefix = args.output or os.path.join(os.environ.get('CONTROL_PLOT_DIR', '.'), 'report')
+    report = run_with_report(args.script, prefix, script_args, args.max_pages)
+    print(f"{len(report.pages)} pages in {', '.join(report.documents) or 'no documents'}, "
+          f"index {prefix}_index.json", file=sys.stderr)
@@ -0,0 +1,228 @@
+"""
+Persistent on-disk memoization of numeric analysis results (poles, zeros, margins, gains,
+frequency and step responses).
+
+Results are keyed on the canonical system key of analysis_scheduler.system_key (leading zeros
+stripped, denominator monic, so scaled num/den pairs share entries), the analysis name and the
+call parameters.  Every entry is one .npz file named by a hash of the key:
+
+- writes go to a temporary file that is moved into place with os.replace, so concurrent
+  processes never read partial entries; temporary files older than STALE_TMP_SECONDS (left by
+  a killed writer) count towards the size and are deleted first on eviction;
+- a hit refreshes the file's modification time, and when the directory grows beyond max_bytes
+  the least recently used entries are deleted; eviction holds an exclusive fcntl lock so that
+  concurrent processes do not evict at the same time;
+- hits, misses, stores and evictions of this process are counted (stats()).
+
+Use it from the scheduler:
+    python analysis_tools/analysis_scheduler.py analysis_tools/manifests/*.json --cache-dir ~/.cache/control
+
+Or memoize calls in a script:
+    cache = ResultCache('~/.cache/control')
+    gm, pm, wgc, wpc = cache.call('margin', G, ct.margin)
+
+Inspect or clear a cache directory:
+    python analysis_tools/result_cache.py ~/.cache/control [--clear]
+
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import time
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows: eviction is then unsynchronized
+    fcntl = None
+
+from analysis_scheduler import system_key, params_key
+
+# a temporary file this old is no longer being written
+STALE_TMP_SECONDS = 600
+
+
+def cache_key(num, den, analysis, params=None):
+    """Key of an analysis of the transfer function num/den (same form as the scheduler's node keys)."""
+    return (system_key(num, den), analysis, params_key(params))
+
+
+def _encode(value):
+    """Arrays to store for a result: an array, a scalar or a tuple/list of those."""
+    if isinstance(value, (tuple, list)):
+        items = [np.asarray(v) for v in value]
+        kind = 'tuple'
+    else:
+        items = [np.asarray(value)]
+        kind = 'array' if isinstance(value, np.ndarray) else 'scalar'
+    if any(item.dtype == object for item in items):
+        raise TypeError("only numeric results can be cached")
+    arrays = {f'item_{i}': item for i, item in enumerate(items)}
+    arrays['__kind__'] = np.array(kind)
+    return arrays
+
+
+def _decode(data):
+    kind = str(data['__kind__'])
+    items = [data[f'item_{i}'] for i in range(len(data.files) - 2)]
+    if kind == 'tuple':
+        return tuple(item.item() if item.ndim == 0 else item for item in items)
+    return items[0].item() if kind == 'scalar' else items[0]
+
+
+class ResultCache:
+    """Size-bounded LRU cache of numeric results in a directory, shared between processes."""
+
+    def __init__(self, directory, max_bytes=256 * 2 ** 20):
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = self.misses = self.stores = self.evictions = 0
+        self._bytes = self._scan()[1]
+
+    @staticmethod
+    def _size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def _path(self, key):
+        digest = hashlib.blake2b(json.dumps(list(key)).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, digest + '.npz')
+
+    def _scan(self):
+        """
+        (mtime, size, path) of all entries and stale temporary files, and their total size.
+        Stale temporary files are listed first so that eviction deletes them before entries.
+        """
+        entries, stale = [], []
+        now = time.time()
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                is_tmp = entry.name.endswith('.tmp')
+                if not (is_tmp or entry.name.endswith('.npz')):
+                    continue
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:  # evicted or moved into place by another process
+                    continue
+                if not is_tmp:
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+                elif now - st.st_mtime > STALE_TMP_SECONDS:
+                    stale.append((st.st_mtime, st.st_size, entry.path))
+        entries = sorted(stale) + sorted(entries)
+        return entries, sum(size for _, size, _ in entries)
+
+    def get(self, key, default=None):
+        """Cached result of key, or default."""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                if str(data['__key__']) != json.dumps(list(key)):
+                    raise KeyError(key)
+                value = _decode(data)
+        except (OSError, KeyError, ValueError):
+            self.misses += 1
+            return default
+        try:
+            os.utime(path)
+        except OSError:  # evicted by another process after the read: the value is still valid
+            pass
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Stores a result; results that are not numeric are silently not cached."""
+        try:
+            arrays = _encode(value)
+        except TypeError:
+            return
+        arrays['__key__'] = np.array(json.dumps(list(key)))
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            replaced = self._size(path)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.stores += 1
+        self._bytes += self._size(path) - replaced
+        if self._bytes > self.max_bytes:
+            self.evict()
+
+    def call(self, analysis, G, func, **params):
+        """func(G, **params), memoized under the analysis name and the parameters."""
+        key = cache_key(G.num[0][0], G.den[0][0], analysis, params)
+        value = self.get(key)
+        if value is None:
+            value = func(G, **params)
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        """Deletes least recently used entries until the directory fits in max_bytes."""
+        with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:  # another process is evicting
+                    return
+            entries, total = self._scan()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._bytes = total
+
+    def clear(self):
+        for _, _, path in self._scan()[0]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._bytes = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        entries, total = self._scan()
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate, 'stores': self.stores,
+                'evictions': self.evictions, 'entries': sum(path.endswith('.npz') for _, _, path in entries),
+                'bytes': total}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Inspect or clear a result cache directory.')
+    parser.add_argument('directory', help='cache directory')
+    parser.add_argument('--clear', action='store_true', help='delete all entries')
+    parser.add_argument('--max-mb', type=float, default=None, help='evict least recently used entries down to this size')
+    args = parser.parse_args()
+
+    cache = ResultCache(args.directory)
+    if args.clear:
+        cache.clear()
+    if args.max_mb is not None:
+        cache.max_bytes = args.max_mb * 2 ** 20
+        cache.evict()
+    stats = cache.stats()
+    print(f"{cache.directory}: {stats['entries']} entries, {stats['bytes'] / 2 ** 20:.2f} MB"
+          + (f", {stats['evictions']} evicted" if stats['evictions'] else ""), file=sys.stderr)
@@ -0,0 +1,242 @@
+"""
+Monte Carlo robustness analysis of the cruise control PI/PID designs.
+
+The plant m*v_dot = -b*v + u + d is sampled over user distributions of the mass m, the
+damping b and the disturbance force d.  For the controller C(s) = (Kd s^2 + Kp s + Ki) / s the
+closed loops are second order, so poles, margins, step overshoot and disturbance response are
+evaluated in closed form, vectorized over all samples.  Samples are split into shards that run
+in a process pool; every shard has its own seed spawned from one SeedSequence, so results do
+not depend on the number of workers.
+
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+# metric name: True if larger values are worse
+METRICS = {
+    'max_real_pole': True,
+    'phase_margin': False,
+    'gain_margin': False,
+    'overshoot': True,
+    'settling_time': True,
+    'dist_peak': True,
+}
+
+PERCENTILES = [1, 5, 50, 95, 99]
+
+
+def sample_parameters(distributions, n, rng):
+    """
+    Draws n samples of every parameter.
+
+    distributions maps a parameter name to (method, *args) of numpy.random.Generator,
+    e.g. {'m': ('uniform', 800, 2500), 'b': ('normal', 50, 10)}, or ('constant', value).
+    """
+    samples = {}
+    for name, (method, *args) in distributions.items():
+        if method == 'constant':
+            samples[name] = np.full(n, float(args[0]))
+        else:
+            samples[name] = getattr(rng, method)(*args, size=n)
+    return samples
+
+
+def closed_loop_poles(m, b, Kp, Ki, Kd):
+    """Roots of (m + Kd) s^2 + (b + Kp) s + Ki for arrays of parameters."""
+    a2, a1, a0 = m + Kd, b + Kp, Ki
+    root = np.sqrt((a1**2 - 4 * a2 * a0).astype(complex))
+    return np.stack([(-a1 + root) / (2 * a2), (-a1 - root) / (2 * a2)], axis=-1)
+
+
+def margins(m, b, Kp, Ki, Kd):
+    """
+    Gain and phase margins of L(s) = (Kd s^2 + Kp s + Ki) / (s (m s + b)), in closed form.
+
+    |L(jw)| = 1 is a quadratic in w^2; the phase margin is the smallest one over the
+    crossover frequencies.  Im L(jw) = 0 at w^2 = b Ki / (b Kd - m Kp).
+    """
+    m, b, Kp, Ki, Kd = np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in (m, b, Kp, Ki, Kd)))
+
+    def L(w):
+        return (Ki - Kd * w**2 + 1j * Kp * w) / (1j * w * (b + 1j * m * w))
+
+    # gain crossovers: (Kd^2 - m^2) x^2 + (Kp^2 - 2 Ki Kd - b^2) x + Ki^2 = 0 with x = w^2
+    c2, c1, c0 = Kd**2 - m**2, Kp**2 - 2 * Ki * Kd - b**2, Ki**2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = np.sqrt((c1**2 - 4 * c2 * c0).astype(complex))
+        x_roots = np.stack([(-c1 + disc) / (2 * c2), (-c1 - disc) / (2 * c2)])
+        x_roots = np.where(c2 == 0, -c0 / c1, x_roots)
+    valid = (np.abs(x_roots.imag) <= 1e-9 * np.abs(x_roots)) & (x_roots.real > 0)
+    w_c = np.sqrt(np.where(valid, x_roots.real, 1.0))
+    pm = np.degrees(np.angle(-L(w_c)))  # 180 deg + phase, wrapped to (-180, 180]
+    phase_margin = np.min(np.where(valid, pm, np.inf), axis=0)
+
+    # phase crossover
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_pc = b * Ki / (b * Kd - m * Kp)
+    has_pc = np.isfinite(x_pc) & (x_pc > 0)
+    L_pc = L(np.sqrt(np.where(has_pc, x_pc, 1.0)))
+    gain_margin = np.where(has_pc & (L_pc.real < 0), 1 / np.abs(L_pc), np.inf)
+    return gain_margin, phase_margin
+
+
+def time_responses(m, b, Kp, Ki, Kd, d, n_t=400, block=2048):
+    """
+    Overshoot (%), 2% settling time of the reference step response and the peak velocity
+    deviation caused by a step disturbance d, from the closed-form step responses.
+
+    Each sample is evaluated on its own time grid spanning 8 time constants of the slowest pole.
+    """
+    n = len(m)
+    overshoot, settling, dist_peak = np.empty(n), np.empty(n), np.empty(n)
+    tau = np.linspace(0, 1, n_t)
+    for start in range(0, n, block):
+        sl = slice(start, start + block)
+        a2, a1, a0 = m[sl] + Kd, b[sl] + Kp, Ki * np.ones(len(m[sl]))
+        p = closed_loop_poles(m[sl], b[sl], Kp, Ki, Kd)
+        # separate (numerically) repeated poles
+        close = np.abs(p[:, 0] - p[:, 1]) < 1e-6 * np.abs(p[:, 0])
+        p[close, 0] *= 1 + 1e-6
+        p[close, 1] *= 1 - 1e-6
+        p1, p2 = p[:, :1], p[:, 1:]
+        t = tau * (8 / np.min(np.abs(p.real), axis=1))[:, None]
+
+        # reference step: T(s) = c + R(s)/D(s), y(t) = 1 + sum R(p)/(p D'(p)) e^{pt}
+        c = Kd / a2
+        R1, R0 = Kp - c * a1, Ki - c * a0
+        r1 = (R1[:, None] * p1 + R0[:, None]) / (p1 * a2[:, None] * (p1 - p2))
+        r2 = (R1[:, None] * p2 + R0[:, None]) / (p2 * a2[:, None] * (p2 - p1))
+        y = 1 + (r1 * np.exp(p1 * t) + r2 * np.exp(p2 * t)).real
+        y[:, 0] = c  # direct feedthrough of the derivative term at t = 0+
+        overshoot[sl] = 100 * np.maximum(y.max(axis=1) - 1, 0)
+        outside = np.abs(y - 1) > 0.02
+        last = n_t - 1 - np.argmax(outside[:, ::-1], axis=1)
+        settling[sl] = np.where(outside.any(axis=1), t[np.arange(len(t)), np.minimum(last + 1, n_t - 1)], 0)
+
+        # step disturbance: Y_d(s) = d / D(s)
+        g = (np.exp(p1 * t) / (a2[:, None] * (p1 - p2)) + np.exp(p2 * t) / (a2[:, None] * (p2 - p1))).real
+        dist_peak[sl] = np.abs(d[sl]) * np.abs(g).max(axis=1)
+    return overshoot, settling, dist_peak
+
+
+def evaluate(samples, Kp, Ki, Kd, n_t=400):
+    """All metrics for arrays of sampled (m, b, disturbance)."""
+    # with integral action the steady-state velocity error under a constant disturbance is zero
+    # for every sample, so it is not a metric
+    if Ki <= 0:
+        raise ValueError("the Monte Carlo engine expects controllers with integral action (Ki > 0)")
+    m, b, d = samples['m'], samples['b'], samples['disturbance']
+    poles = closed_loop_poles(m, b, Kp, Ki, Kd)
+    gm, pm = margins(m, b, Kp, Ki, Kd)
+    overshoot, settling, dist_peak = time_responses(m, b, Kp, Ki, Kd, d, n_t=n_t)
+    return {
+        'max_real_pole': poles.real.max(axis=1),
+        'phase_margin': pm,
+        'gain_margin': gm,
+        'overshoot': overshoot,
+        'settling_time': settling,
+        'dist_peak': dist_peak,
+    }
+
+
+def _run_shard(distributions, controllers, n, seed_seq, n_t):
+    rng = np.random.default_rng(seed_seq)
+    samples = sample_parameters(distributions, n, rng)
+    return samples, {name: evaluate(samples, *gains, n_t=n_t) for name, gains in controllers.items()}
+
+
+def monte_carlo(distributions, controllers, n_samples, seed=0, shard_size=20000, workers=None, n_t=400):
+    """
+    Runs the Monte Carlo analysis for every controller on the same parameter samples.
+
+    controllers maps a name to (Kp, Ki, Kd).  Returns (samples, metrics, summary, worst):
+    samples[param] and metrics[controller][metric] are arrays over all draws,
+    summary[controller][metric] holds the PERCENTILES and worst[controller][metric]
+    the index, parameters and value of the worst draw.
+    """
+    n_shards = -(-n_samples // shard_size)
+    seeds = np.random.SeedSequence(seed).spawn(n_shards)
+    sizes = [min(shard_size, n_samples - i * shard_size) for i in range(n_shards)]
+
+    if workers == 1 or n_shards == 1:
+        shards = [_run_shard(distributions, controllers, n, s, n_t) for n, s in zip(sizes, seeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(_run_shard, [distributions] * n_shards, [controllers] * n_shards,
+                                   sizes, seeds, [n_t] * n_shards))
+
+    samples = {name: np.concatenate([s[name] for s, _ in shards]) for name in distributions}
+    metrics = {ctrl: {k: np.concatenate([r[ctrl][k] for _, r in shards]) for k in METRICS}
+               for ctrl in controllers}
+
+    summary, worst = {}, {}
+    for ctrl, values in metrics.items():
+        summary[ctrl] = {k: np.percentile(v[np.isfinite(v)], PERCENTILES) if np.isfinite(v).any()
+                         else np.full(len(PERCENTILES), np.inf) for k, v in values.items()}
+        worst[ctrl] = {}
+        for k, larger_is_worse in METRICS.items():
+            v = values[k]
+            i = int(np.nanargmax(v) if larger_is_worse else np.nanargmin(v))
+            worst[ctrl][k] = {'index': i, 'value': v[i], **{p: samples[p][i] for p in samples}}
+    return samples, metrics, summary, worst
+
+
+if __name__ == '__main__':
+
+    # === 1. Parameter spread and the designs from cruise_control_PID.py ===
+    distributions = {
+        'm': ('uniform', 800, 2500),          # loaded mass (kg)
+        'b': ('lognormal', np.log(50), 0.4),  # drag coefficient (N·s/m)
+        'disturbance': ('uniform', 0, 1000),  # grade force mg sin(theta) (N)
+    }
+    controllers = {'PI': (200, 50, 0), 'PID': (200, 50, 20)}
+
+    # === 2. Run ===
+    n_samples = 100000
+    start = time.perf_counter()
+    samples, metrics, summary, worst = monte_carlo(distributions, controllers, n_samples, seed=1)
+    print(f"{n_samples} draws x {len(controllers)} controllers in {time.perf_counter() - start:.1f} s")
+
+    for ctrl in controllers:
+        print(f"\n=== {ctrl} controller, percentiles {PERCENTILES} ===")
+        for k, q in summary[ctrl].items():
+            print(f"{k:15s}" + "".join(f"{v:12.4g}" for v in q))
+        print("Worst cases:")
+        for k, w in worst[ctrl].items():
+            print(f"  {k:15s} {w['value']:10.4g} at m = {w['m']:.0f}, b = {w['b']:.1f}, "
+                  f"d = {w['disturbance']:.0f}")
+
+    # === 3. Check one sample against python-control ===
+    import control as ct
+    i = worst['PID']['overshoot']['index']
+    sys_ol = ct.tf([1], [samples['m'][i], samples['b'][i]])
+    L = ct.tf([20, 200, 50], [1, 0]) * sys_ol
+    gm, pm, wgc, wpc = ct.margin(L)
+    info = ct.step_info(ct.feedback(L), SettlingTimeThreshold=0.02)
+    print(f"\nSample {i}: overshoot {metrics['PID']['overshoot'][i]:.3f}% (step_info {info['Overshoot']:.3f}%), "
+          f"PM {metrics['PID']['phase_margin'][i]:.3f} deg (ct.margin {pm:.3f} deg)")
+
+    # === 4. Distributions of the key metrics ===
+    fig, axes = plt.subplots(1, 3, figsize=(12, 4))
+    for ctrl in controllers:
+        axes[0].hist(metrics[ctrl]['overshoot'], bins=100, histtype='step', label=ctrl)
+        axes[1].hist(metrics[ctrl]['phase_margin'], bins=100, histtype='step', label=ctrl)
+        axes[2].hist(metrics[ctrl]['dist_peak'], bins=100, histtype='step', label=ctrl)
+    axes[0].set_xlabel("Overshoot (%)")
+    axes[1].set_xlabel("Phase Margin (deg)")
+    axes[2].set_xlabel("Peak Velocity Deviation (m/s)")
+    for ax in axes:
+        ax.grid()
+        ax.legend()
+    fig.suptitle(f"Monte Carlo Robustness: {n_samples} Sampled Vehicles")
+    fig.tight_layout()
+
+    if "CONTROL_PLOT_DIR" in os.environ:
+        plt.savefig(os.path.join(os.environ["CONTROL_PLOT_DIR"], "monte_carlo_robustness.pdf"))
+    else:
+        plt.show()
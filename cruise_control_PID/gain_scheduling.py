@@ -0,0 +1,286 @@
+"""
+This code schedules the cruise control PI gains on speed and vehicle mass.
+
+cruise_control_PID.py uses one (Kp, Ki) for every speed, but with quadratic drag the plant of
+nonlinear_fleet_simulation.py changes with the operating point: linearized at speed v it is
+B / (s - A) with A = -rho CdA v / m and B = 1 / m.  Here the gains are designed offline over a
+grid of (speed, mass) points so that every linearized loop has the same crossover frequency and
+phase margin; the design of each grid point is verified with ct.margin, with the grid split
+into shards that run in a process pool.
+
+The gains are kept in a GainTable: one float32 array over a uniform grid, so a lookup is a
+bilinear interpolation between the four neighbouring grid points whose indices follow from a
+division, in constant time for any table size, for one vehicle or a whole fleet at once.  The
+scheduled controller integrates Ki e in force units, so a change of the gains never makes the
+force jump (bumpless), and it takes over from another controller without a jump by
+initializing its integrator with the force being applied.
+
+"""
+
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import matplotlib.pyplot as plt
+import control as ct
+from nonlinear_fleet_simulation import Vehicle, Linearizer, PIController, Road, simulate_fleet
+
+# achieved margins of every grid point of a table, shaped (n_speeds, n_masses)
+Verification = namedtuple('Verification', ['pm', 'gm', 'wgc', 'ok'])
+
+
+# === 1. Offline design ===
+def design_pi(A, B, wc=0.5, pm=60.0):
+    """
+    PI gains giving the loop B (Kp s + Ki) / (s (s - A)) the crossover wc (rad/s) and the
+    phase margin pm (deg), for arrays of linearizations.
+    """
+    # phase of the PI zero needed at wc: -90 + phi - atan(wc / -A) = -180 + pm
+    phi = np.radians(pm - 90) + np.arctan2(wc, -A)
+    if np.any((phi <= 0) | (phi >= np.pi / 2)):
+        raise ValueError("phase margin not reachable with PI control at this crossover")
+    Kp = np.sin(phi) * np.hypot(wc, A) / B
+    return Kp, Kp * wc / np.tan(phi)
+
+
+def _design_shard(speeds, masses, CdA, Crr, wc, pm):
+    """Gains and ct.margin verification of a shard of grid points."""
+    gains, margins = [], []
+    for v, m in zip(speeds, masses):
+        op = Linearizer(Vehicle(m, CdA, Crr, None, None)).linearize(v)
+        Kp, Ki = design_pi(op.A[0, 0], op.B[0, 0], wc, pm)
+        gm, pm_achieved, _, wgc = ct.margin(ct.tf([Kp, Ki], [1, 0]) * ct.tf([op.B[0, 0]], [1, -op.A[0, 0]]))
+        gains.append((Kp, Ki))
+        margins.append((pm_achieved, gm, wgc))
+    return np.array(gains), np.array(margins)
+
+
+def build_table(speeds, masses, CdA=0.7, Crr=0.01, wc=0.5, pm=60.0, tol=0.5, shard_size=64, workers=None):
+    """
+    Designs the PI gains on the uniform grid speeds x masses and verifies their margins.
+
+    Every point has to reach the phase margin pm within tol degrees at the crossover wc (within
+    1%).  Returns (GainTable, Verification).
+    """
+    V, M = np.meshgrid(speeds, masses, indexing='ij')
+    V, M = V.ravel(), M.ravel()
+    shards = [slice(i, i + shard_size) for i in range(0, len(V), shard_size)]
+    args = ([V[s] for s in shards], [M[s] for s in shards], [CdA] * len(shards), [Crr] * len(shards),
+            [wc] * len(shards), [pm] * len(shards))
+    if workers == 1 or len(shards) == 1:
+        results = list(map(_design_shard, *args))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_design_shard, *args))
+
+    shape = (len(speeds), len(masses))
+    gains = np.concatenate([g for g, _ in results]).reshape(shape + (2,))
+    pm_achieved, gm, wgc = np.concatenate([m for _, m in results]).reshape(shape + (3,)).transpose(2, 0, 1)
+    ok = (np.abs(pm_achieved - pm) <= tol) & (np.abs(wgc / wc - 1) <= 0.01)
+    return GainTable(speeds, masses, gains), Verification(pm_achieved, gm, wgc, ok)
+
+
+# === 2. Gain table ===
+class GainTable:
+    """
+    Gains over a uniform (speed, mass) grid in one (n_speeds, n_masses, n_gains) float32 array,
+    with constant-time bilinear lookup (clamped to the grid).
+    """
+
+    def __init__(self, speeds, masses, gains, names=('Kp', 'Ki')):
+        speeds, masses = np.asarray(speeds, dtype=float), np.asarray(masses, dtype=float)
+        for axis in (speeds, masses):
+            if len(axis) < 2 or not np.allclose(np.diff(axis), axis[1] - axis[0]):
+                raise ValueError("the grid axes must be uniform with at least two points")
+        self.v0, self.dv, self.nv = speeds[0], speeds[1] - speeds[0], len(speeds)
+        self.m0, self.dm, self.nm = masses[0], masses[1] - masses[0], len(masses)
+        self.gains = np.ascontiguousarray(gains, dtype=np.float32)
+        self.names = tuple(names)
+
+    @property
+    def speeds(self):
+        return self.v0 + self.dv * np.arange(self.nv)
+
+    @property
+    def masses(self):
+        return self.m0 + self.dm * np.arange(self.nm)
+
+    @property
+    def nbytes(self):
+        return self.gains.nbytes
+
+    def lookup(self, v, m):
+        """Interpolated gains at speeds v and masses m (broadcast), shaped (..., n_gains)."""
+        s = np.clip((np.asarray(v, dtype=float) - self.v0) / self.dv, 0, self.nv - 1)
+        t = np.clip((np.asarray(m, dtype=float) - self.m0) / self.dm, 0, self.nm - 1)
+        i = np.minimum(s.astype(int), self.nv - 2)
+        j = np.minimum(t.astype(int), self.nm - 2)
+        s, t = (s - i)[..., None], (t - j)[..., None]
+        g = self.gains
+        return ((1 - s) * ((1 - t) * g[i, j] + t * g[i, j + 1])
+                + s * ((1 - t) * g[i + 1, j] + t * g[i + 1, j + 1]))
+
+    def lookup_one(self, v, m):
+        """lookup() for one scalar (v, m) without array overhead, as a tuple of floats."""
+        s = min(max((v - self.v0) / self.dv, 0.0), self.nv - 1.0)
+        t = min(max((m - self.m0) / self.dm, 0.0), self.nm - 1.0)
+        i, j = min(int(s), self.nv - 2), min(int(t), self.nm - 2)
+        s, t = s - i, t - j
+        item = self.gains.item
+        return tuple((1 - s) * ((1 - t) * item(i, j, k) + t * item(i, j + 1, k))
+                     + s * ((1 - t) * item(i + 1, j, k) + t * item(i + 1, j + 1, k)) for k in range(len(self.names)))
+
+    def save(self, path):
+        np.savez(path, speeds=self.speeds, masses=self.masses, gains=self.gains, names=np.array(self.names))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['speeds'], data['masses'], data['gains'], tuple(data['names'].tolist()))
+
+
+# === 3. Scheduled controller ===
+class ScheduledPIController(PIController):
+    """
+    PI controller with gains looked up at the measured speed and the vehicle mass m, for
+    arrays of vehicles (a drop-in for PIController in simulate_fleet).
+
+    The integrator state z is the integral of Ki e (a force), so u = Kp e + z does not jump when
+    Ki changes; Kp is interpolated continuously.  Clamping anti-windup as in PIController.
+    """
+
+    def __init__(self, table, m, u_min=-np.inf, u_max=np.inf):
+        super().__init__(None, None, u_min, u_max)
+        self.table = table
+        self.m = m
+
+    def force(self, e, z, v=None):
+        return self.table.lookup(v, self.m)[..., 0] * e + z
+
+    def integrator_rate(self, e, z, v=None):
+        u = self.force(e, z, v)
+        windup = ((u > self.u_max) & (e > 0)) | ((u < self.u_min) & (e < 0))
+        return np.where(windup, 0.0, self.table.lookup(v, self.m)[..., 1] * e)
+
+    def bumpless_state(self, u, e, v):
+        """Integrator state that continues the currently applied force u (bumpless transfer)."""
+        return u - self.table.lookup(v, self.m)[..., 0] * e
+
+
+if __name__ == '__main__':
+
+    # === 4. Build the table on a (speed, mass) grid, in parallel ===
+    speeds = np.arange(5.0, 40.01, 0.5)
+    masses = np.arange(800.0, 2600.01, 100.0)
+    start = time.perf_counter()
+    table, check = build_table(speeds, masses, workers=1)
+    serial = time.perf_counter() - start
+    start = time.perf_counter()
+    table_parallel, _ = build_table(speeds, masses, workers=os.cpu_count())
+    parallel = time.perf_counter() - start
+    assert np.array_equal(table.gains, table_parallel.gains)
+    print(f"{table.gains.shape[0]} x {table.gains.shape[1]} grid points designed and verified: "
+          f"{serial:.2f} s serial, {parallel:.2f} s with {os.cpu_count()} workers; table {table.nbytes} bytes")
+    print(f"All points meet the targets: {check.ok.all()} (PM {check.pm.min():.2f}..{check.pm.max():.2f} deg, "
+          f"crossover {check.wgc.min():.3f}..{check.wgc.max():.3f} rad/s, GM {check.gm.min():.3g})")
+
+    # off-grid points: interpolated gains against the exact design, and their margins
+    rng = np.random.default_rng(0)
+    v_test, m_test = rng.uniform(5, 40, 200), rng.uniform(800, 2600, 200)
+    gains = table.lookup(v_test, m_test)
+    worst_pm = 0.0
+    for (Kp, Ki), v, m in zip(gains, v_test, m_test):
+        op = Linearizer(Vehicle(m, 0.7, 0.01, None, None)).linearize(v)
+        _, pm, _, _ = ct.margin(ct.tf([Kp, Ki], [1, 0]) * ct.tf([op.B[0, 0]], [1, -op.A[0, 0]]))
+        worst_pm = max(worst_pm, abs(pm - 60))
+    print(f"200 off-grid points: interpolated gains keep PM within {worst_pm:.2f} deg of the target "
+          f"(the linearization is on 0.5 m/s buckets)")
+
+    path = os.path.join(os.environ.get('CONTROL_PLOT_DIR', '.'), 'pi_gain_table.npz')
+    table.save(path)
+    assert np.array_equal(GainTable.load(path).gains, table.gains)
+    os.remove(path)
+
+    # === 5. Constant-time lookup ===
+    for size in ((8, 8), (71, 19), (700, 190)):
+        big = GainTable(np.linspace(5, 40, size[0]), np.linspace(800, 2600, size[1]), np.ones(size + (2,)))
+        n_calls = 20000
+        start = time.perf_counter()
+        for k in range(n_calls):
+            big.lookup_one(25.0, 1500.0)
+        single = (time.perf_counter() - start) / n_calls
+        assert np.allclose(big.lookup_one(25.3, 1517.0), big.lookup(25.3, 1517.0))
+        v_fleet, m_fleet = rng.uniform(5, 40, 10000), rng.uniform(800, 2600, 10000)
+        start = time.perf_counter()
+        big.lookup(v_fleet, m_fleet)
+        fleet = time.perf_counter() - start
+        print(f"Table {size[0]:3d} x {size[1]:3d}: {single * 1e6:.1f} us per lookup, "
+              f"{fleet / 10000 * 1e9:.0f} ns per vehicle for 10000 vehicles")
+
+    # === 6. Fixed vs scheduled gains: set speed step 20 -> 25 m/s on a flat road ===
+    flat = Road([0, 1e6], [0, 0])
+    fleet_m = np.linspace(800, 2600, 7)
+    n = len(fleet_m)
+    fleet = Vehicle(fleet_m, np.full(n, 0.7), np.full(n, 0.01), np.full(n, -8000.0), np.full(n, 8000.0))
+    r = lambda t: np.where(t < 1, 20.0, 25.0)
+    start_force = np.array([Linearizer(fleet._replace(m=m)).linearize(20.0).u_trim for m in fleet_m])
+    fixed = PIController(200.0, 50.0, fleet.u_min, fleet.u_max)
+    scheduled = ScheduledPIController(table, fleet_m, fleet.u_min, fleet.u_max)
+    runs = {
+        'Fixed PI (Kp = 200, Ki = 50)': simulate_fleet(fleet, flat, fixed, r, 60.0, h=0.05, v0=20.0,
+                                                        z0=start_force / 50.0, record_every=2),
+        'Scheduled PI': simulate_fleet(fleet, flat, scheduled, r, 60.0, h=0.05, v0=20.0,
+                                       z0=scheduled.bumpless_state(start_force, 0.0, 20.0), record_every=2),
+    }
+    for name, traj in runs.items():
+        above90 = np.argmax(traj.v >= 20 + 0.9 * 5, axis=0)
+        rise = traj.T[above90] - 1
+        overshoot = (traj.v.max(axis=0) - 25) / 5 * 100
+        print(f"{name}: rise time {rise.min():.1f}..{rise.max():.1f} s, overshoot "
+              f"{overshoot.min():.1f}..{overshoot.max():.1f}% over masses {fleet_m[0]:.0f}..{fleet_m[-1]:.0f} kg")
+
+    # bumpless transfer: switch from the fixed PI to the scheduled one in mid-transient
+    mid = runs['Fixed PI (Kp = 200, Ki = 50)']
+    k = np.searchsorted(mid.T, 3.0)
+    e, v = 25.0 - mid.v[k], mid.v[k]
+    u_before = mid.u[k]
+    z_bumpless = scheduled.bumpless_state(u_before, e, v)
+    jump_bumpless = np.abs(scheduled.force(e, z_bumpless, v) - u_before).max()
+    jump_naive = np.abs(scheduled.force(e, np.zeros(n), v) - u_before).max()
+    print(f"Switch to scheduled gains at t = 3 s: force jump {jump_bumpless:.1e} N bumpless, "
+          f"{jump_naive:.0f} N with the integrator reset")
+
+    # === 7. Plots ===
+    fig, axes = plt.subplots(1, 2, figsize=(12, 4.5))
+    for ax, k, label in zip(axes, (0, 1), ("Kp (N s/m)", "Ki (N/m)")):
+        im = ax.imshow(table.gains[:, :, k].T, origin='lower', aspect='auto',
+                       extent=[speeds[0], speeds[-1], masses[0], masses[-1]])
+        fig.colorbar(im, ax=ax, label=label)
+        ax.set_xlabel("Speed (m/s)")
+        ax.set_ylabel("Mass (kg)")
+        ax.set_title(label.split()[0])
+    fig.suptitle("Gain Schedule: PI Cruise Control, wc = 0.5 rad/s, PM = 60 deg")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'gain_schedule_table.pdf'))
+    else:
+        plt.show()
+
+    fig, axes = plt.subplots(1, 2, figsize=(12, 4.5), sharey=True)
+    for ax, (name, traj) in zip(axes, runs.items()):
+        for i in range(n):
+            ax.plot(traj.T, traj.v[:, i], label=f"m = {fleet_m[i]:.0f} kg")
+        ax.set_title(name)
+        ax.set_xlabel("Time (s)")
+        ax.grid()
+    axes[0].set_ylabel("Velocity (m/s)")
+    axes[1].legend()
+    fig.suptitle("Set Speed Step: Fixed vs Scheduled Gains")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'gain_schedule_step.pdf'))
+    else:
+        plt.show()
@@ -0,0 +1,325 @@
+"""
+This code simulates a fleet of cruise-controlled vehicles with a nonlinear longitudinal model,
+instead of the linear m*v_dot = -b*v + u + d with a constant hill force of cruise_control_PID.py:
+
+    m v_dot = sat(u) - 0.5 rho CdA v|v| - Crr m g cos(theta) sign(v) - m g sin(theta)
+
+with quadratic aerodynamic drag, rolling resistance, the road grade tan(theta) read from a
+grade profile at each vehicle's position, and an actuator limited to [u_min, u_max] (engine
+force / braking).  Every vehicle has its own mass, drag area and rolling resistance; all vehicles
+are integrated together with a fixed-step RK4 kernel on (N,) arrays, and a PI controller with
+clamping anti-windup closes the loop.
+
+The linearization service returns the Jacobians of a vehicle's model at an operating point
+(speed, grade) for the linear analysis tools.  Operating points are bucketed (by default 0.5 m/s and 0.5%
+grade) and the Jacobians of every bucket are computed once, at the bucket center, and cached.
+
+"""
+
+import os
+import time
+from collections import OrderedDict, namedtuple
+import numpy as np
+import matplotlib.pyplot as plt
+import control as ct
+
+RHO = 1.2  # air density (kg/m^3)
+G = 9.81   # gravity (m/s^2)
+
+# parameters of one vehicle (scalars) or of a fleet ((N,) arrays)
+Vehicle = namedtuple('Vehicle', ['m', 'CdA', 'Crr', 'u_min', 'u_max'])
+# linearization at (speed, grade): v_dot = A dv + B du + E dgrade around the trim force u_trim
+OperatingPoint = namedtuple('OperatingPoint', ['speed', 'grade', 'u_trim', 'A', 'B', 'E'])
+Trajectory = namedtuple('Trajectory', ['T', 'x', 'v', 'u', 'grade', 'saturated'])
+
+
+# === 1. Vehicle model ===
+def sample_fleet(n, rng, m=(800, 2500), CdA=(0.5, 0.9), Crr=(0.008, 0.015), power=(40e3, 100e3), u_min=-8000,
+                 v_ref=25):
+    """n vehicles with uniformly drawn mass, drag area, rolling resistance and engine power."""
+    # the force limit is that of the engine power at the cruising speed v_ref
+    return Vehicle(rng.uniform(*m, size=n), rng.uniform(*CdA, size=n), rng.uniform(*Crr, size=n),
+                   np.full(n, float(u_min)), rng.uniform(*power, size=n) / v_ref)
+
+
+def resistance(v, grade, vehicle):
+    """Drag, rolling resistance and grade force (N) opposing the motion."""
+    # cos(theta) = 1 / sqrt(1 + grade^2), sin(theta) = grade / sqrt(1 + grade^2)
+    normal = vehicle.m * G / np.sqrt(1 + grade * grade)
+    return 0.5 * RHO * vehicle.CdA * v * np.abs(v) + normal * (vehicle.Crr * np.sign(v) + grade)
+
+
+def acceleration(v, u, grade, vehicle):
+    """v_dot of the nonlinear model for the commanded force u (saturated here)."""
+    return (np.minimum(np.maximum(u, vehicle.u_min), vehicle.u_max) - resistance(v, grade, vehicle)) / vehicle.m
+
+
+class Road:
+    """Grade profile tan(theta) as a function of position, interpolated and repeating after length."""
+
+    def __init__(self, position, grade):
+        self.position = np.asarray(position, dtype=float)
+        self.grade = np.asarray(grade, dtype=float)
+        self.length = self.position[-1]
+        # on a uniform grid the interval is found by division instead of a binary search
+        step = np.diff(self.position)
+        self._step = step[0] if np.allclose(step, step[0]) else None
+
+    def __call__(self, x):
+        s = np.mod(x, self.length)
+        if self._step is None:
+            return np.interp(s, self.position, self.grade)
+        s = s / self._step
+        i = np.minimum(s.astype(int), len(self.grade) - 2)
+        return self.grade[i] + (s - i) * (self.grade[i + 1] - self.grade[i])
+
+    @classmethod
+    def hills(cls, length=20000, n_hills=12, max_grade=0.08, seed=0):
+        """Smooth random hills: a sum of sinusoids periodic over length."""
+        rng = np.random.default_rng(seed)
+        x = np.linspace(0, length, 4001)
+        k = np.arange(1, n_hills + 1)
+        a = rng.normal(size=n_hills) / k
+        phase = rng.uniform(0, 2 * np.pi, n_hills)
+        grade = np.sin(2 * np.pi * np.outer(x, k) / length + phase) @ a
+        return cls(x, grade * max_grade / np.abs(grade).max())
+
+
+# === 2. Controller and RK4 fleet integration ===
+class PIController:
+    """
+    u = Kp e + Ki z with the integrator z_dot = e, for arrays of vehicles.
+
+    Clamping anti-windup: the integrator stops while the force is saturated and the error
+    would drive it further into saturation.  The speed v is passed for controllers whose gains
+    are scheduled on it (gain_scheduling.py) and unused here.
+    """
+
+    def __init__(self, Kp, Ki, u_min=-np.inf, u_max=np.inf):
+        self.Kp = Kp
+        self.Ki = Ki
+        self.u_min = u_min
+        self.u_max = u_max
+
+    def force(self, e, z, v=None):
+        return self.Kp * e + self.Ki * z
+
+    def integrator_rate(self, e, z, v=None):
+        u = self.force(e, z, v)
+        windup = ((u > self.u_max) & (e > 0)) | ((u < self.u_min) & (e < 0))
+        return np.where(windup, 0.0, e)
+
+
+def rk4_step(f, t, X, h):
+    """One classical Runge-Kutta step of X_dot = f(t, X) for stacked states."""
+    k1 = f(t, X)
+    k2 = f(t + h / 2, X + h / 2 * k1)
+    k3 = f(t + h / 2, X + h / 2 * k2)
+    k4 = f(t + h, X + h * k3)
+    return X + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+def simulate_fleet(vehicle, road, controller, r, T, h=0.05, v0=None, x0=None, z0=None, record_every=20):
+    """
+    Closed-loop RK4 simulation of all vehicles over [0, T] with step h.
+
+    r is the set speed: a scalar, an (N,) array or a function r(t) returning either.  The state
+    (x, v, z) of every vehicle (starting at x0, v0 = r(0) and z0 = 0 by default) is integrated together; every record_every steps the position,
+    speed, applied force and grade are recorded.  Returns a Trajectory with (n_records, N) arrays.
+    """
+    N = np.size(vehicle.m)
+    reference = r if callable(r) else (lambda t: r)
+    X = np.zeros((3, N))
+    X[0] = 0.0 if x0 is None else x0
+    X[1] = reference(0.0) if v0 is None else v0
+    X[2] = 0.0 if z0 is None else z0
+
+    def f(t, X):
+        x, v, z = X
+        e = reference(t) - v
+        u = controller.force(e, z, v)
+        return np.stack([v, acceleration(v, u, road(x), vehicle), controller.integrator_rate(e, z, v)])
+
+    n_steps = int(round(T / h))
+    n_records = n_steps // record_every + 1
+    out = {key: np.empty((n_records, N)) for key in ('x', 'v', 'u', 'grade')}
+    for k in range(n_steps + 1):
+        if k % record_every == 0:
+            i = k // record_every
+            out['x'][i], out['v'][i] = X[0], X[1]
+            out['u'][i] = np.clip(controller.force(reference(k * h) - X[1], X[2], X[1]), vehicle.u_min, vehicle.u_max)
+            out['grade'][i] = road(X[0])
+        if k < n_steps:
+            X = rk4_step(f, k * h, X, h)
+    saturated = (out['u'] <= vehicle.u_min) | (out['u'] >= vehicle.u_max)
+    return Trajectory(np.arange(n_records) * record_every * h, out['x'], out['v'], out['u'], out['grade'], saturated)
+
+
+# === 3. Linearization service ===
+class Linearizer:
+    """
+    Jacobians of one vehicle's model at operating points, cached per (speed, grade) bucket in a
+    bounded LRU.
+
+    The model is linearized at the center of the bucket containing (speed, grade), by central
+    differences of the same acceleration() used by the simulator, around the trim force that
+    holds the speed constant (saturation is ignored for the linearization).
+    """
+
+    def __init__(self, vehicle, speed_step=0.5, grade_step=0.005, maxsize=100000):
+        self.vehicle = Vehicle(*(None if p is None else float(np.ravel(p)[0]) for p in vehicle))
+        self.speed_step = speed_step
+        self.grade_step = grade_step
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _compute(self, speed, grade):
+        """(u_trim, A, B, E) for arrays of operating points, all at once."""
+        unsat = self.vehicle._replace(u_min=-np.inf, u_max=np.inf)
+        u_trim = resistance(speed, grade, unsat)
+        dv = 1e-6 * np.maximum(np.abs(speed), 1.0)
+        du = 1e-6 * np.maximum(np.abs(u_trim), 1.0)
+        dg = 1e-7
+        A = (acceleration(speed + dv, u_trim, grade, unsat) - acceleration(speed - dv, u_trim, grade, unsat)) / (2 * dv)
+        B = (acceleration(speed, u_trim + du, grade, unsat) - acceleration(speed, u_trim - du, grade, unsat)) / (2 * du)
+        E = (acceleration(speed, u_trim, grade + dg, unsat) - acceleration(speed, u_trim, grade - dg, unsat)) / (2 * dg)
+        return u_trim, A, B, E
+
+    def linearize_many(self, speed, grade=0.0):
+        """
+        OperatingPoint of arrays for arrays of speeds and grades (broadcast together); A, B and E
+        have the shape (..., 1, 1).  Only the buckets not yet in the cache are computed, in one
+        vectorized call.
+        """
+        speed, grade = np.broadcast_arrays(np.asarray(speed, dtype=float), np.asarray(grade, dtype=float))
+        i_v = np.round(speed.ravel() / self.speed_step).astype(np.int64)
+        i_g = np.round(grade.ravel() / self.grade_step).astype(np.int64)
+        buckets, inverse = np.unique((i_v << 32) + i_g, return_inverse=True)
+        keys = buckets.tolist()
+        missing = [j for j, key in enumerate(keys) if key not in self.cache]
+        self.misses += len(missing)
+        self.hits += speed.size - len(missing)
+        if missing:
+            sv = (buckets[missing] + 2 ** 31 >> 32) * self.speed_step
+            sg = ((buckets[missing] + 2 ** 31) % 2 ** 32 - 2 ** 31) * self.grade_step
+            values = np.stack([sv, sg, *self._compute(sv, sg)], 1)
+            for j, value in zip(missing, values.tolist()):
+                self.cache[keys[j]] = value
+        for key in keys:
+            self.cache.move_to_end(key)
+        values = np.array([self.cache[key] for key in keys]).reshape(-1, 6)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        speed, grade, u_trim, A, B, E = np.moveaxis(values[inverse.ravel()].reshape(speed.shape + (6,)), -1, 0)
+        return OperatingPoint(speed, grade, u_trim, A[..., None, None], B[..., None, None], E[..., None, None])
+
+    def linearize(self, speed, grade=0.0):
+        """OperatingPoint at one (speed, grade)."""
+        return OperatingPoint(*(np.asarray(value)[()] for value in self.linearize_many(speed, grade)))
+
+    def linear_model(self, speed, grade=0.0):
+        """ct.ss model from (force, grade) deviations to the speed deviation, for the linear tools."""
+        op = self.linearize(speed, grade)
+        return ct.ss(op.A, np.hstack([op.B, op.E]), [[1.0]], [[0.0, 0.0]])
+
+
+if __name__ == '__main__':
+
+    # === 4. RK4 kernel vs an adaptive solver, and the linearization vs the linear model ===
+    from scipy.integrate import solve_ivp
+    road = Road.hills()
+    car = Vehicle(np.array([1000.0]), np.array([0.7]), np.array([0.01]), np.array([-8000.0]), np.array([4000.0]))
+    pi = PIController(200, 50, car.u_min, car.u_max)
+    ref = simulate_fleet(car, road, pi, 25.0, 200.0, h=0.05, record_every=1)
+
+    def f(t, X):
+        e = 25.0 - X[1]
+        return [X[1], acceleration(X[1], pi.force(e, X[2]), road(X[0]), car)[0], pi.integrator_rate(e, X[2])[0]]
+
+    exact = solve_ivp(f, (0, 200), [0, 25, 0], t_eval=ref.T, rtol=1e-10, atol=1e-10, max_step=0.05)
+    print(f"RK4 (h = 0.05 s) vs solve_ivp: max speed difference {np.max(np.abs(ref.v[:, 0] - exact.y[1])):.1e} m/s")
+
+    linearizer = Linearizer(car)
+    op = linearizer.linearize(25.0, 0.0)
+    b_eff = -op.A[0, 0] * car.m[0]
+    print(f"Linearization at 25 m/s, flat: A = {op.A[0, 0]:.5f} (analytic -rho CdA v/m = "
+          f"{-RHO * 0.7 * 25 / 1000:.5f}), B = {op.B[0, 0]:.2e}, E = {op.E[0, 0]:.3f}, trim force {op.u_trim:.1f} N, "
+          f"equivalent damping b = {b_eff:.1f} N s/m (cruise_control_PID.py: b = 50)")
+
+    # small step in the set speed from the trim point (integrator holding the trim force)
+    flat = Road([0, 1e6], [0, 0])
+    step = simulate_fleet(car, flat, PIController(200, 50), 25.2, 60.0, h=0.05, v0=25.0,
+                          z0=op.u_trim / 50, record_every=1)
+    loop = ct.feedback(ct.tf([200, 50], [1, 0]) * ct.ss(op.A, op.B, [[1.0]], [[0.0]]))
+    T_lin, y_lin = ct.step_response(0.2 * loop, step.T)
+    print(f"0.2 m/s set-speed step: nonlinear vs linearized closed loop, max difference "
+          f"{np.max(np.abs(step.v[:, 0] - 25.0 - y_lin)):.1e} m/s")
+
+    # === 5. Fleet of 5000 vehicles on a hilly road ===
+    rng = np.random.default_rng(1)
+    n = 5000
+    fleet = sample_fleet(n, rng)
+    controller = PIController(200.0, 50.0, fleet.u_min, fleet.u_max)
+    x0 = rng.uniform(0, road.length, n)
+    start_time = time.perf_counter()
+    traj = simulate_fleet(fleet, road, controller, 25.0, 300.0, h=0.1, v0=25.0, x0=x0, record_every=10)
+    elapsed = time.perf_counter() - start_time
+    n_steps = int(round(300.0 / 0.1))
+    print(f"\n{n} vehicles, {n_steps} RK4 steps in {elapsed:.2f} s "
+          f"({n * n_steps / elapsed / 1e6:.1f} M vehicle-steps/s)")
+    err = traj.v - 25.0
+    print(f"Speed error: RMS {np.sqrt(np.mean(err ** 2)):.2f} m/s, worst {np.abs(err).max():.2f} m/s; "
+          f"saturated {100 * traj.saturated.mean():.1f}% of the time")
+
+    # Jacobians of a vehicle class along all trajectories: most operating points share buckets
+    heavy = Linearizer(Vehicle(2000.0, 0.8, 0.012, None, None))
+    start_time = time.perf_counter()
+    points = heavy.linearize_many(traj.v, traj.grade)
+    elapsed = time.perf_counter() - start_time
+    print(f"{points.A.size} linearizations in {elapsed * 1e3:.0f} ms: {heavy.misses} buckets computed, "
+          f"{heavy.hits} from the cache")
+    start_time = time.perf_counter()
+    heavy.linearize_many(traj.v, traj.grade)
+    print(f"Repeated: {(time.perf_counter() - start_time) * 1e3:.0f} ms, all from the cache")
+    i = np.unravel_index(np.argmax(points.grade), points.grade.shape)
+    print(f"Steepest point: speed {points.speed[i]:.1f} m/s, grade {100 * points.grade[i]:.1f}%, "
+          f"trim force {points.u_trim[i]:.0f} N, A = {points.A[i][0, 0]:.4f}, E = {points.E[i][0, 0]:.3f}")
+
+    # === 6. Plots ===
+    fig, axes = plt.subplots(3, 1, figsize=(10, 9), sharex=True)
+    idx = np.argsort(fleet.m)[np.linspace(0, n - 1, 5).astype(int)]
+    for i in idx:
+        axes[0].plot(traj.T, traj.v[:, i], label=f"m = {fleet.m[i]:.0f} kg")
+        axes[1].plot(traj.T, traj.u[:, i])
+        axes[2].plot(traj.T, 100 * traj.grade[:, i])
+    axes[0].set_ylabel("Velocity (m/s)")
+    axes[0].legend()
+    axes[1].set_ylabel("Applied force (N)")
+    axes[2].set_ylabel("Grade (%)")
+    axes[2].set_xlabel("Time (s)")
+    for ax in axes:
+        ax.grid()
+    fig.suptitle("Nonlinear Fleet Simulation: PI Cruise Control on Hills")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'nonlinear_fleet_simulation.pdf'))
+    else:
+        plt.show()
+
+    plt.figure()
+    plt.fill_between(traj.T, *np.percentile(traj.v, [1, 99], axis=1), alpha=0.3, label="1-99 percentile")
+    plt.fill_between(traj.T, *np.percentile(traj.v, [25, 75], axis=1), alpha=0.5, label="25-75 percentile")
+    plt.plot(traj.T, np.median(traj.v, axis=1), 'k', label="Median")
+    plt.title(f"Fleet Speed Distribution: {n} Vehicles")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Velocity (m/s)")
+    plt.legend()
+    plt.grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'fleet_speed_distribution.pdf'))
+    else:
+        plt.show()
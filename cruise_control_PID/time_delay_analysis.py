@@ -0,0 +1,309 @@
+"""
+This code adds the actuator and sensor delay that cruise_control_PID.py ignores.  A delay tau in
+the loop multiplies the loop transfer function by e^(-s tau), which is applied exactly in the
+frequency domain instead of through a Pade approximation with extra states:
+
+- |L(jw)| does not change and the phase drops by w tau, so the gain crossovers come once from
+  the polynomial |N(jw)|^2 = |D(jw)|^2 and the phase margin of every tau follows from them.
+- The delay margin is min over the gain crossovers wc of PM(wc) / wc.
+- Phase crossovers (negative real axis) are bracketed on a frequency grid and refined by
+  bisection on Im L(jw), for all tau at once.
+
+Time responses use a ring buffer of past controller outputs instead of extra states: the plant
+is discretized exactly for a zero-order-hold input delayed by tau (the fractional part of the
+delay splits each sample's input into two contributions).  Every function works on an array of
+delays at once.
+
+"""
+
+import os
+import time
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+import control as ct
+
+
+# === Frequency domain ===
+def loop_response(num, den, omega, taus=0.0):
+    """L(jw) = N(jw) / D(jw) e^(-jw tau), shape (n_tau, n_omega)."""
+    omega = np.asarray(omega, dtype=float)
+    taus = np.atleast_1d(np.asarray(taus, dtype=float))
+    L0 = np.polyval(num, 1j * omega) / np.polyval(den, 1j * omega)
+    return L0 * np.exp(-1j * np.outer(taus, omega))
+
+
+def bode_delay(num, den, omega, taus):
+    """Magnitude (dB, same for all tau) and unwrapped phase (deg, shape (n_tau, n_omega)) with delays."""
+    L0 = loop_response(num, den, omega)[0]
+    mag = 20 * np.log10(np.abs(L0))
+    phase = np.degrees(np.unwrap(np.angle(L0)) - np.outer(np.atleast_1d(taus), omega))
+    return mag, phase
+
+
+def gain_crossovers(num, den):
+    """All frequencies w > 0 with |N(jw)| = |D(jw)|, from the roots of N(s)N(-s) - D(s)D(-s)."""
+    def mirror(p):
+        p = np.atleast_1d(np.asarray(p, dtype=float))
+        return p * (-1.0) ** np.arange(len(p) - 1, -1, -1)
+    num, den = np.atleast_1d(num).astype(float), np.atleast_1d(den).astype(float)
+    p = np.polysub(np.polymul(num, mirror(num)), np.polymul(den, mirror(den)))
+    roots = np.roots(np.trim_zeros(p, 'f'))
+    w = roots.imag[(np.abs(roots.real) < 1e-8 * (1 + np.abs(roots))) & (roots.imag > 0)]
+    return np.sort(w)
+
+
+def delay_margin(num, den):
+    """
+    Largest additional loop delay (s) that keeps the unity-feedback loop stable.
+
+    0 if the loop is unstable without delay, inf without gain crossovers.
+    """
+    if np.max(np.roots(np.polyadd(den, num)).real) >= 0:
+        return 0.0
+    wc = gain_crossovers(num, den)
+    if len(wc) == 0:
+        return np.inf
+    pm = np.remainder(np.angle(np.polyval(num, 1j * wc) / np.polyval(den, 1j * wc)) + np.pi, 2 * np.pi)
+    return np.min(pm / wc)
+
+
+def margins_delay(num, den, taus, omega=None, n_bisect=60):
+    """
+    Gain and phase margins of L(s) e^(-s tau) for every tau, in the convention of ct.margin.
+
+    Returns (gm, pm (deg), wpc, wgc) arrays of shape (n_tau,).  The phase crossovers are
+    searched on omega (default logspace(-3, 3, 20000)); its spacing must resolve the phase
+    slope tau of the largest delay.
+    """
+    taus = np.atleast_1d(np.asarray(taus, dtype=float))
+    omega = np.logspace(-3, 3, 20000) if omega is None else np.asarray(omega, dtype=float)
+
+    # phase margin: crossovers independent of tau
+    wc = gain_crossovers(num, den)
+    if len(wc):
+        phase_c = np.angle(np.polyval(num, 1j * wc) / np.polyval(den, 1j * wc))[None, :] - np.outer(taus, wc)
+        pm_all = np.degrees(np.remainder(phase_c + np.pi, 2 * np.pi))
+        pm_all = np.where(pm_all > 180, pm_all - 360, pm_all)
+        best = np.argmin(np.abs(pm_all), axis=1)
+        pm = pm_all[np.arange(len(taus)), best]
+        wgc = wc[best]
+    else:
+        pm, wgc = np.full(len(taus), np.inf), np.full(len(taus), np.nan)
+
+    # gain margin: crossings of the negative real axis, where the unwrapped phase passes an odd
+    # multiple of -180 deg; bracketed on the grid in real arithmetic (the phase of L0 is shared)
+    L0 = loop_response(num, den, omega)[0]
+    phase0 = np.unwrap(np.angle(L0))
+    turns = np.floor((phase0[None, :] - np.outer(taus, omega) + np.pi) / (2 * np.pi))
+    i_tau, i_w = np.nonzero(turns[:, 1:] != turns[:, :-1])
+
+    # per tau keep the two brackets with |L| closest to 1 (the candidates for the smallest
+    # |log gm|) and refine only those by bisection on Im L(jw)
+    closeness = np.abs(np.log(np.abs(L0[i_w])))
+    order = np.lexsort((closeness, i_tau))
+    rank = np.arange(len(order)) - np.searchsorted(i_tau[order], i_tau[order])
+    keep = order[rank < 2]
+    i_tau, lo, hi = i_tau[keep], omega[i_w[keep]], omega[i_w[keep] + 1]
+    im_lo = (L0[i_w[keep]] * np.exp(-1j * lo * taus[i_tau])).imag
+    for _ in range(n_bisect):
+        mid = (lo + hi) / 2
+        im_mid = (loop_response(num, den, mid)[0] * np.exp(-1j * mid * taus[i_tau])).imag
+        same = np.sign(im_mid) == np.sign(im_lo)
+        lo, hi = np.where(same, mid, lo), np.where(same, hi, mid)
+        im_lo = np.where(same, im_mid, im_lo)
+    wpc_all = (lo + hi) / 2
+    gm_all = 1 / np.abs(loop_response(num, den, wpc_all)[0])
+
+    gm, wpc = np.full(len(taus), np.inf), np.full(len(taus), np.nan)
+    # per tau, the crossing with the smallest |log gm|
+    order = np.lexsort((np.abs(np.log(gm_all)), i_tau))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = i_tau[order][1:] != i_tau[order][:-1]
+    gm[i_tau[order][first]] = gm_all[order][first]
+    wpc[i_tau[order][first]] = wpc_all[order][first]
+    return gm, pm, wpc, wgc
+
+
+# === Time domain ===
+def _zoh_terms(A, B, h):
+    """e^(A h) and Gamma(h) = int_0^h e^(A s) ds B for an array of step lengths h."""
+    n, m = B.shape
+    M = np.zeros((n + m, n + m))
+    M[:n, :n] = A
+    M[:n, n:] = B
+    E = scipy.linalg.expm(M[None] * np.reshape(h, (-1, 1, 1)))
+    return E[:, :n, :n], E[:, :n, n:]
+
+
+def simulate_delay(plant, controller, taus, T, r=1.0, disturbance=0.0):
+    """
+    Closed-loop responses with the controller output delayed by each tau.
+
+    plant and controller are ct state-space or transfer function objects (SISO); the
+    controller is sampled at the step of the uniform time grid T and its output passes
+    through a ring buffer.  Returns (T, Y, U) with Y, U of shape (len(T), n_tau).
+    """
+    plant, controller = ct.ss(plant), ct.ss(controller)
+    taus = np.atleast_1d(np.asarray(taus, dtype=float))
+    Ts = T[1] - T[0]
+    A, B, C = plant.A, plant.B, plant.C
+    n_tau = len(taus)
+
+    # plant with a ZOH input delayed by d samples plus a fraction eps of a sample
+    d = np.floor(taus / Ts + 1e-9).astype(int)
+    eps = taus - d * Ts
+    Ad, Gamma_full = _zoh_terms(A, B, [Ts])
+    E_rest, Gamma_rest = _zoh_terms(A, B, Ts - eps)
+    _, Gamma_eps = _zoh_terms(A, B, eps)
+    B_now = Gamma_rest[:, :, 0]                         # input of sample k - d
+    B_prev = (E_rest @ Gamma_eps)[:, :, 0]              # input of sample k - d - 1
+    Ad, B_dist = Ad[0], Gamma_full[0, :, 0]
+
+    ctrl_d = ct.c2d(controller, Ts, method='zoh')
+    Ac, Bc, Cc, Dc = ctrl_d.A, ctrl_d.B[:, 0], ctrl_d.C[0], ctrl_d.D[0, 0]
+
+    # past controller outputs, zero before t = 0
+    buffer = np.zeros((d.max() + 2, n_tau))
+    x = np.zeros((n_tau, A.shape[0]))
+    xc = np.zeros((n_tau, Ac.shape[0]))
+    Y = np.empty((len(T), n_tau))
+    U = np.empty((len(T), n_tau))
+    columns = np.arange(n_tau)
+    for k in range(len(T)):
+        Y[k] = x @ C[0]
+        e = r - Y[k]
+        U[k] = xc @ Cc + Dc * e
+        xc = xc @ Ac.T + np.outer(e, Bc)
+        buffer[k % len(buffer)] = U[k]
+        u_now = buffer[(k - d) % len(buffer), columns]
+        u_prev = buffer[(k - d - 1) % len(buffer), columns]
+        x = x @ Ad.T + u_now[:, None] * B_now + u_prev[:, None] * B_prev + disturbance * B_dist
+    return T, Y, U
+
+
+if __name__ == '__main__':
+
+    # === 1. The PI cruise control loop of cruise_control_PID.py ===
+    m, b = 1000, 50
+    Kp, Ki = 200, 50
+    P = ct.tf([1], [m, b])
+    C_PI = ct.tf([Kp, Ki], [1, 0])
+    L0 = P * C_PI
+    num, den = L0.num[0][0], L0.den[0][0]
+
+    dm = delay_margin(num, den)
+    wc = gain_crossovers(num, den)
+    gm0, pm0, _, wgc0 = ct.margin(L0)
+    print(f"Gain crossover {wc} rad/s (ct.margin {wgc0:.6g}), PM {pm0:.4g} deg -> delay margin {dm:.4f} s")
+
+    # === 2. Margins for a batch of delays vs Pade approximations ===
+    taus = np.linspace(0, 1.5 * dm, 301)
+    start = time.perf_counter()
+    gm, pm, wpc, wgc = margins_delay(num, den, taus)
+    t_exact = time.perf_counter() - start
+
+    check = [0.05, 0.5, 2.0, 0.9 * dm]
+    start = time.perf_counter()
+    for order in (3, 10):
+        for tau in check:
+            pade = ct.tf(*ct.pade(tau, order))
+            gm_p, pm_p, wpc_p, _ = ct.margin(L0 * pade)
+            gm_e, pm_e, wpc_e, _ = margins_delay(num, den, tau)
+            print(f"  tau = {tau:6.3f} s: exact GM {gm_e[0]:8.4g} at {wpc_e[0]:7.4g} rad/s, PM {pm_e[0]:7.3f} deg | "
+                  f"Pade order {order:2d}: GM {gm_p:8.4g} at {wpc_p:7.4g} rad/s, PM {pm_p:7.3f} deg")
+    start = time.perf_counter()
+    for tau in taus[:30]:
+        ct.margin(L0 * ct.tf(*ct.pade(tau, 10)))
+    t_pade = (time.perf_counter() - start) / 30 * len(taus)
+    print(f"{len(taus)} delays: exact batched margins {t_exact * 1e3:.0f} ms, "
+          f"ct.margin with order-10 Pade ~{t_pade * 1e3:.0f} ms")
+    print(f"Phase margin reaches zero at tau = {np.interp(0, pm[::-1], taus[::-1]):.4f} s (delay margin {dm:.4f} s)")
+
+    # === 3. Step responses with a delay buffer ===
+    T = np.arange(0, 60, 0.01)
+    sim_taus = np.array([0.0, 0.05, 1.0, 0.9 * dm, 1.05 * dm])
+    start = time.perf_counter()
+    _, Y, U = simulate_delay(P, C_PI, sim_taus, T)
+    t_sim = time.perf_counter() - start
+    _, y_ct = ct.step_response(ct.feedback(L0), T)
+    print(f"\n{len(sim_taus)} delays x {len(T)} steps with a delay buffer: {t_sim * 1e3:.0f} ms")
+    print(f"tau = 0 vs continuous ct.step_response: {np.max(np.abs(Y[:, 0] - y_ct)):.1e} (sampled PI, Ts = 0.01 s)")
+    pade = ct.tf(*ct.pade(1.0, 10))
+    _, y_pade = ct.step_response(ct.feedback(L0 * pade), T)
+    print(f"tau = 1 s vs order-10 Pade closed loop: {np.max(np.abs(Y[:, 2] - y_pade)):.1e}")
+    print(f"Last 10 s peak error, tau = 0.9 / 1.05 delay margins: "
+          f"{np.max(np.abs(Y[-1000:, 3] - 1)):.3g} / {np.max(np.abs(Y[-1000:, 4] - 1)):.3g}")
+
+    # === 4. Plots ===
+    omega = np.logspace(-3, 1, 2000)
+    plot_taus = np.array([0, 0.05, 1.0, dm])
+    mag, phase = bode_delay(num, den, omega, plot_taus)
+    fig, axes = plt.subplots(2, 1, sharex=True)
+    axes[0].semilogx(omega, mag)
+    axes[0].set_ylabel("Magnitude (dB)")
+    axes[0].set_title("Bode Plot of the PI Loop with Delay e^(-s tau)")
+    axes[0].grid()
+    for tau, ph in zip(plot_taus, phase):
+        axes[1].semilogx(omega, ph, label=f"tau = {tau:.3g} s")
+    axes[1].axhline(-180, color='k', linewidth=0.8)
+    axes[1].set_ylim(-540, 0)
+    axes[1].set_xlabel("Frequency (rad/s)")
+    axes[1].set_ylabel("Phase (deg)")
+    axes[1].legend()
+    axes[1].grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'delay_bode.pdf'))
+    else:
+        plt.show()
+
+    plt.figure()
+    omega = np.logspace(-2, 1, 3000)
+    for tau, L in zip(plot_taus, loop_response(num, den, omega, plot_taus)):
+        plt.plot(L.real, L.imag, label=f"tau = {tau:.3g} s")
+    plt.plot([-1], [0], 'r+', markersize=12)
+    plt.xlim(-3, 1)
+    plt.ylim(-3, 1)
+    plt.title("Nyquist Plot of the PI Loop with Delay")
+    plt.xlabel("Real")
+    plt.ylabel("Imaginary")
+    plt.legend()
+    plt.grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'delay_nyquist.pdf'))
+    else:
+        plt.show()
+
+    fig, axes = plt.subplots(2, 1, sharex=True)
+    axes[0].plot(taus, pm)
+    axes[0].axvline(dm, color='r', linestyle='--', label=f"delay margin {dm:.3g} s")
+    axes[0].set_ylabel("Phase margin (deg)")
+    axes[0].set_title("Margins of the PI Loop vs Loop Delay")
+    axes[0].legend()
+    axes[0].grid()
+    axes[1].semilogy(taus, gm)
+    axes[1].set_xlabel("Delay tau (s)")
+    axes[1].set_ylabel("Gain margin")
+    axes[1].grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'delay_margins.pdf'))
+    else:
+        plt.show()
+
+    plt.figure()
+    for tau, y in zip(sim_taus, Y.T):
+        plt.plot(T, y, label=f"tau = {tau:.3g} s")
+    plt.ylim(-0.5, 2.5)
+    plt.title("PI Cruise Control Step Responses with Loop Delay")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Velocity (m/s)")
+    plt.legend()
+    plt.grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'delay_step_responses.pdf'))
+    else:
+        plt.show()
@@ -0,0 +1,452 @@
+"""
+This code analyzes the digital implementation of the course controllers (the cruise control PI/PID
+of cruise_control_PID.py and the state feedback of state_feedback_pole_placement.py) over a range
+of sample periods Ts, to find the cheapest sample rate that keeps the continuous-time performance.
+
+The plant is always sampled with a zero-order hold (exact for a DAC that holds the input); the
+controller is discretized with
+    'zoh'      zero-order hold
+    'tustin'   bilinear transform s = 2/Ts (z - 1)/(z + 1)
+    'prewarp'  bilinear transform matched at a frequency w0, s = w0/tan(w0 Ts/2) (z - 1)/(z + 1)
+    'matched'  poles and zeros mapped by z = e^(s Ts), gain matched at DC; as in
+               ct.sample_system, zeros at infinity stay there, and poles/zeros at s = 0
+               (integrators) are handled, which ct.sample_system cannot do
+For all periods at once (stacks of state-space matrices, batched expm, solve and eig) it returns
+the discrete closed-loop poles, gain and phase margins of the sampled loop and step metrics.  The
+step metrics are taken from the intersample response: the plant output between samples follows
+exactly from the held input, so oscillations that the samples miss are not overlooked.
+
+"""
+
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+import control as ct
+
+METHODS = ('zoh', 'tustin', 'prewarp', 'matched')
+
+# per period: closed-loop poles (N, n), spectral radius, margins (ct.margin convention, rad/s),
+# step metrics from the intersample response and the overshoot seen at the samples only
+Sweep = namedtuple('Sweep', ['periods', 'poles', 'radius', 'gm', 'pm', 'wpc', 'wgc', 'overshoot',
+                             'rise_time', 'settling_time', 'sample_overshoot', 'T', 'y'])
+Metrics = namedtuple('Metrics', ['overshoot', 'rise_time', 'settling_time'])
+
+
+# === Discretization of stacks of state-space models ===
+def zoh(A, B, periods):
+    """ZOH discretization (Ad, Bd) of (A, B) for every period, stacked along the first axis."""
+    n, m = B.shape
+    M = np.zeros((n + m, n + m))
+    M[:n, :n] = A
+    M[:n, n:] = B
+    E = scipy.linalg.expm(M[None] * np.reshape(periods, (-1, 1, 1)))
+    return E[:, :n, :n], E[:, :n, n:]
+
+
+def bilinear(A, B, C, D, periods, prewarp=None):
+    """Tustin discretization for every period, prewarped at the frequency prewarp (rad/s) if given."""
+    periods = np.asarray(periods, dtype=float)
+    # s = 2/h (z - 1)/(z + 1) with h = Ts, or h = 2 tan(w0 Ts / 2) / w0 when prewarping
+    h = periods if prewarp is None else 2 * np.tan(prewarp * periods / 2) / prewarp
+    n = A.shape[0]
+    I_minus = np.eye(n)[None] - h[:, None, None] / 2 * A[None]
+    I_plus = np.eye(n)[None] + h[:, None, None] / 2 * A[None]
+    Ad = np.linalg.solve(I_minus, I_plus)
+    Bd = np.linalg.solve(I_minus, h[:, None, None] * np.broadcast_to(B, (len(h),) + B.shape))
+    Cd = np.swapaxes(np.linalg.solve(np.swapaxes(I_minus, 1, 2), np.broadcast_to(C.T, (len(h),) + C.T.shape)), 1, 2)
+    Dd = D[None] + Cd @ B * (h[:, None, None] / 2)
+    return Ad, Bd, Cd, Dd
+
+
+def _companion(num, den):
+    """Stacked controllable canonical realizations of proper discrete transfer functions num/den."""
+    N, k = den.shape
+    n = k - 1
+    num = np.concatenate([np.zeros((N, k - num.shape[1])), num], 1) / den[:, :1]
+    den = den / den[:, :1]
+    A = np.zeros((N, n, n))
+    A[:, 0, :] = -den[:, 1:]
+    A[:, 1:, :-1] = np.eye(n - 1)
+    B = np.zeros((N, n, 1))
+    B[:, 0, 0] = 1
+    D = num[:, :1, None]
+    C = (num[:, 1:] - num[:, :1] * den[:, 1:])[:, None, :]
+    return A, B, C, D
+
+
+def matched(num, den, periods, tol=1e-9):
+    """Matched pole-zero discretization for every period, as stacked (A, B, C, D)."""
+    zeros, poles = np.roots(num), np.roots(den)
+    gain = num[np.flatnonzero(num)[0]] / den[0]
+    z0, p0 = np.abs(zeros) < tol, np.abs(poles) < tol
+    periods = np.asarray(periods, dtype=float)[:, None]
+    # s -> (z - 1)/Ts for the factors at the origin; the others keep their DC gain
+    gain_d = gain * periods[:, 0] ** (p0.sum() - z0.sum())
+    gain_d = gain_d * np.prod((-zeros[~z0]) / (1 - np.exp(zeros[~z0] * periods)), axis=1).real
+    gain_d = gain_d * np.prod((1 - np.exp(poles[~p0] * periods)) / (-poles[~p0]), axis=1).real
+    num_d = np.array([np.poly(row).real for row in np.exp(zeros * periods)]) * gain_d[:, None]
+    den_d = np.array([np.poly(row).real for row in np.exp(poles * periods)])
+    return _companion(num_d.reshape(len(periods), -1), den_d)
+
+
+def discretize(controller, periods, method='zoh', prewarp=None):
+    """Stacked discrete (A, B, C, D) of a SISO continuous controller for every period."""
+    periods = np.atleast_1d(np.asarray(periods, dtype=float))
+    sys = ct.ss(controller)
+    A, B, C, D = (np.atleast_2d(np.asarray(M, dtype=float)) for M in (sys.A, sys.B, sys.C, sys.D))
+    N = len(periods)
+    if A.shape[0] == 0:  # static gain
+        return np.zeros((N, 0, 0)), np.zeros((N, 0, 1)), np.zeros((N, 1, 0)), np.broadcast_to(D, (N, 1, 1)).copy()
+    if method == 'zoh':
+        Ad, Bd = zoh(A, B, periods)
+        return Ad, Bd, np.broadcast_to(C, (N,) + C.shape).copy(), np.broadcast_to(D, (N,) + D.shape).copy()
+    if method in ('tustin', 'prewarp'):
+        if method == 'prewarp' and prewarp is None:
+            raise ValueError("method 'prewarp' needs a prewarp frequency")
+        return bilinear(A, B, C, D, periods, prewarp if method == 'prewarp' else None)
+    if method == 'matched':
+        tf = ct.tf(controller)
+        return matched(np.asarray(tf.num[0][0], dtype=float), np.asarray(tf.den[0][0], dtype=float), periods)
+    raise ValueError(f"unknown method '{method}', expected one of {METHODS}")
+
+
+# === Sampled loops ===
+def loop_models(plant, controller, periods, method='zoh', prewarp=None):
+    """
+    Stacked open-loop (controller then plant) and unity-feedback closed-loop models.
+
+    Returns (open_loop, closed_loop, plant_zoh) where open_loop and closed_loop are
+    (A, B, C, D) stacks with states [plant, controller] and plant_zoh = (Ap, Bp, Cp).  The
+    closed loop has the outputs [y, u], the held plant input is needed between samples.
+    """
+    periods = np.atleast_1d(np.asarray(periods, dtype=float))
+    P = ct.ss(plant)
+    Ap, Bp = zoh(np.asarray(P.A, dtype=float), np.asarray(P.B, dtype=float), periods)
+    Cp = np.asarray(P.C, dtype=float)
+    Ac, Bc, Cc, Dc = discretize(controller, periods, method, prewarp)
+    N, n, nc = len(periods), Ap.shape[1], Ac.shape[1]
+    Cp_s = np.broadcast_to(Cp, (N,) + Cp.shape)
+
+    A_ol = np.zeros((N, n + nc, n + nc))
+    A_ol[:, :n, :n] = Ap
+    A_ol[:, :n, n:] = Bp @ Cc
+    A_ol[:, n:, n:] = Ac
+    B_ol = np.concatenate([Bp @ Dc, Bc], 1)
+    C_ol = np.concatenate([Cp_s, np.zeros((N, 1, nc))], 2)
+    D_ol = np.zeros((N, 1, 1))
+
+    # u = Cc xc + Dc (r - Cp xp)
+    A_cl = A_ol.copy()
+    A_cl[:, :n, :n] -= Bp @ Dc @ Cp_s
+    A_cl[:, n:, :n] -= Bc @ Cp_s
+    C_cl = np.concatenate([C_ol, np.concatenate([-Dc @ Cp_s, Cc], 2)], 1)
+    D_cl = np.concatenate([D_ol, Dc], 1)
+    return (A_ol, B_ol, C_ol, D_ol), (A_cl, B_ol, C_cl, D_cl), (Ap, Bp, Cp)
+
+
+def _response(A, B, C, D, z):
+    """L(z) of stacked SISO models at the points z of shape (N, K)."""
+    n = A.shape[-1]
+    M = z[:, :, None, None] * np.eye(n) - A[:, None]
+    x = np.linalg.solve(M, np.broadcast_to(B[:, None], M.shape[:2] + B.shape[1:]))
+    return (C[:, None] @ x)[..., 0, 0] + D[:, None, 0, 0]
+
+
+def discrete_margins(A, B, C, D, periods, n_grid=2000, n_bisect=40):
+    """
+    Gain and phase margins of stacked discrete SISO loops (convention of ct.margin).
+
+    Crossings are bracketed on a grid of w Ts in (0, pi) and refined by bisection for all
+    periods at once.  Returns (gm, pm (deg), wpc, wgc (rad/s)).
+    """
+    periods = np.asarray(periods, dtype=float)
+    N = len(periods)
+    theta = np.pi * np.logspace(-5, 0, n_grid)
+    L = _response(A, B, C, D, np.broadcast_to(np.exp(1j * theta), (N, n_grid)))
+
+    def refine(f, lo, hi, rows):
+        f_lo = f(lo, rows)
+        for _ in range(n_bisect):
+            mid = (lo + hi) / 2
+            f_mid = f(mid, rows)
+            same = np.sign(f_mid) == np.sign(f_lo)
+            lo, hi, f_lo = np.where(same, mid, lo), np.where(same, hi, mid), np.where(same, f_mid, f_lo)
+        return (lo + hi) / 2
+
+    def at(th, rows):
+        return _response(A[rows], B[rows], C[rows], D[rows], np.exp(1j * th)[:, None])[:, 0]
+
+    def pick(rows, values, score):
+        """Per row, the value with the smallest score (inf/NaN where there is none)."""
+        best = np.full(N, np.nan)
+        best_arg = np.full(N, np.nan)
+        order = np.lexsort((score, rows))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = rows[order][1:] != rows[order][:-1]
+        best[rows[order][first]] = values[0][order][first]
+        best_arg[rows[order][first]] = values[1][order][first]
+        return best, best_arg
+
+    # gain crossovers |L| = 1
+    mag = np.log(np.abs(L))
+    rows, cols = np.nonzero(np.sign(mag[:, :-1]) != np.sign(mag[:, 1:]))
+    th = refine(lambda t, r: np.log(np.abs(at(t, r))), theta[cols], theta[cols + 1], rows)
+    pm_all = np.degrees(np.angle(at(th, rows))) + 180
+    pm_all = np.where(pm_all > 180, pm_all - 360, pm_all)
+    pm, wgc = pick(rows, (pm_all, th / periods[rows]), np.abs(pm_all))
+    pm[np.isnan(pm)] = np.inf
+
+    # phase crossovers on the negative real axis (including z = -1, w Ts = pi)
+    rows, cols = np.nonzero((np.sign(L.imag[:, :-1]) != np.sign(L.imag[:, 1:])) & (L.real[:, :-1] + L.real[:, 1:] < 0))
+    th = refine(lambda t, r: at(t, r).imag, theta[cols], theta[cols + 1], rows)
+    at_pi = np.flatnonzero(L.real[:, -1] < 0)
+    rows, th = np.concatenate([rows, at_pi]), np.concatenate([th, np.full(len(at_pi), np.pi)])
+    gm_all = 1 / np.abs(at(th, rows))
+    gm, wpc = pick(rows, (gm_all, th / periods[rows]), np.abs(np.log(gm_all)))
+    gm[np.isnan(gm)] = np.inf
+    return gm, pm, wpc, wgc
+
+
+def intersample_step(closed_loop, plant_zoh, periods, t_final, plant, n_intersample=10):
+    """
+    Unit step responses of stacked sampled loops, including the plant output between samples.
+
+    closed_loop has the outputs [y, u] and states starting with the plant states, plant is the
+    continuous plant (A, B).  Returns (T, y, y_samples): T and y of shape
+    (N, n_steps * n_intersample), NaN past t_final (the longer periods need fewer steps),
+    and y_samples (N, n_steps) the outputs at the sampling instants.
+    """
+    A_cl, B_cl, C_cl, D_cl = closed_loop
+    Cp = plant_zoh[2]
+    N, n = len(periods), Cp.shape[1]
+    K = int(np.ceil(t_final / np.min(periods))) + 1
+    x = np.zeros((N, A_cl.shape[1]))
+    X = np.empty((K, N, A_cl.shape[1]))
+    for k in range(K):
+        X[k] = x
+        x = np.einsum('nij,nj->ni', A_cl, x) + B_cl[:, :, 0]
+    y_samples = np.einsum('nj,knj->nk', C_cl[:, 0], X) + D_cl[:, 0, :1]
+    u = np.einsum('nj,knj->kn', C_cl[:, 1], X) + D_cl[:, 1, 0]
+
+    # exact plant state at sigma = j Ts / n_intersample into every sample, with u[k] held; only
+    # the steps up to t_final of every period are evaluated
+    periods = np.asarray(periods, dtype=float)
+    n_steps = np.minimum(np.floor(t_final / periods).astype(int) + 1, K)
+    rows = np.repeat(np.arange(N), n_steps)
+    steps = np.arange(n_steps.sum()) - np.repeat(np.cumsum(n_steps) - n_steps, n_steps)
+    sigma = np.arange(n_intersample) / n_intersample
+    E, G = zoh(plant[0], plant[1], (periods[:, None] * sigma[None]).ravel())
+    E = E.reshape(N, n_intersample, n, n)[rows]
+    G = G.reshape(N, n_intersample, n)[rows]
+    x_fine = np.einsum('msij,mj->msi', E, X[steps, rows, :n]) + G * u[steps, rows][:, None, None]
+
+    T = np.full((N, K * n_intersample), np.nan)
+    y = np.full((N, K * n_intersample), np.nan)
+    cols = steps[:, None] * n_intersample + np.arange(n_intersample)
+    T[rows[:, None], cols] = (steps[:, None] + sigma[None]) * periods[rows, None]
+    y[rows[:, None], cols] = x_fine @ Cp[0]
+    valid = T <= t_final
+    steps_valid = np.arange(K)[None] < n_steps[:, None]
+    return np.where(valid, T, np.nan), np.where(valid, y, np.nan), np.where(steps_valid, y_samples, np.nan)
+
+
+def step_metrics(T, y, final=1.0, band=0.02):
+    """Overshoot (%), 10-90% rise time and settling time (band) of stacked responses y(T) (NaN-padded)."""
+    overshoot = np.maximum(np.nanmax(y, axis=1) / final - 1, 0) * 100
+    above10 = np.where(y >= 0.1 * final, T, np.inf).min(axis=1)
+    above90 = np.where(y >= 0.9 * final, T, np.inf).min(axis=1)
+    outside = np.abs(y - final) > band * abs(final)
+    settling = np.where(outside, T, -np.inf).max(axis=1)
+    settling = np.where(np.isfinite(settling), settling, 0.0)
+    # not settled by the end of the horizon
+    settling = np.where(outside[np.arange(len(y)), np.sum(~np.isnan(y), axis=1) - 1], np.inf, settling)
+    return Metrics(overshoot, above90 - above10, settling)
+
+
+def sampled_step(closed_loop, plant_zoh, periods, plant, t_final=20.0, n_intersample=10):
+    """
+    Intersample step responses and their metrics for stacked closed loops (see intersample_step).
+
+    Returns (T, y, metrics, sample_overshoot); the metrics of unstable loops are NaN.
+    """
+    stable = np.max(np.abs(np.linalg.eigvals(closed_loop[0])), axis=1) < 1
+    with np.errstate(all='ignore'):  # unstable members overflow
+        T, y, y_samples = intersample_step(closed_loop, plant_zoh, periods, t_final, plant, n_intersample)
+        metrics = step_metrics(T, np.where(stable[:, None], y, 0.0))
+    sample_overshoot = np.maximum(np.nanmax(np.where(stable[:, None], y_samples, 0.0), axis=1) - 1, 0) * 100
+    metrics = Metrics(*(np.where(stable, v, np.nan) for v in metrics))
+    return T, y, metrics, np.where(stable, sample_overshoot, np.nan)
+
+
+def sweep(plant, controller, periods, method='zoh', prewarp=None, t_final=20.0, n_intersample=10):
+    """Closed-loop poles, margins and step metrics of the sampled loop for every period."""
+    periods = np.atleast_1d(np.asarray(periods, dtype=float))
+    open_loop, closed_loop, plant_zoh = loop_models(plant, controller, periods, method, prewarp)
+    poles = np.linalg.eigvals(closed_loop[0])
+    gm, pm, wpc, wgc = discrete_margins(*open_loop, periods)
+    P = ct.ss(plant)
+    T, y, metrics, sample_overshoot = sampled_step(closed_loop, plant_zoh, periods,
+                                                   (np.asarray(P.A, dtype=float), np.asarray(P.B, dtype=float)),
+                                                   t_final, n_intersample)
+    return Sweep(periods, poles, np.max(np.abs(poles), axis=1), gm, pm, wpc, wgc, *metrics, sample_overshoot, T, y)
+
+
+def cheapest_period(result, reference, overshoot_tol=5.0, time_tol=0.2, min_pm=30.0):
+    """
+    Largest period whose sampled loop keeps the continuous performance, and all periods that do.
+
+    reference is the Metrics of the continuous loop: the overshoot may grow by overshoot_tol
+    percentage points, rise and settling times by the fraction time_tol, and the phase margin
+    must stay above min_pm degrees.  Returns (period or None, mask over result.periods).
+    """
+    ok = ((result.radius < 1) & (result.pm >= min_pm)
+          & (result.overshoot <= reference.overshoot + overshoot_tol)
+          & (result.rise_time <= reference.rise_time * (1 + time_tol))
+          & (result.settling_time <= reference.settling_time * (1 + time_tol)))
+    # the cheapest rate is the largest period below which every period passes
+    failing = result.periods[~ok]
+    limit = failing.min() if len(failing) else np.inf
+    passing = ok & (result.periods < limit)
+    return (result.periods[passing].max() if np.any(passing) else None), passing
+
+
+def continuous_metrics(plant, controller, t_final=20.0, n=20001):
+    T = np.linspace(0, t_final, n)
+    T, y = ct.step_response(ct.feedback(controller * plant), T)
+    return step_metrics(T[None], y[None])
+
+
+if __name__ == '__main__':
+
+    # === 1. Cruise control PI and filtered PID from cruise_control_PID.py ===
+    m, b = 1000, 50
+    P = ct.tf([1], [m, b])
+    controllers = {
+        'PI': ct.tf([200, 50], [1, 0]),
+        'PID (Kd s / (0.1 s + 1))': ct.tf([200 * 0.1 + 20, 200 + 50 * 0.1, 50], [0.1, 1, 0]),
+    }
+    periods = np.logspace(-2, 1, 120)
+    t_final = 60.0
+
+    # agreement with ct.sample_system and ct.margin for a few periods
+    C_PI = controllers['PI']
+    lead = ct.tf([1, 0.5], [1, 5])
+    for method, kwargs in [('zoh', {}), ('tustin', {}), ('prewarp', {'prewarp': 2.0}), ('matched', {})]:
+        worst = 0.0
+        for Ts in (0.05, 0.5, 2.0):
+            A, B, C, D = (M[0] for M in discretize(lead, Ts, method, kwargs.get('prewarp')))
+            ct_method = {'prewarp': 'tustin'}.get(method, method)
+            ref = ct.sample_system(lead, Ts, ct_method, prewarp_frequency=kwargs.get('prewarp'))
+            z = np.exp(1j * np.linspace(0.01, 3, 50))
+            mine = np.array([(C @ np.linalg.solve(zi * np.eye(len(A)) - A, B) + D)[0, 0] for zi in z])
+            worst = max(worst, np.max(np.abs(mine - ref(z))))
+        print(f"{method:8s} discretization of a lead compensator vs ct.sample_system: {worst:.1e}")
+        assert worst < 1e-10, method
+    for Ts in (0.1, 1.0):
+        open_loop, _, _ = loop_models(P, C_PI, [Ts], 'zoh')
+        gm, pm, wpc, wgc = discrete_margins(*open_loop, np.array([Ts]))
+        gm_ct, pm_ct, wpc_ct, wgc_ct = ct.margin(ct.sample_system(C_PI, Ts, 'zoh') * ct.sample_system(P, Ts, 'zoh'))
+        # the gain margin is at the Nyquist frequency (z = -1), which ct.margin does not report
+        radius = [np.abs(np.linalg.eigvals(loop_models(P, scale * gm[0] * C_PI, [Ts])[1][0])).max()
+                  for scale in (0.999, 1.001)]
+        print(f"PI, ZOH, Ts = {Ts}: PM {pm[0]:.4f} (ct {pm_ct:.4f}), wgc {wgc[0]:.5g} (ct {wgc_ct:.5g}), "
+              f"GM {gm[0]:.4g} at {wpc[0]:.4g} rad/s = pi/Ts (ct {gm_ct:.4g}; spectral radius "
+              f"{radius[0]:.4f} / {radius[1]:.4f} at 0.999 / 1.001 GM)")
+        assert abs(pm[0] - pm_ct) < 1e-6 and abs(wgc[0] - wgc_ct) < 1e-6 * wgc_ct
+        assert np.isclose(wpc[0], np.pi / Ts) and radius[0] < 1 < radius[1]
+
+    # === 2. Sweep the sample period for every controller and method ===
+    results = {}
+    for name, controller in controllers.items():
+        reference = continuous_metrics(P, controller, t_final)
+        print(f"\n{name}: continuous overshoot {reference.overshoot[0]:.1f}%, rise time {reference.rise_time[0]:.2f} s, "
+              f"settling time {reference.settling_time[0]:.2f} s")
+        for method in METHODS:
+            start = time.perf_counter()
+            result = sweep(P, controller, periods, method, prewarp=0.3, t_final=t_final)
+            elapsed = time.perf_counter() - start
+            Ts_max, _ = cheapest_period(result, Metrics(*(v[0] for v in reference)))
+            unstable = result.periods[result.radius >= 1]
+            print(f"  {method:8s} {len(periods)} periods in {elapsed * 1e3:4.0f} ms: cheapest Ts = "
+                  f"{'none' if Ts_max is None else f'{Ts_max:.3g} s'}"
+                  f"{f', unstable from Ts = {unstable.min():.3g} s' if len(unstable) else ''}")
+            results[name, method] = result
+
+    # with the first-order plant the output is monotonic between samples, so the samples see the peak
+    result = results['PID (Kd s / (0.1 s + 1))', 'zoh']
+    print(f"\nOvershoot missed between samples (PID, ZOH): at most "
+          f"{np.nanmax(result.overshoot - result.sample_overshoot):.2g} percentage points")
+
+    # === 3. State feedback of state_feedback_pole_placement.py: u[k] = -K x[k] + kr r ===
+    A = np.array([[0., 1.], [2., 1.]])
+    B = np.array([[0.], [1.]])
+    C = np.array([[1., 0.]])
+    K = ct.place(A, B, [-2, -3])
+    kr = -1 / (C @ np.linalg.solve(A - B @ K, B))[0, 0]  # unit DC gain
+    sf_periods = np.logspace(-3, 0, 200)
+    N = len(sf_periods)
+    Ad, Bd = zoh(A, B, sf_periods)
+    A_cl = Ad - Bd @ K
+    closed_loop = (A_cl, Bd * kr, np.broadcast_to(np.vstack([C, -K]), (N, 2, 2)),
+                   np.broadcast_to([[0.], [kr]], (N, 2, 1)))
+    poles = np.linalg.eigvals(A_cl)
+    radius = np.max(np.abs(poles), axis=1)
+    # stability margins of the loop broken at the plant input, K (zI - Ad)^-1 Bd
+    gm, pm, _, _ = discrete_margins(Ad, Bd, np.broadcast_to(K, (N,) + K.shape), np.zeros((N, 1, 1)), sf_periods)
+    T_sf, y_sf, sf_metrics, sf_sample_overshoot = sampled_step(closed_loop, (Ad, Bd, C), sf_periods, (A, B), t_final=5.0)
+    reference = continuous_metrics(ct.ss(A - B @ K, B * kr, C, 0), 1, t_final=5.0)
+    exact = np.exp(np.outer(sf_periods, [-2, -3]))
+    Ts_max, _ = cheapest_period(Sweep(sf_periods, poles, radius, gm, pm, None, None, *sf_metrics, sf_sample_overshoot,
+                                      T_sf, y_sf), Metrics(*(v[0] for v in reference)))
+    print(f"\nState feedback: sampled poles approach e^(p Ts) for small Ts (Ts = {sf_periods[0]:.0e}: "
+          f"max difference {np.max(np.abs(np.sort(poles[0].real) - np.sort(exact[0]))):.1e}), "
+          f"unstable from Ts = {sf_periods[radius >= 1].min():.3g} s, cheapest Ts = {Ts_max:.3g} s")
+    i = np.nanargmax(sf_metrics.overshoot - sf_sample_overshoot)
+    print(f"  largest overshoot missed between samples: Ts = {sf_periods[i]:.3g} s, "
+          f"{sf_sample_overshoot[i]:.1f}% at the samples vs {sf_metrics.overshoot[i]:.1f}% in between")
+
+    # === 4. Plots ===
+    fig, axes = plt.subplots(2, 2, figsize=(12, 8))
+    name = 'PID (Kd s / (0.1 s + 1))'
+    for method in METHODS:
+        result = results[name, method]
+        axes[0, 0].semilogx(result.periods, result.radius, label=method)
+        axes[0, 1].semilogx(result.periods, result.pm, label=method)
+        axes[1, 0].semilogx(result.periods, result.overshoot, label=method)
+        axes[1, 1].semilogx(result.periods, result.settling_time, label=method)
+    for ax, ylabel in zip(axes.flat, ["Closed-loop spectral radius", "Phase margin (deg)",
+                                      "Overshoot, intersample (%)", "Settling time (s)"]):
+        ax.set_xlabel("Sample period Ts (s)")
+        ax.set_ylabel(ylabel)
+        ax.grid()
+        ax.legend()
+    axes[0, 0].axhline(1, color='k', linewidth=0.8)
+    fig.suptitle(f"Discretization Sweep: {name}")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'discretization_sweep.pdf'))
+    else:
+        plt.show()
+
+    plt.figure()
+    result = results[name, 'zoh']
+    for Ts in (0.05, 1.0, 3.0):
+        i = np.argmin(np.abs(result.periods - Ts))
+        line, = plt.plot(result.T[i], result.y[i], label=f"Ts = {result.periods[i]:.2g} s, intersample")
+        plt.plot(result.T[i, ::10], result.y[i, ::10], 'o', color=line.get_color(), markersize=3)
+    T, y = ct.step_response(ct.feedback(controllers[name] * P), np.linspace(0, t_final, 2000))
+    plt.plot(T, y, 'k--', label="Continuous")
+    plt.title(f"Intersample Step Responses: {name}, ZOH")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Velocity (m/s)")
+    plt.legend()
+    plt.grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'intersample_step.pdf'))
+    else:
+        plt.show()
@@ -0,0 +1,243 @@
+"""
+This code builds large sparse state-space models of N-mass spring-damper chains and simulates
+them without ever forming a dense n x n matrix.
+
+Mass i is connected to mass i-1 by a spring k_i and a damper b_i (mass 0 is the wall).  With
+the state ordered as [x_1, v_1, x_2, v_2, ...] the A matrix is block-tridiagonal with 2x2
+blocks.  Step and initial-condition responses use the action of the matrix exponential on a
+vector, computed with a Krylov (Arnoldi) method, so memory and time scale with the number of
+nonzeros of A.
+
+"""
+
+import os
+import time
+import numpy as np
+import scipy.sparse as sp
+import scipy.linalg
+import scipy.sparse.linalg
+import matplotlib.pyplot as plt
+import control as ct
+
+
+class SparseStateSpace:
+    """State-space model x' = A x + B u, y = C x + D u with sparse A, B, C."""
+
+    def __init__(self, A, B, C, D=None):
+        self.A = sp.csr_matrix(A)
+        self.B = sp.csr_matrix(B)
+        self.C = sp.csr_matrix(C)
+        n = self.A.shape[0]
+        if self.A.shape != (n, n) or self.B.shape[0] != n or self.C.shape[1] != n:
+            raise ValueError("incompatible dimensions of A, B and C")
+        self.D = np.zeros((self.C.shape[0], self.B.shape[1])) if D is None else np.atleast_2d(D)
+
+    @property
+    def nstates(self):
+        return self.A.shape[0]
+
+    @property
+    def ninputs(self):
+        return self.B.shape[1]
+
+    @property
+    def noutputs(self):
+        return self.C.shape[0]
+
+
+def chain_system(m, k, b, force_at=None, measure_at=None):
+    """
+    Sparse model of a chain of masses m[i] joined by springs k[i] and dampers b[i].
+
+    force_at lists the masses driven by an input force (default: the last mass) and
+    measure_at the masses whose positions are outputs (default: the last mass).
+    """
+    m, k, b = np.broadcast_arrays(*(np.asarray(p, dtype=float) for p in (m, k, b)))
+    m, k, b = m.ravel(), k.ravel(), b.ravel()
+    N = len(m)
+    force_at = [N - 1] if force_at is None else list(force_at)
+    measure_at = [N - 1] if measure_at is None else list(measure_at)
+
+    # tridiagonal stiffness and damping matrices, scaled by 1/m
+    k_next = np.append(k[1:], 0.0)
+    b_next = np.append(b[1:], 0.0)
+    i = np.arange(N)
+    x, v = 2 * i, 2 * i + 1     # interleaved state indices
+
+    rows = [x, v, v, v[1:], v[:-1], v[1:], v[:-1]]
+    cols = [v, x, v, x[:-1], x[1:], v[:-1], v[1:]]
+    vals = [np.ones(N),
+            -(k + k_next) / m, -(b + b_next) / m,
+            k[1:] / m[1:], k[1:] / m[:-1],
+            b[1:] / m[1:], b[1:] / m[:-1]]
+    A = sp.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                      shape=(2 * N, 2 * N)).tocsr()
+
+    B = sp.coo_matrix((1 / m[force_at], (v[force_at], np.arange(len(force_at)))),
+                      shape=(2 * N, len(force_at)))
+    C = sp.coo_matrix((np.ones(len(measure_at)), (np.arange(len(measure_at)), x[measure_at])),
+                      shape=(len(measure_at), 2 * N))
+    return SparseStateSpace(A, B, C)
+
+
+def expm_krylov(A, v, t, m=30, tol=1e-8):
+    """
+    Computes exp(t A) v with an Arnoldi approximation of dimension m.
+
+    The time interval is split into substeps whenever the a posteriori error estimate
+    beta * |[exp(tau H_bar)]_{m,0}| exceeds tol * beta; the Krylov basis is reused while
+    the substep is shortened.  A RuntimeError is raised if the estimate still exceeds tol
+    at the minimum substep (1e-12 t), since the dimension m is then too small for A.
+    """
+    w = np.array(v, dtype=float)
+    n = len(w)
+    m = min(m, n)
+    t_done, tau = 0.0, t
+    while t_done < t:
+        beta = np.linalg.norm(w)
+        if beta == 0:
+            return w
+        V = np.zeros((n, m + 1))
+        H = np.zeros((m + 1, m + 1))
+        V[:, 0] = w / beta
+        k_dim = m
+        for j in range(m):
+            p = A @ V[:, j]
+            for _ in range(2):  # classical Gram-Schmidt with reorthogonalization
+                h = V[:, :j + 1].T @ p
+                p -= V[:, :j + 1] @ h
+                H[:j + 1, j] += h
+            H[j + 1, j] = np.linalg.norm(p)
+            if H[j + 1, j] <= 1e-12 * beta:  # happy breakdown: exact in this subspace
+                k_dim = j + 1
+                break
+            V[:, j + 1] = p / H[j + 1, j]
+
+        tau = min(tau, t - t_done)
+        while True:
+            if k_dim < m:
+                F = scipy.linalg.expm(tau * H[:k_dim, :k_dim])
+                err = 0.0
+            else:
+                F = scipy.linalg.expm(tau * H)
+                err = abs(F[m, 0])
+            if err <= tol:
+                break
+            if tau <= 1e-12 * t:
+                raise RuntimeError(f"Krylov error estimate {err:.1e} exceeds tol = {tol:.1e} at the minimum "
+                                   f"substep; increase the Krylov dimension m")
+            tau *= 0.5
+        w = beta * (V[:, :k_dim] @ F[:k_dim, 0])
+        t_done += tau
+        if err < 0.1 * tol:
+            tau *= 2
+    return w
+
+
+def _propagate(sys, T, w0, A_aug, method, m, tol):
+    """Evaluates y(t) = C_aug exp(A_aug t) w0 on the time points T."""
+    T = np.asarray(T, dtype=float)
+    C_aug = sp.hstack([sys.C, sp.csr_matrix((sys.noutputs, A_aug.shape[0] - sys.nstates))]).tocsr()
+
+    steps = np.diff(T)
+    uniform = len(steps) == 0 or np.allclose(steps, steps[0], rtol=1e-9, atol=0)
+    if method == 'expm_multiply' and uniform:
+        # truncated Taylor method of Al-Mohy and Higham, uniform time grids only (other grids
+        # take the substepping path below)
+        W = scipy.sparse.linalg.expm_multiply(A_aug, w0, start=T[0], stop=T[-1], num=len(T), endpoint=True)
+        return C_aug @ W.T
+
+    w = expm_krylov(A_aug, w0, T[0], m=m, tol=tol) if T[0] != 0 else w0.copy()
+    yout = np.zeros((sys.noutputs, len(T)))
+    yout[:, 0] = C_aug @ w
+    for j in range(1, len(T)):
+        w = expm_krylov(A_aug, w, T[j] - T[j - 1], m=m, tol=tol)
+        yout[:, j] = C_aug @ w
+    return yout
+
+
+def step_response(sys, T, input=0, method='krylov', m=30, tol=1e-8):
+    """
+    Step response from zero initial state for the given input index.
+
+    The constant input is appended to the state, x_aug = [x; u] with u' = 0, so the
+    response is the action of exp(A_aug t) on [0; 1].  Returns (T, yout) as ct.step_response.
+    """
+    n = sys.nstates
+    A_aug = sp.bmat([[sys.A, sys.B[:, input]], [None, sp.csr_matrix((1, 1))]]).tocsr()
+    w0 = np.zeros(n + 1)
+    w0[-1] = 1.0
+    yout = _propagate(sys, T, w0, A_aug, method, m, tol) + sys.D[:, [input]]
+    return np.asarray(T), yout.squeeze() if sys.noutputs == 1 else yout
+
+
+def initial_response(sys, T, X0, method='krylov', m=30, tol=1e-8):
+    """Response to the initial state X0 with zero input.  Returns (T, yout) as ct.initial_response."""
+    yout = _propagate(sys, T, np.asarray(X0, dtype=float), sys.A, method, m, tol)
+    return np.asarray(T), yout.squeeze() if sys.noutputs == 1 else yout
+
+
+if __name__ == '__main__':
+
+    # === 1. Check a one-mass chain against the dense single-mass model ===
+    m, k, b = 250.0, 40.0, 60.0
+    chain_1 = chain_system([m], [k], [b])
+    sys_1 = ct.ss([[0, 1.], [-k/m, -b/m]], [[0], [1/m]], [[1., 0]], 0)
+
+    T = np.linspace(0, 100, 501)
+    T, y_sparse = step_response(chain_1, T)
+    T, y_dense = ct.step_response(sys_1, T)
+    print(f"Single mass, max step response difference: {np.max(np.abs(y_sparse - y_dense)):.2e}")
+
+    T, y_sparse = initial_response(chain_1, T, [5, 0])
+    T, y_dense = ct.initial_response(sys_1, T, X0=[5, 0])
+    print(f"Single mass, max initial response difference: {np.max(np.abs(y_sparse - y_dense)):.2e}")
+
+    # === 2. A long chain with varying elements ===
+    N = 2000
+    rng = np.random.default_rng(0)
+    m_list = rng.uniform(200, 300, N)
+    k_list = rng.uniform(2e3, 4e3, N)
+    b_list = rng.uniform(20, 80, N)
+    measure_at = [0, N // 2, N - 1]
+    chain = chain_system(m_list, k_list, b_list, force_at=[N - 1], measure_at=measure_at)
+    n = chain.nstates
+    print(f"\nChain of {N} masses: {n} states, {chain.A.nnz} nonzeros in A "
+          f"({chain.A.nnz / n**2:.2e} of a dense matrix)")
+
+    T = np.linspace(0, 200, 401)
+    start = time.perf_counter()
+    T, y_step = step_response(chain, T)
+    print(f"Step response ({len(T)} time points): {time.perf_counter() - start:.2f} s")
+
+    X0 = np.zeros(n)
+    X0[2 * (N - 1)] = 1.0  # displace the last mass
+    start = time.perf_counter()
+    T, y_init = initial_response(chain, T, X0)
+    print(f"Initial condition response ({len(T)} time points): {time.perf_counter() - start:.2f} s")
+
+    step_response_plot = plt.figure()
+    for i, mass in enumerate(measure_at):
+        plt.plot(T, y_step[i], label='mass ' + str(mass + 1))
+    plt.title(f"Step Response: {N}-Mass Chain, Force on Last Mass")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Position")
+    plt.legend()
+
+    if 'CONTROL_PLOT_DIR' not in os.environ:
+        plt.show()
+    else:
+        plt.savefig(os.environ['CONTROL_PLOT_DIR'] + '/Lec2_spring_mass_damper_chain_step.pdf')
+
+    initial_condition_plot = plt.figure()
+    for i, mass in enumerate(measure_at):
+        plt.plot(T, y_init[i], label='mass ' + str(mass + 1))
+    plt.title(f"Initial Condition Response: {N}-Mass Chain")
+    plt.xlabel("Time (s)")
+    plt.ylabel("Position")
+    plt.legend()
+
+    if 'CONTROL_PLOT_DIR' not in os.environ:
+        plt.show()
+    else:
+        plt.savefig(os.environ['CONTROL_PLOT_DIR'] + '/Lec2_spring_mass_damper_chain_init.pdf')
@@ -0,0 +1,184 @@
+"""
+This code draws phase portraits of linear systems x' = A x: trajectories from a whole grid of
+initial states together with the vector field.
+
+All initial states are stacked as the columns of one (n_states x n_initial) matrix and propagated
+together: on a uniform time grid the exact one-step propagator Phi = expm(A dt) is computed once
+and every time step is a single matrix product Phi X.  The trajectories are drawn as one path
+(separated by NaNs) or one LineCollection instead of one plot call per trajectory, which keeps
+rendering fast for 10^4 trajectories.
+
+"""
+
+import os
+import time
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+import control as ct
+
+
+# === Simulation ===
+def initial_grid(xlim, ylim, n=20):
+    """n x n initial states on a rectangle, as a (2, n * n) matrix."""
+    x, y = np.meshgrid(np.linspace(*xlim, n), np.linspace(*ylim, n))
+    return np.vstack([x.ravel(), y.ravel()])
+
+
+def initial_circle(radius=1.0, n=100):
+    """n initial states on a circle, as a (2, n) matrix."""
+    theta = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return radius * np.vstack([np.cos(theta), np.sin(theta)])
+
+
+def simulate(A, X0, T):
+    """
+    Trajectories of x' = A x from all columns of X0 at the times T.
+
+    Returns (T, X) with X of shape (len(T), n_states, n_initial).  One propagator
+    expm(A dt) is computed per distinct time step (a single one on a uniform grid).
+    """
+    A = np.asarray(A, dtype=float)
+    X0 = np.asarray(X0, dtype=float)
+    X0 = X0[:, None] if X0.ndim == 1 else X0
+    T = np.asarray(T, dtype=float)
+    X = np.empty((len(T),) + X0.shape)
+    X[0] = scipy.linalg.expm(A * T[0]) @ X0 if T[0] != 0 else X0
+    propagators = {}
+    for k, dt in enumerate(np.diff(T)):
+        key = round(dt, 12)
+        if key not in propagators:
+            propagators[key] = scipy.linalg.expm(A * dt)
+        np.matmul(propagators[key], X[k], out=X[k + 1])
+    return T, X
+
+
+def vector_field(A, xlim, ylim, n=25, dims=(0, 1)):
+    """
+    Grid (x, y) and field (u, v) of x' = A x in the plane of the states dims (others zero).
+
+    The arrays have shape (n, n) and can be passed to plt.quiver or plt.streamplot.
+    """
+    A = np.asarray(A, dtype=float)
+    x, y = np.meshgrid(np.linspace(*xlim, n), np.linspace(*ylim, n))
+    i, j = dims
+    u = A[i, i] * x + A[i, j] * y
+    v = A[j, i] * x + A[j, j] * y
+    return x, y, u, v
+
+
+# === Rendering ===
+def _decimate(xs, ys, resolution):
+    """Per trajectory, drops consecutive samples that fall into the same resolution-sized cell."""
+    cx, cy = np.round(xs / resolution), np.round(ys / resolution)
+    keep = np.ones(xs.shape, dtype=bool)
+    keep[1:-1] = (cx[1:-1] != cx[:-2]) | (cy[1:-1] != cy[:-2])
+    return keep
+
+
+def plot_trajectories(ax, X, dims=(0, 1), colors=None, resolution=None, **kwargs):
+    """
+    Draws all trajectories of X (as returned by simulate) with a single artist.
+
+    Without colors the trajectories are joined into one NaN-separated line (one draw
+    call); with one color per trajectory a LineCollection is used.  Rasterizing dominates
+    the cost for many trajectories, so with a resolution (data units, e.g. the size of a
+    pixel) samples that stay within one resolution cell are dropped first.
+    """
+    i, j = dims
+    xs, ys = X[:, i, :], X[:, j, :]
+    keep = np.ones(xs.shape, dtype=bool) if resolution is None else _decimate(xs, ys, resolution)
+    if colors is None:
+        # one NaN row after every trajectory, then the kept samples trajectory by trajectory
+        sep = np.full((1, xs.shape[1]), np.nan)
+        mask = np.vstack([keep, np.ones_like(sep, dtype=bool)]).T.ravel()
+        line, = ax.plot(np.vstack([xs, sep]).T.ravel()[mask], np.vstack([ys, sep]).T.ravel()[mask], **kwargs)
+        return line
+    segments = [np.column_stack([x[k], y[k]]) for x, y, k in zip(xs.T, ys.T, keep.T)]
+    collection = LineCollection(segments, colors=colors, **kwargs)
+    ax.add_collection(collection)
+    return collection
+
+
+def plot_portrait(ax, A, X, xlim, ylim, n_field=25, **kwargs):
+    """Trajectories, streamlines of the vector field and the real eigenvector directions."""
+    x, y, u, v = vector_field(A, xlim, ylim, n_field)
+    ax.streamplot(x, y, u, v, color='0.75', density=0.8, linewidth=0.6, arrowsize=0.8)
+    kwargs.setdefault('resolution', (xlim[1] - xlim[0]) / 1000)
+    plot_trajectories(ax, X, **kwargs)
+    eigenvalues, eigenvectors = np.linalg.eig(np.asarray(A, dtype=float))
+    for lam, vec in zip(eigenvalues, eigenvectors.T):
+        if abs(lam.imag) < 1e-12:
+            r = 2 * max(abs(xlim[0]), abs(xlim[1]), abs(ylim[0]), abs(ylim[1]))
+            ax.plot([-r * vec[0].real, r * vec[0].real], [-r * vec[1].real, r * vec[1].real], 'r--',
+                    linewidth=1, label=f'eigenvector, lambda = {lam.real:.3g}')
+    ax.set_xlim(*xlim)
+    ax.set_ylim(*ylim)
+    ax.set_xlabel("x1")
+    ax.set_ylabel("x2")
+
+
+if __name__ == '__main__':
+
+    # === 1. Systems from second_order_systems_and_diagonalization.py and linear_algebra_eigenvectors.py ===
+    alpha_list = [0, 0, -1, -1, -2, -2]
+    beta_list = [1, 2, 1, 2, 1, 2]
+    systems = [(np.array([[alpha, beta], [-beta, alpha]]), f"alpha: {alpha}, beta: {beta}")
+               for alpha, beta in zip(alpha_list, beta_list)]
+    systems.append((np.array([[-2, 0], [3, 1]]), "saddle [[-2, 0], [3, 1]]"))
+    systems.append((np.array([[-1, 0], [0, -3]]), "node [[-1, 0], [0, -3]]"))
+
+    # agreement with ct.initial_response (X0 = [1, 1] as in the lecture script)
+    T = np.linspace(0, 10, 1001)
+    print("Max difference to ct.initial_response, X0 = [1, 1]:")
+    for A, label in systems[:6]:
+        _, X = simulate(A, [1, 1], T)
+        _, y = ct.initial_response(ct.ss(A, np.zeros((2, 1)), np.eye(2), np.zeros((2, 1))), T, X0=[1, 1])
+        print(f"  {label:32s} {np.max(np.abs(X[:, :, 0] - y.T)):.1e}")
+
+    # === 2. 10^4 trajectories: propagation and rendering ===
+    A = systems[2][0]
+    X0 = initial_grid((-2, 2), (-2, 2), 100)
+    T = np.linspace(0, 10, 201)
+    start = time.perf_counter()
+    _, X = simulate(A, X0, T)
+    t_sim = time.perf_counter() - start
+
+    sys = ct.ss(A, np.zeros((2, 1)), np.eye(2), np.zeros((2, 1)))
+    start = time.perf_counter()
+    for x0 in X0.T[:100]:
+        ct.initial_response(sys, T, X0=x0)
+    t_ct = (time.perf_counter() - start) * X0.shape[1] / 100
+    print(f"\n{X0.shape[1]} trajectories x {len(T)} steps: shared propagator {t_sim * 1e3:.0f} ms, "
+          f"one ct.initial_response per trajectory ~{t_ct:.1f} s")
+
+    for name, colors in [('NaN-separated line', None),
+                         ('LineCollection', plt.cm.viridis(np.linspace(0, 1, X0.shape[1])))]:
+        for resolution in (None, 4 / 1000):
+            fig, ax = plt.subplots()
+            start = time.perf_counter()
+            artist = plot_trajectories(ax, X, colors=colors, resolution=resolution, linewidth=0.3)
+            ax.set_xlim(-2, 2)
+            ax.set_ylim(-2, 2)
+            fig.canvas.draw()
+            n_vertices = len(artist.get_xdata()) if colors is None else sum(len(p) for p in artist.get_segments())
+            print(f"Rendering {X0.shape[1]} trajectories as one {name}, "
+                  f"{'all samples' if resolution is None else 'decimated to 1/1000 of the axes'}: "
+                  f"{(time.perf_counter() - start) * 1e3:.0f} ms ({n_vertices} vertices)")
+            plt.close(fig)
+
+    # === 3. Phase portraits ===
+    fig, axes = plt.subplots(2, 4, figsize=(16, 8))
+    for ax, (A, label) in zip(axes.flat, systems):
+        lim = (-2, 2)
+        horizon = 2 if np.max(np.linalg.eigvals(A).real) > 0 else 10
+        _, X = simulate(A, initial_grid(lim, lim, 12), np.linspace(0, horizon, 300))
+        plot_portrait(ax, A, X, lim, lim, color='b', linewidth=0.7, alpha=0.7)
+        ax.set_title(label)
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' not in os.environ:
+        plt.show()
+    else:
+        plt.savefig(os.environ['CONTROL_PLOT_DIR'] + '/Lec7_phase_portraits.pdf')
@@ -0,0 +1,278 @@
+"""
+This code designs lead, lag and lead-lag compensators C(s) = K (s + a1)/(s + b1) (s + a2)/(s + b2)
+for a given plant from a phase margin, a crossover frequency and a steady-state error target.
+
+lead_lag_compensator.py uses fixed K, a and b; here (K, a, b) are searched.  The zeros and poles
+are gridded in units of the target crossover frequency, so the compensator frequency responses
+at the candidate crossover frequencies are computed once and reused for every query.  For each
+(a, b) pair and candidate crossover frequency, K follows from |K C(jw) G(jw)| = 1, and the phase
+margin and steady-state error of all candidates are evaluated at once with array operations.
+The best candidates are then checked on a full frequency grid (single gain crossover, gain
+margin, closed-loop stability) and returned ranked.
+
+"""
+
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import matplotlib.pyplot as plt
+import control as ct
+
+# K: gain, stages: ((a1, b1), ...), margins as in ct.margin (gm absolute, pm in deg, wc in rad/s)
+Design = namedtuple('Design', ['K', 'stages', 'gm', 'pm', 'wc', 'ess', 'cost'])
+
+ESS_INPUTS = {'step': 0, 'ramp': 1, 'parabola': 2}
+
+
+def compensator(K, stages):
+    """C(s) = K prod (s + a) / (s + b) as a transfer function."""
+    C = ct.tf([K], [1])
+    for a, b in stages:
+        C = C * ct.tf([1, a], [1, b])
+    return C
+
+
+def _plant_polys(plant):
+    if isinstance(plant, tuple):
+        num, den = plant
+    else:
+        tf = ct.tf(plant)
+        num, den = tf.num[0][0], tf.den[0][0]
+    num = np.trim_zeros(np.atleast_1d(np.asarray(num, dtype=float)), 'f')
+    den = np.trim_zeros(np.atleast_1d(np.asarray(den, dtype=float)), 'f')
+    return num, den
+
+
+def plant_type(num, den):
+    """Number of integrators N and static constant lim s^N G(s) of num/den."""
+    n_num = len(num) - len(np.trim_zeros(num, 'b'))
+    n_den = len(den) - len(np.trim_zeros(den, 'b'))
+    return n_den - n_num, np.trim_zeros(num, 'b')[-1] / np.trim_zeros(den, 'b')[-1]
+
+
+def steady_state_error(loop_type, static_gain, ess_input='step'):
+    """Steady-state error of the unity feedback loop for a unit step, ramp or parabola."""
+    q = ESS_INPUTS[ess_input]
+    static_gain = np.asarray(static_gain, dtype=float)
+    if loop_type > q:
+        return np.zeros_like(static_gain)
+    if loop_type < q:
+        return np.full_like(static_gain, np.inf)
+    with np.errstate(divide='ignore'):
+        return 1 / (1 + static_gain) if q == 0 else 1 / static_gain
+
+
+def _stage_pairs(ratios, lead):
+    pairs = [(a, b) for a in ratios for b in ratios if (a < b if lead else a > b)]
+    return np.array(pairs + [(1.0, 1.0)])  # the last pair is the identity (no stage)
+
+
+class LeadLagSynthesizer:
+    """
+    Precomputed search grid for lead, lag and lead-lag designs.
+
+    lead_ratios and lag_ratios are the zero/pole locations in units of the target crossover
+    frequency; crossover_band is the accepted range of the achieved crossover relative to
+    the target.  Setting cascade=False restricts the search to single stages.
+    """
+
+    def __init__(self, lead_ratios=np.logspace(-1.5, 1.5, 25), lag_ratios=np.logspace(-3, -0.5, 12),
+                 crossover_band=(0.8, 1.25), n_band=9, cascade=True, n_verify=40, n_omega=800):
+        self.rho = np.geomspace(*crossover_band, n_band)
+        self.lead = _stage_pairs(lead_ratios, lead=True)
+        self.lag = _stage_pairs(lag_ratios, lead=False) if cascade else np.array([(1.0, 1.0)])
+        self.n_verify = n_verify
+        self.omega_ratio = np.logspace(-4, 3, n_omega)
+
+        s = 1j * self.rho
+        lead_resp = (s + self.lead[:, :1]) / (s + self.lead[:, 1:])
+        lag_resp = (s + self.lag[:, :1]) / (s + self.lag[:, 1:])
+        C = lead_resp[:, None, :] * lag_resp[None, :, :]                 # (n_lead, n_lag, n_band)
+        self.shape = C.shape
+        self.C_phase = np.angle(C, deg=True)
+        self.C_inv_mag = 1 / np.abs(C)
+        dc_gain = (self.lead[:, 0] / self.lead[:, 1])[:, None] * (self.lag[:, 0] / self.lag[:, 1])[None, :]
+        self.dc_over_mag = dc_gain[..., None] * self.C_inv_mag
+        n_stages = (self.lead[:, 0] != self.lead[:, 1])[:, None] + (self.lag[:, 0] != self.lag[:, 1])[None, :]
+        lag_pole = np.where(self.lag[:, 0] != self.lag[:, 1], -np.log10(self.lag[:, 1]), 0)
+        # prefer crossovers near the target, little high-frequency gain |C(j inf)| / |C(j wc)|,
+        # fewer stages and no needlessly slow lag poles
+        self.shape_cost = (np.abs(np.log10(self.rho)) + 0.05 * np.log10(self.C_inv_mag)
+                           + (0.05 * n_stages + 0.02 * lag_pole[None, :])[..., None])
+
+    @property
+    def n_candidates(self):
+        return self.C_phase.size
+
+    def design(self, plant, pm, wc, ess=None, ess_input='step', n_best=5):
+        """
+        Ranked designs for the plant with phase margin >= pm (deg) and crossover near wc (rad/s).
+
+        ess bounds the steady-state error for a unit ess_input ('step', 'ramp' or
+        'parabola').  Designs meeting all targets come first; if none does, the closest
+        designs are returned.
+        """
+        num, den = _plant_polys(plant)
+        w = wc * self.rho
+        G = np.polyval(num, 1j * w) / np.polyval(den, 1j * w)
+        # with K = 1 / |C G| at each candidate crossover, only real arithmetic is left
+        K = self.C_inv_mag / np.abs(G)
+        # phase margin, wrapped to [-180, 180) as in ct.margin (cheaper than np.remainder)
+        phase_margin = self.C_phase + (np.angle(G, deg=True) + 180)
+        phase_margin[phase_margin >= 180] -= 360
+
+        violation = np.maximum(pm - phase_margin, 0)
+        violation *= 0.1
+        n_int, G_static = plant_type(num, den)
+        if ess is not None:
+            e = steady_state_error(n_int, self.dc_over_mag * (G_static / np.abs(G)), ess_input)
+            violation += np.maximum(e / ess - 1, 0)
+        key = np.where(violation > 0, 1e3 + violation, self.shape_cost).ravel()
+
+        n = min(self.n_verify, key.size)
+        best = np.argpartition(key, n - 1)[:n]
+        best = best[np.argsort(key[best])]
+        i_lead, i_lag, i_rho = np.unravel_index(best, self.shape)
+        single_crossover, stable, gm = self._verify(num, den, wc, K.ravel()[best], i_lead, i_lag)
+
+        designs = []
+        for j in np.flatnonzero(single_crossover & stable)[:n_best]:
+            il, ig, ir = i_lead[j], i_lag[j], i_rho[j]
+            stages = tuple((a * wc, b * wc) for a, b in (self.lead[il], self.lag[ig]) if a != b)
+            dc = np.prod([a / b for a, b in stages])
+            ess_j = float(steady_state_error(n_int, K[il, ig, ir] * dc * G_static, ess_input))
+            designs.append(Design(K[il, ig, ir], stages, gm[j], phase_margin[il, ig, ir], w[ir],
+                                  ess_j, key[best[j]]))
+        return designs
+
+    def _verify(self, num, den, wc, K, i_lead, i_lag):
+        """Single gain crossover, closed-loop stability and gain margin of the candidates."""
+        a1, b1 = self.lead[i_lead].T * wc
+        a2, b2 = self.lag[i_lag].T * wc
+
+        def loop(w, rows):
+            # rows indexes the candidates so that the parameters broadcast against w
+            s = 1j * w
+            C = (s + a1[rows]) * (s + a2[rows]) / ((s + b1[rows]) * (s + b2[rows]))
+            return K[rows] * C * np.polyval(num, s) / np.polyval(den, s)
+
+        omega = wc * self.omega_ratio
+        L = loop(omega, (slice(None), None))
+        log_mag = np.log(np.abs(L))
+        single_crossover = np.count_nonzero(np.diff(np.sign(log_mag), axis=1), axis=1) == 1
+
+        # gain margin: phase crossovers (L real and negative), refined by secant steps
+        im = L.imag
+        rows, cols = np.nonzero((np.sign(im[:, :-1]) != np.sign(im[:, 1:])) &
+                                (L.real[:, :-1] + L.real[:, 1:] < 0))
+        gm = np.full(len(K), np.inf)
+        if len(rows):
+            w0, w1 = omega[cols], omega[cols + 1]
+            f0, f1 = im[rows, cols], im[rows, cols + 1]
+            for _ in range(3):
+                w2 = w1 - f1 * (w1 - w0) / np.where(f1 != f0, f1 - f0, 1)
+                w0, f0, w1 = w1, f1, w2
+                f1 = loop(w1, rows).imag
+            margins = 1 / np.abs(loop(w1, rows))
+            # as ct.margin: the phase crossover with the smallest |log GM|
+            order = np.argsort(-np.abs(np.log(margins)))
+            gm[rows[order]] = margins[order]
+
+        # closed-loop poles: roots of den (s + b1)(s + b2) + K num (s + a1)(s + a2),
+        # as eigenvalues of a stack of companion matrices
+        ones = np.ones_like(K)
+        char = _conv_rows(den, np.stack([ones, b1 + b2, b1 * b2], axis=1))
+        char_num = _conv_rows(num, np.stack([K, K * (a1 + a2), K * a1 * a2], axis=1))
+        char[:, char.shape[1] - char_num.shape[1]:] += char_num
+        n = char.shape[1] - 1
+        companion = np.zeros((len(K), n, n))
+        companion[:, 0, :] = -char[:, 1:] / char[:, :1]
+        companion[:, np.arange(1, n), np.arange(n - 1)] = 1
+        stable = np.all(np.linalg.eigvals(companion).real < 0, axis=1)
+        return single_crossover, stable, gm
+
+
+def _conv_rows(p, Q):
+    """Convolution of the polynomial p with each row of Q."""
+    out = np.zeros((Q.shape[0], len(p) + Q.shape[1] - 1))
+    for k, c in enumerate(p):
+        out[:, k:k + Q.shape[1]] += c * Q
+    return out
+
+
+if __name__ == '__main__':
+
+    synth = LeadLagSynthesizer()
+    print(f"Search grid: {len(synth.lead) - 1} lead x {len(synth.lag) - 1} lag stages (+ single stages), "
+          f"{len(synth.rho)} crossover frequencies, {synth.n_candidates} candidates per query")
+
+    # === 1. Designs for two plants ===
+    problems = [
+        ("Type-1 plant 1/(s(s+1))", ct.tf([1], [1, 1, 0]), dict(pm=50, wc=2.0, ess=0.05, ess_input='ramp')),
+        ("Underdamped 2nd-order 1/(s^2+s+1)", ct.tf([1], [1, 1, 1]), dict(pm=60, wc=3.0, ess=0.1)),
+        ("Third-order 10/(s(s+1)(s+5))", ct.tf([10], [1, 6, 5, 0]), dict(pm=45, wc=1.5, ess=0.1, ess_input='ramp')),
+    ]
+    for label, G, targets in problems:
+        designs = synth.design(G, **targets)
+        print(f"\n=== {label}: {targets} ===")
+        print(f"{'K':>9s} {'stages (a, b)':40s} {'PM':>6s} {'wc':>6s} {'GM':>8s} {'ess':>7s} | "
+              f"ct.margin: {'PM':>6s} {'wc':>6s} {'GM':>8s}")
+        for d in designs:
+            gm, pm, _, wgc = ct.margin(compensator(d.K, d.stages) * G)
+            stages = ', '.join(f"({a:.3g}, {b:.3g})" for a, b in d.stages)
+            print(f"{d.K:9.3g} {stages:40s} {d.pm:6.1f} {d.wc:6.2f} {d.gm:8.3g} {d.ess:7.3f} | "
+                  f"{' ' * 11}{pm:6.1f} {wgc:6.2f} {gm:8.3g}")
+
+    # the hard-coded lead of lead_lag_compensator.py on the first plant, for comparison
+    G = problems[0][1]
+    gm, pm, _, wgc = ct.margin(compensator(5, [(2, 10)]) * G)
+    print(f"\nlead_lag_compensator.py lead (K=5, a=2, b=10) on {problems[0][0]}: "
+          f"PM {pm:.1f} deg at {wgc:.2f} rad/s, ramp error {steady_state_error(1, 5 * 2 / 10, 'ramp'):.2f}")
+
+    # === 2. Query time inside a plant-variant loop ===
+    rng = np.random.default_rng(0)
+    n_variants = 200
+    n_found, start = 0, time.perf_counter()
+    for _ in range(n_variants):
+        k, tau = rng.uniform(0.5, 2.0), rng.uniform(0.5, 2.0)
+        designs = synth.design(([k], [tau, 1, 0]), pm=50, wc=2.0, ess=0.05, ess_input='ramp', n_best=1)
+        n_found += bool(designs) and designs[0].cost < 1e3
+    elapsed = time.perf_counter() - start
+    print(f"\n{n_variants} plant variants k/(s(tau s + 1)): {1e3 * elapsed / n_variants:.2f} ms per design query, "
+          f"targets met for {n_found}/{n_variants}")
+
+    # === 3. Loop shapes and closed-loop step responses of the best designs ===
+    G = problems[0][1]
+    designs = synth.design(G, **problems[0][2])
+    single = next((d for d in designs if len(d.stages) == 1), None)
+    shown = [d for d in (designs[0], single) if d is not None]
+
+    fig, (ax_mag, ax_phase, ax_step) = plt.subplots(3, 1, figsize=(8, 10))
+    omega = np.logspace(-3, 2, 1000)
+    T = np.linspace(0, 10, 1000)
+    for d in shown:
+        L = compensator(d.K, d.stages) * G
+        mag, phase, _ = ct.frequency_response(L, omega)
+        label = ('lead-lag' if len(d.stages) == 2 else 'lead') + f": PM {d.pm:.0f} deg, wc {d.wc:.2f} rad/s"
+        ax_mag.semilogx(omega, 20 * np.log10(mag), label=label)
+        ax_phase.semilogx(omega, np.degrees(phase))
+        _, y = ct.step_response(ct.feedback(L), T)
+        ax_step.plot(T, y, label=label)
+    ax_mag.axhline(0, color='k', linewidth=0.5)
+    ax_phase.axhline(-180 + problems[0][2]['pm'], color='r', linestyle='--', label='PM target')
+    ax_mag.set_title("Loop Shapes of Synthesized Compensators: " + problems[0][0])
+    ax_mag.set_ylabel("Magnitude (dB)")
+    ax_phase.set_ylabel("Phase (deg)")
+    ax_phase.set_xlabel("Frequency (rad/s)")
+    ax_step.set_xlabel("Time (s)")
+    ax_step.set_ylabel("Closed-Loop Step Response")
+    for ax in (ax_mag, ax_phase, ax_step):
+        ax.grid(True)
+        ax.legend()
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        fig.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'lead_lag_synthesis.pdf'))
+    else:
+        plt.show()
@@ -0,0 +1,316 @@
+"""
+This code analyzes controllability and observability of state-space models before a
+state-feedback design: staircase forms, ranks, controllability indices and Gramians.
+
+The ranks come from the orthogonal staircase (Hessenberg) reduction instead of the rank of
+[B AB A^2B ...], whose columns become nearly parallel for larger n.  The Gramians solve the
+Lyapunov equations A W + W A' + B B' = 0 for stable A; for unstable A the finite-horizon
+Gramian W(T) = int_0^T e^(At) B B' e^(A't) dt is computed with Van Loan's matrix exponential.
+A small smallest eigenvalue (large condition number) of the controllability Gramian warns
+that pole placement will need large gains.
+
+Results are cached per (A, B, C), and a family of A matrices can be analyzed in one batch.
+
+"""
+
+import os
+import time
+import hashlib
+from collections import OrderedDict, namedtuple
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+import control as ct
+
+# staircase: (A_s, B_s, Q) with A_s = Q' A Q, B_s = Q' B; blocks: sizes of the staircase blocks
+Report = namedtuple('Report', ['rank', 'full_rank', 'indices', 'blocks', 'staircase',
+                               'gramian', 'gramian_cond', 'horizon'])
+Analysis = namedtuple('Analysis', ['n_states', 'controllability', 'observability'])
+
+
+# === Staircase form ===
+def staircase(A, B, tol=None):
+    """
+    Controllability staircase form of (A, B) by orthogonal transformations.
+
+    Returns (A_s, B_s, Q, blocks): A_s = Q' A Q is block upper Hessenberg with the
+    controllable part in the leading sum(blocks) states, B_s = Q' B is nonzero only in
+    its first block.  Each block size is the numerical rank (SVD) of the coupling from
+    the previous block.
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+    n = A.shape[0]
+    if tol is None:
+        tol = n * np.finfo(float).eps * max(np.linalg.norm(A, 1), np.linalg.norm(B, 1), 1.0)
+    A_s, Q = A.copy(), np.eye(n)
+    Z = B
+    blocks = []
+    offset = 0
+    while offset < n:
+        U, s, _ = np.linalg.svd(Z)
+        r = int(np.sum(s > tol))
+        if r == 0:
+            break
+        T = np.eye(n)
+        T[offset:, offset:] = U
+        A_s = T.T @ A_s @ T
+        Q = Q @ T
+        blocks.append(r)
+        offset += r
+        Z = A_s[offset:, offset - r:offset]
+    return A_s, Q.T @ B, Q, blocks
+
+
+def controllability_indices(blocks):
+    """Controllability (Kronecker) indices from the staircase block sizes."""
+    return [sum(1 for r in blocks if r > i) for i in range(blocks[0])] if blocks else []
+
+
+# === Gramians ===
+def gramian(A, B, horizon=None):
+    """
+    Controllability Gramian of (A, B) (observability Gramian: gramian(A', C')).
+
+    Infinite horizon (Lyapunov equation) if horizon is None and A is stable, otherwise
+    the finite-horizon Gramian over [0, horizon] via Van Loan's method.  For unstable A
+    the default horizon is 1 / max(growth, 1), with growth the largest real part of the
+    eigenvalues: one time constant of the fastest unstable mode, capped at 1 s for slowly
+    growing or marginally stable A.  Returns (W, T) with T = inf for the infinite horizon.
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+    BB = B @ B.T
+    growth = np.max(np.linalg.eigvals(A).real)
+    if horizon is None and growth < 0:
+        W = scipy.linalg.solve_continuous_lyapunov(A, -BB)
+        return (W + W.T) / 2, np.inf
+    T = _default_horizon(growth) if horizon is None else horizon
+    W = _van_loan(A[None], BB[None], np.array([T]))[0]
+    return W, T
+
+
+def _default_horizon(growth):
+    """One time constant of the fastest unstable mode, at most 1 s (growth rates below 1/s)."""
+    return 1.0 / np.maximum(growth, 1.0)
+
+
+def _van_loan(A, BB, T):
+    """Finite-horizon Gramians of a stack of (A, B B') pairs over the horizons T."""
+    n = A.shape[-1]
+    M = np.zeros(A.shape[:-2] + (2 * n, 2 * n))
+    M[..., :n, :n] = -A
+    M[..., :n, n:] = BB
+    M[..., n:, n:] = np.swapaxes(A, -1, -2)
+    F = scipy.linalg.expm(M * np.reshape(T, (-1, 1, 1)))
+    W = np.swapaxes(F[..., n:, n:], -1, -2) @ F[..., :n, n:]
+    return (W + np.swapaxes(W, -1, -2)) / 2
+
+
+def _cond(W):
+    eig = np.linalg.eigvalsh(W)
+    return np.inf if eig[0] <= 0 else eig[-1] / eig[0]
+
+
+# === Cached analysis ===
+def _key(*arrays):
+    h = hashlib.blake2b(digest_size=16)
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=float)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.digest()
+
+
+class ControllabilityAnalyzer:
+    """Controllability/observability analyses, cached per (A, B, C, horizon) in a bounded LRU."""
+
+    def __init__(self, maxsize=1024, tol=None):
+        self.maxsize = maxsize
+        self.tol = tol
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return self.cache[key]
+        self.misses += 1
+        return None
+
+    def _store(self, key, value):
+        self.cache[key] = value
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def _report(self, A, B, horizon, W=None, T=None):
+        A_s, B_s, Q, blocks = staircase(A, B, self.tol)
+        rank = sum(blocks)
+        if W is None:
+            W, T = gramian(A, B, horizon)
+        return Report(rank, rank == A.shape[0], controllability_indices(blocks), blocks,
+                      (A_s, B_s, Q), W, _cond(W), T)
+
+    def analyze(self, A, B, C=None, horizon=None):
+        """Controllability of (A, B) and, if C is given, observability of (A, C)."""
+        A = np.atleast_2d(np.asarray(A, dtype=float))
+        B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+        C = None if C is None else np.asarray(C, dtype=float).reshape(-1, A.shape[0])
+        key = _key(A, B, np.empty(0) if C is None else C, [np.inf if horizon is None else horizon])
+        result = self._lookup(key)
+        if result is None:
+            obs = None if C is None else self._report(A.T, C.T, horizon)
+            result = Analysis(A.shape[0], self._report(A, B, horizon), obs)
+            self._store(key, result)
+        return result
+
+    def analyze_family(self, A_family, B, C=None, horizon=None):
+        """
+        Analyses of every A in A_family (shape (n_members, n, n)) with shared B and C.
+
+        The Gramians of the members not yet cached are computed in batches: one
+        Kronecker-form Lyapunov solve for the stable members and one batched matrix
+        exponential for the unstable ones.
+        """
+        A_family = np.asarray(A_family, dtype=float)
+        B = np.asarray(B, dtype=float).reshape(A_family.shape[-1], -1)
+        C = None if C is None else np.asarray(C, dtype=float).reshape(-1, A_family.shape[-1])
+        results = [None] * len(A_family)
+        keys = [_key(A, B, np.empty(0) if C is None else C, [np.inf if horizon is None else horizon])
+                for A in A_family]
+        missing = []
+        for i, key in enumerate(keys):
+            results[i] = self._lookup(key)
+            if results[i] is None:
+                missing.append(i)
+        if missing:
+            A_new = A_family[missing]
+            Wc, Tc = batch_gramians(A_new, B, horizon)
+            Wo, To = batch_gramians(np.swapaxes(A_new, -1, -2), C.T, horizon) if C is not None else (None, None)
+            for j, i in enumerate(missing):
+                A = A_family[i]
+                obs = None if C is None else self._report(A.T, C.T, horizon, Wo[j], To[j])
+                results[i] = Analysis(A.shape[0], self._report(A, B, horizon, Wc[j], Tc[j]), obs)
+                self._store(keys[i], results[i])
+        return results
+
+
+def batch_gramians(A_family, B, horizon=None):
+    """Controllability Gramians and horizons of a stack of A matrices with a shared B."""
+    A_family = np.asarray(A_family, dtype=float)
+    N, n, _ = A_family.shape
+    BB = B @ B.T
+    W = np.empty((N, n, n))
+    T = np.full(N, np.inf)
+    growth = np.max(np.linalg.eigvals(A_family).real, axis=1)
+    stable = growth < 0
+    if horizon is None and np.any(stable):
+        # (I kron A + A kron I) vec(W) = -vec(B B'), one small dense solve per member
+        A_s = A_family[stable]
+        I = np.eye(n)
+        L = np.einsum('ij,bkl->bikjl', I, A_s).reshape(-1, n * n, n * n) \
+            + np.einsum('bij,kl->bikjl', A_s, I).reshape(-1, n * n, n * n)
+        rhs = np.broadcast_to(-BB.reshape(n * n, 1), (len(A_s), n * n, 1))
+        Ws = np.linalg.solve(L, rhs).reshape(-1, n, n)
+        W[stable] = (Ws + np.swapaxes(Ws, -1, -2)) / 2
+    finite = ~stable if horizon is None else np.ones(N, dtype=bool)
+    if np.any(finite):
+        T[finite] = _default_horizon(growth[finite]) if horizon is None else horizon
+        W[finite] = _van_loan(A_family[finite], np.broadcast_to(BB, (int(finite.sum()), n, n)), T[finite])
+    return W, T
+
+
+_analyzer = ControllabilityAnalyzer()
+
+
+def analyze(A, B, C=None, horizon=None):
+    """analyze() of the shared module-level cache."""
+    return _analyzer.analyze(A, B, C, horizon)
+
+
+def analyze_family(A_family, B, C=None, horizon=None):
+    return _analyzer.analyze_family(A_family, B, C, horizon)
+
+
+if __name__ == '__main__':
+
+    # === 1. The system of state_feedback_pole_placement.py ===
+    A = np.array([[0, 1], [2, 1]])
+    B = np.array([[0], [1]])
+    C = np.array([[1, 0]])
+    result = analyze(A, B, C)
+    ctrl, obs = result.controllability, result.observability
+    print(f"Controllability rank {ctrl.rank}/{result.n_states}, indices {ctrl.indices}, "
+          f"Gramian condition {ctrl.gramian_cond:.3g} (horizon {ctrl.horizon})")
+    print(f"Observability rank {obs.rank}/{result.n_states}, Gramian condition {obs.gramian_cond:.3g}")
+    print(f"ct.ctrb rank: {np.linalg.matrix_rank(ct.ctrb(A, B))}, ct.obsv rank: {np.linalg.matrix_rank(ct.obsv(A, C))}")
+
+    # Gramians against python-control (stable system) and the direct integral (unstable)
+    def gramian_integral(A, B, T):
+        ts = np.linspace(0, T, 4001)
+        integrand = np.array([scipy.linalg.expm(A * t) @ B @ B.T @ scipy.linalg.expm(A.T * t) for t in ts])
+        return np.trapezoid(integrand, ts, axis=0)
+
+    A_stable = A - B @ ct.place(A, B, [-2, -3])
+    W, _ = gramian(A_stable, B)
+    print(f"Lyapunov Gramian vs integral up to t = 20: {np.max(np.abs(W - gramian_integral(A_stable, B, 20))):.1e}")
+    W, _ = batch_gramians(A_stable[None], B)
+    print(f"Batched Kronecker Lyapunov solve vs scipy: {np.max(np.abs(W[0] - gramian(A_stable, B)[0])):.1e}")
+    print(f"Van Loan Gramian (T = 1) vs integral: {np.max(np.abs(gramian(A, B, 1.0)[0] - gramian_integral(A, B, 1.0))):.1e}")
+
+    # === 2. A chain where rank(ctrb) fails but the staircase does not ===
+    n = 12
+    A_chain = np.diag(np.full(n - 1, 1.0), 1) - np.diag(np.linspace(0.5, 6, n))
+    B_chain = np.eye(n)[:, [-1]]
+    print(f"\n{n}-state chain: np.linalg.matrix_rank(ctrb) = {np.linalg.matrix_rank(ct.ctrb(A_chain, B_chain))}, "
+          f"staircase rank = {analyze(A_chain, B_chain).controllability.rank}, "
+          f"Gramian condition {analyze(A_chain, B_chain).controllability.gramian_cond:.2e}")
+
+    # an uncontrollable mode: the input does not reach the third (decoupled) state
+    A_unc = np.diag([-1.0, -2.0, -3.0])
+    B_unc = np.array([[1.0], [1.0], [0.0]])
+    rep = analyze(A_unc, B_unc).controllability
+    print(f"Decoupled system with an unreachable mode: rank {rep.rank}/3, blocks {rep.blocks}")
+
+    # === 3. A parameter family A(p) = [[p - 1, 0], [p, -2]]: input and output decouple at p = 0 ===
+    params = np.linspace(-2, 2, 2001)
+    A_family = np.array([[[p - 1, 0], [p, -2]] for p in params])
+    B_family = np.array([[1], [0]])
+    C_family = np.array([[0, 1]])
+    analyzer = ControllabilityAnalyzer(maxsize=5000)
+
+    start = time.perf_counter()
+    family = analyzer.analyze_family(A_family, B_family, C_family)
+    t_first = time.perf_counter() - start
+    start = time.perf_counter()
+    analyzer.analyze_family(A_family, B_family, C_family)
+    t_again = time.perf_counter() - start
+    print(f"\nFamily of {len(params)} A matrices: first pass {t_first * 1e3:.0f} ms, "
+          f"repeated query {t_again * 1e3:.1f} ms ({analyzer.hits} cache hits)")
+
+    rank_c = np.array([r.controllability.rank for r in family])
+    rank_o = np.array([r.observability.rank for r in family])
+    print(f"Controllability lost at p = {params[rank_c < 2]}, observability lost at p = {params[rank_o < 2]}")
+    rank_ct = np.array([np.linalg.matrix_rank(ct.ctrb(A_p, B_family)) for A_p in A_family])
+    print(f"Ranks agree with ct.ctrb for all members: {np.array_equal(rank_c, rank_ct)}")
+
+    cond_c = np.array([r.controllability.gramian_cond for r in family])
+    cond_o = np.array([r.observability.gramian_cond for r in family])
+    stable = np.array([np.isinf(r.controllability.horizon) for r in family])
+
+    plt.figure()
+    plt.semilogy(params[stable], cond_c[stable], label='controllability, infinite horizon')
+    plt.semilogy(params[~stable], cond_c[~stable], label='controllability, finite horizon (p > 1, unstable)')
+    plt.semilogy(params, cond_o, '--', label='observability')
+    plt.title("Gramian Condition Numbers of A(p) = [[p - 1, 0], [p, -2]]")
+    plt.xlabel("p")
+    plt.ylabel("Condition number")
+    plt.grid()
+    plt.legend()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'gramian_condition_family.pdf'))
+    else:
+        plt.show()
@@ -0,0 +1,254 @@
+"""
+This code designs LQR state feedback for a whole sweep of weights (Q, R) at once, as an
+alternative to placing hand-picked poles with ct.place.
+
+Each Riccati equation A'X + XA - XBR^-1B'X + Q = 0 is solved with Newton-Kleinman iterations:
+for a stabilizing gain K, solve the Lyapunov equation
+    (A - BK)'X + X(A - BK) = -(Q + K'RK)
+and update K = R^-1 B'X.  The iterations converge quadratically from any stabilizing gain, so
+when neighbouring weights are close, starting from the previous solution needs only a few of
+them.  The sweep is split into contiguous segments that are stepped in lockstep: every weight is
+warm-started from the solution of the weight before it in its segment, and the Lyapunov equations
+of all segments are solved together (Kronecker form, one batched np.linalg.solve) instead of one
+cold Riccati solve each.
+
+"""
+
+import os
+import time
+from collections import namedtuple
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+import control as ct
+
+# K: (N, m, n) gains, X: (N, n, n) Riccati solutions, poles: (N, n) closed-loop poles,
+# cost: (N,) optimal cost x0'X x0 (trace(X) without x0), iterations: (N,) Newton steps
+Sweep = namedtuple('Sweep', ['K', 'X', 'poles', 'cost', 'iterations'])
+
+
+# === Lyapunov and Newton-Kleinman steps ===
+def _lyapunov_batch(A, M):
+    """Solves A_b' X_b + X_b A_b = -M_b for a stack of (A_b, M_b)."""
+    N, n, _ = A.shape
+    if n > 8:
+        return np.array([scipy.linalg.solve_continuous_lyapunov(a.T, -m) for a, m in zip(A, M)])
+    I = np.eye(n)
+    At = np.swapaxes(A, -1, -2)
+    L = (np.einsum('bij,kl->bikjl', At, I) + np.einsum('ij,bkl->bikjl', I, At)).reshape(N, n * n, n * n)
+    X = np.linalg.solve(L, -M.reshape(N, n * n, 1)).reshape(N, n, n)
+    return (X + np.swapaxes(X, -1, -2)) / 2
+
+
+def _gains(B, R_inv, X):
+    """K = R^-1 B' X for a stack of R^-1 and X."""
+    return R_inv @ (B.T @ X)
+
+
+def newton_kleinman(A, B, Q, R, X0=None, tol=1e-10, maxiter=50):
+    """
+    Newton-Kleinman solution of the continuous-time algebraic Riccati equation.
+
+    Starts from the gain of X0 (which must stabilize A - BK), or from a cold
+    scipy.linalg.solve_continuous_are if X0 is None.  Returns (K, X, iterations).
+    """
+    sweep = lqr_sweep(A, B, np.asarray(Q, dtype=float)[None], np.atleast_2d(np.asarray(R, dtype=float))[None],
+                      X0=X0, tol=tol, maxiter=maxiter)
+    return sweep.K[0], sweep.X[0], sweep.iterations[0]
+
+
+# === Sweep ===
+def lqr_sweep(A, B, Q, R, x0=None, X0=None, block=128, min_segment=16, warm_start=True, tol=1e-10, maxiter=50):
+    """
+    LQR gains, closed-loop poles and costs for a sequence of weights.
+
+    Q has shape (N, n, n) and R shape (N, m, m) (or (m, m), (n, n) to share one weight).
+    Consecutive weights should be close (e.g. a grid traversed in snake order): the sequence
+    is split into at most block contiguous segments of at least min_segment weights, the
+    segments are stepped in lockstep (one batched Newton-Kleinman iteration for all of them)
+    and every weight is warm-started from the solution of the weight just before it.  The
+    first weight of every segment starts from the gain of X0 (default: the solution for the
+    first weight).  With warm_start=False every weight starts from that gain, for comparison.
+    Members whose starting gain does not stabilize the plant are solved cold with
+    scipy.linalg.solve_continuous_are.
+    """
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+    n, m = B.shape
+    Q = np.asarray(Q, dtype=float)
+    R = np.asarray(R, dtype=float)
+    N = max(len(Q) if Q.ndim == 3 else 1, len(R) if R.ndim == 3 else 1)
+    Q = np.broadcast_to(Q.reshape(-1, n, n), (N, n, n))
+    R = np.broadcast_to(R.reshape(-1, m, m), (N, m, m))
+    R_inv = np.linalg.inv(R)
+
+    X_start = scipy.linalg.solve_continuous_are(A, B, Q[0], R[0]) if X0 is None else np.asarray(X0, dtype=float)
+    K_start = _gains(B, R_inv[0], X_start)
+
+    n_segments = max(1, min(block, N // min_segment))
+    bounds = np.linspace(0, N, n_segments + 1).astype(int)
+    heads, lengths = bounds[:-1], np.diff(bounds)
+
+    X = np.empty((N, n, n))
+    iterations = np.zeros(N, dtype=int)
+    for j in range(lengths.max()):
+        idx = heads[lengths > j] + j
+        if warm_start and j > 0:
+            # warm start from the previous weight's gain itself (not R^-1 B'X_prev with the
+            # new R): it stabilizes the plant whatever the new weights are
+            K = _gains(B, R_inv[idx - 1], X[idx - 1])
+            Xb = X[idx - 1].copy()
+        else:
+            K = np.broadcast_to(K_start, (len(idx), m, n)).copy()
+            Xb = np.broadcast_to(X_start, (len(idx), n, n)).copy()
+
+        # starting gains must be stabilizing, otherwise fall back to cold solves
+        unstable = np.max(np.linalg.eigvals(A - B @ K).real, axis=1) >= 0
+        for i in np.flatnonzero(unstable):
+            Xb[i] = scipy.linalg.solve_continuous_are(A, B, Q[idx[i]], R[idx[i]])
+        active = np.flatnonzero(~unstable)
+
+        for _ in range(maxiter):
+            if len(active) == 0:
+                break
+            a = idx[active]
+            K_a = K[active]
+            X_new = _lyapunov_batch(A - B @ K_a, Q[a] + np.swapaxes(K_a, -1, -2) @ R[a] @ K_a)
+            change = np.linalg.norm(X_new - Xb[active], axis=(1, 2)) / np.linalg.norm(X_new, axis=(1, 2))
+            Xb[active] = X_new
+            K[active] = _gains(B, R_inv[a], X_new)
+            iterations[a] += 1
+            active = active[change > tol]
+        else:
+            if len(active):
+                raise RuntimeError(f"Newton-Kleinman did not converge for weights {idx[active]}")
+
+        X[idx] = Xb
+
+    K = _gains(B, R_inv, X)
+    poles = np.linalg.eigvals(A - B @ K)
+    cost = np.trace(X, axis1=1, axis2=2) if x0 is None else np.einsum('i,bij,j->b', x0, X, x0)
+    return Sweep(K, X, poles, cost, iterations)
+
+
+def snake_grid(x, y):
+    """All pairs (x_i, y_j) as rows, with y reversed on every other x so consecutive pairs are neighbours."""
+    index = np.arange(len(x) * len(y)).reshape(len(x), len(y))
+    index[1::2] = index[1::2, ::-1]
+    index = index.ravel()
+    return np.column_stack([np.asarray(x)[index // len(y)], np.asarray(y)[index % len(y)]])
+
+
+if __name__ == '__main__':
+
+    # === 1. The plant of state_feedback_pole_placement.py ===
+    A = np.array([[0, 1], [2, 1]])
+    B = np.array([[0], [1]])
+
+    # sweep position weight q and input weight r: Q = diag(q, 1), R = r
+    q_values = np.logspace(-1, 3, 50)
+    r_values = np.logspace(-2, 2, 40)
+    weights = snake_grid(q_values, r_values)
+    Q = np.array([np.diag([q, 1.0]) for q, _ in weights])
+    R = weights[:, 1].reshape(-1, 1, 1)
+
+    start = time.perf_counter()
+    sweep = lqr_sweep(A, B, Q, R, x0=np.array([1.0, 0.0]))
+    t_sweep = time.perf_counter() - start
+
+    start = time.perf_counter()
+    K_ct = np.array([ct.lqr(A, B, Qi, Ri)[0] for Qi, Ri in zip(Q, R)])
+    t_ct = time.perf_counter() - start
+    print(f"{len(weights)} (Q, R) pairs: warm-started sweep {t_sweep * 1e3:.0f} ms "
+          f"({sweep.iterations.mean():.1f} Newton steps per pair), "
+          f"ct.lqr one by one {t_ct * 1e3:.0f} ms ({t_ct / t_sweep:.0f}x)")
+    print(f"Max gain difference to ct.lqr: {np.max(np.abs(sweep.K - K_ct) / np.abs(K_ct)):.1e} (relative)")
+
+    # the same weights in random order: worse warm starts, more iterations
+    order = np.random.default_rng(0).permutation(len(weights))
+    shuffled = lqr_sweep(A, B, Q[order], R[order])
+    print(f"Shuffled sweep: {shuffled.iterations.mean():.1f} Newton steps per pair, "
+          f"max gain difference {np.max(np.abs(shuffled.K - sweep.K[order]) / np.abs(K_ct[order])):.1e}")
+
+    # every weight started from the same gain instead of its neighbour's solution
+    start = time.perf_counter()
+    cold = lqr_sweep(A, B, Q, R, warm_start=False)
+    t_cold = time.perf_counter() - start
+    print(f"Cold-started sweep: {cold.iterations.mean():.1f} Newton steps per pair, {t_cold * 1e3:.0f} ms")
+    assert sweep.iterations.mean() < cold.iterations.mean()
+
+    # === 2. A larger plant: a chain of four masses (8 states) ===
+    n_masses = 4
+    k, c = 1.0, 0.1
+    A_chain = np.zeros((2 * n_masses, 2 * n_masses))
+    for i in range(n_masses):
+        A_chain[2 * i, 2 * i + 1] = 1
+        A_chain[2 * i + 1, 2 * i] = -2 * k if i < n_masses - 1 else -k
+        A_chain[2 * i + 1, 2 * i + 1] = -c
+        if i > 0:
+            A_chain[2 * i + 1, 2 * (i - 1)] = k
+        if i < n_masses - 1:
+            A_chain[2 * i + 1, 2 * (i + 1)] = k
+    B_chain = np.zeros((2 * n_masses, 1))
+    B_chain[1] = 1
+    rho = np.logspace(-3, 1, 400)
+    Q_chain = np.eye(2 * n_masses)
+    start = time.perf_counter()
+    chain = lqr_sweep(A_chain, B_chain, Q_chain, rho.reshape(-1, 1, 1))
+    t_sweep = time.perf_counter() - start
+    start = time.perf_counter()
+    K_ct = np.array([ct.lqr(A_chain, B_chain, Q_chain, r)[0] for r in rho])
+    t_ct = time.perf_counter() - start
+    print(f"\n{2 * n_masses}-state chain, {len(rho)} input weights: sweep {t_sweep * 1e3:.0f} ms, "
+          f"ct.lqr {t_ct * 1e3:.0f} ms, max relative gain difference "
+          f"{np.max(np.abs(chain.K - K_ct)) / np.max(np.abs(K_ct)):.1e}")
+
+    # === 3. Plots: Newton steps, closed-loop poles and cost over the sweep ===
+    plt.figure()
+    bins = np.arange(max(cold.iterations.max(), shuffled.iterations.max()) + 2) - 0.5
+    plt.hist([sweep.iterations, shuffled.iterations, cold.iterations], bins=bins,
+             label=[f"Warm start from the neighbouring weight (mean {sweep.iterations.mean():.1f})",
+                    f"Warm start, shuffled order (mean {shuffled.iterations.mean():.1f})",
+                    f"Cold start from one gain (mean {cold.iterations.mean():.1f})"])
+    plt.title(f"Newton-Kleinman Steps per (Q, R) Pair, {len(weights)} Pairs")
+    plt.xlabel("Newton steps")
+    plt.ylabel("Number of pairs")
+    plt.legend()
+    plt.grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'lqr_sweep_iterations.pdf'))
+    else:
+        plt.show()
+
+    plt.figure()
+    at_q1 = np.isclose(weights[:, 0], q_values[25])
+    poles = sweep.poles[at_q1]
+    plt.scatter(poles.real.ravel(), poles.imag.ravel(), c=np.repeat(np.log10(weights[at_q1, 1]), 2), s=10)
+    plt.colorbar(label="log10(R)")
+    plt.plot(np.linalg.eigvals(A).real, np.linalg.eigvals(A).imag, 'rx', label='Open-loop poles')
+    plt.title(f"LQR Closed-loop Poles, Q = diag({q_values[25]:.3g}, 1)")
+    plt.xlabel("Real")
+    plt.ylabel("Imaginary")
+    plt.legend()
+    plt.grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'lqr_sweep_poles.pdf'))
+    else:
+        plt.show()
+
+    plt.figure()
+    cost = np.empty((len(q_values), len(r_values)))
+    for (q, r), J in zip(weights, sweep.cost):
+        cost[np.searchsorted(q_values, q), np.searchsorted(r_values, r)] = J
+    plt.contourf(np.log10(r_values), np.log10(q_values), np.log10(cost), 20)
+    plt.colorbar(label="log10(x0' X x0), x0 = [1, 0]")
+    plt.title("Optimal LQR Cost over the Weight Sweep")
+    plt.xlabel("log10(R)")
+    plt.ylabel("log10(Q[0, 0])")
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'lqr_sweep_cost.pdf'))
+    else:
+        plt.show()
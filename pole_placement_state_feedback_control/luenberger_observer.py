@@ -0,0 +1,271 @@
+"""
+This code replaces the full-state feedback u = -K x of state_feedback_pole_placement.py by
+feedback from a Luenberger observer, since only y = C x is measured.
+
+The plant is discretized with a zero-order hold (sample time Ts) and the controller runs the
+fixed-step update
+    u[k]      = -K xhat[k] + kr r[k]
+    xhat[k+1] = Ad xhat[k] + Bd u[k] + L (y[k] - C xhat[k])
+The observer gain L is found by pole placement on the dual system (Ad', C') or from noise
+weights (steady-state Kalman predictor, discrete Riccati equation).  By the separation
+principle the closed-loop poles are the poles of Ad - Bd K together with those of Ad - L C.
+
+Many independent plants are run together: the estimates of all plants are one (n_plants x n)
+array and each sample is one (batched) matrix product with the precomputed
+F = Ad - Bd K - L C.
+
+"""
+
+import os
+import time
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+import control as ct
+
+
+# === Design ===
+def discretize(A, B, Ts):
+    """Zero-order hold discretization (Ad, Bd) of x' = A x + B u with sample time Ts."""
+    A = np.asarray(A, dtype=float)
+    B = np.asarray(B, dtype=float).reshape(A.shape[0], -1)
+    n, m = B.shape
+    M = np.zeros((n + m, n + m))
+    M[:n, :n] = A
+    M[:n, n:] = B
+    E = scipy.linalg.expm(M * Ts)
+    return E[:n, :n], E[:n, n:]
+
+
+def observer_gain(Ad, C, poles=None, Qn=None, Rn=None):
+    """
+    Observer gain L of xhat[k+1] = Ad xhat[k] + Bd u[k] + L (y[k] - C xhat[k]).
+
+    With poles, the eigenvalues of Ad - L C are placed there (discrete-time poles).
+    Otherwise L is the steady-state Kalman predictor gain for process noise covariance
+    Qn (default identity) and measurement noise covariance Rn (default identity).
+    """
+    Ad = np.asarray(Ad, dtype=float)
+    C = np.atleast_2d(np.asarray(C, dtype=float))
+    if poles is not None:
+        return ct.place(Ad.T, C.T, poles).T
+    Qn = np.eye(Ad.shape[0]) if Qn is None else np.atleast_2d(Qn)
+    Rn = np.eye(C.shape[0]) if Rn is None else np.atleast_2d(Rn)
+    P = scipy.linalg.solve_discrete_are(Ad.T, C.T, Qn, Rn)
+    return Ad @ P @ C.T @ np.linalg.inv(C @ P @ C.T + Rn)
+
+
+def reference_gain(Ad, Bd, C, K):
+    """Feedforward kr giving unit steady-state gain from r to y (square C)."""
+    n = Ad.shape[0]
+    dc = C @ np.linalg.solve(np.eye(n) - Ad + Bd @ K, Bd)
+    return np.linalg.inv(dc)
+
+
+def separation_poles(Ad, Bd, C, K, L):
+    """Closed-loop poles of plant plus observer-based controller, from the full (x, xhat) system."""
+    top = np.hstack([Ad, -Bd @ K])
+    bottom = np.hstack([L @ C, Ad - Bd @ K - L @ C])
+    return np.linalg.eigvals(np.vstack([top, bottom]))
+
+
+# === Streaming observer-based controller ===
+class ObserverController:
+    """
+    Observer-based state feedback for one plant or a stack of independent plants.
+
+    Ad, Bd, C, K, L (and kr) are either single matrices shared by all plants or stacks with
+    a leading n_plants axis.  step() consumes one measurement per plant and returns the
+    control inputs; run() processes a whole recorded stream.
+    """
+
+    def __init__(self, Ad, Bd, C, K, L, kr=None, n_plants=1, xhat0=None):
+        Ad, Bd, C, K, L = (np.asarray(M, dtype=float) for M in (Ad, Bd, C, K, L))
+        self.batched = Ad.ndim == 3
+        self.n_plants = len(Ad) if self.batched else n_plants
+        n, m = Bd.shape[-2:]
+        self.K = K
+        self.L = L
+        self.kr = np.zeros(K.shape[:-1] + (C.shape[-2],)) if kr is None else np.asarray(kr, dtype=float)
+        # xhat[k+1] = F xhat[k] + G r[k] + L y[k]
+        self.F = Ad - Bd @ K - L @ C
+        self.G = Bd @ self.kr
+        if not self.batched:
+            # row-vector form: (n_plants, n) @ (n, n) without a per-plant matrix
+            self.F, self.G, self.L, self.K, self.kr = (M.T.copy() for M in (self.F, self.G, self.L, self.K, self.kr))
+        self.xhat = np.zeros((self.n_plants, n)) if xhat0 is None else np.array(xhat0, dtype=float).reshape(self.n_plants, n)
+        self.u = np.empty((self.n_plants, m))
+        self._next = np.empty_like(self.xhat)
+
+    def _apply(self, M, x, out=None):
+        if self.batched:
+            return np.matmul(M, x[:, :, None])[:, :, 0] if out is None else np.einsum('pij,pj->pi', M, x, out=out)
+        return np.matmul(x, M, out=out)
+
+    def step(self, y, r=None):
+        """Control inputs (n_plants, m) from the measurements y (n_plants, p) of this sample."""
+        y = np.reshape(y, (self.n_plants, -1))
+        self._apply(self.K, self.xhat, out=self.u)
+        np.negative(self.u, out=self.u)
+        self._apply(self.F, self.xhat, out=self._next)
+        self._next += self._apply(self.L, y)
+        if r is not None:
+            r = np.reshape(r, (self.n_plants, -1))
+            self.u += self._apply(self.kr, r)
+            self._next += self._apply(self.G, r)
+        self.xhat, self._next = self._next, self.xhat
+        return self.u.copy()
+
+    def run(self, Y, R=None):
+        """Inputs U (n_steps, n_plants, m) and estimates Xhat (n_steps, n_plants, n) for a stream Y."""
+        U = np.empty((len(Y),) + self.u.shape)
+        Xhat = np.empty((len(Y),) + self.xhat.shape)
+        for k, y in enumerate(Y):
+            Xhat[k] = self.xhat
+            U[k] = self.step(y, None if R is None else R[k])
+        return U, Xhat
+
+
+def simulate_loop(Ad, Bd, C, controller, x0, n_steps, r=None, noise=0.0, seed=0):
+    """Plants x[k+1] = Ad x[k] + Bd u[k], y = C x + v in closed loop with the controller (one sample per step)."""
+    rng = np.random.default_rng(seed)
+    batched = np.ndim(Ad) == 3
+    x = np.array(x0, dtype=float).reshape(controller.n_plants, -1)
+    X = np.empty((n_steps,) + x.shape)
+    Xhat = np.empty_like(X)
+    for k in range(n_steps):
+        X[k] = x
+        Xhat[k] = controller.xhat
+        y = (np.einsum('pij,pj->pi', C, x) if batched else x @ C.T)
+        y = y + noise * rng.standard_normal(y.shape)
+        u = controller.step(y, r)
+        x = (np.einsum('pij,pj->pi', Ad, x) + np.einsum('pij,pj->pi', Bd, u)) if batched else x @ Ad.T + u @ Bd.T
+    return X, Xhat
+
+
+if __name__ == '__main__':
+
+    # === 1. The plant of state_feedback_pole_placement.py, sampled at 100 Hz ===
+    A = np.array([[0, 1], [2, 1]])
+    B = np.array([[0], [1]])
+    C = np.array([[1, 0]])
+    Ts = 0.01
+    Ad, Bd = discretize(A, B, Ts)
+    sys_d = ct.c2d(ct.ss(A, B, C, 0), Ts, method='zoh')
+    print(f"ZOH discretization vs ct.c2d: {max(np.max(np.abs(Ad - sys_d.A)), np.max(np.abs(Bd - sys_d.B))):.1e}")
+    assert np.allclose(Ad, sys_d.A, rtol=0, atol=1e-12) and np.allclose(Bd, sys_d.B, rtol=0, atol=1e-12)
+
+    # controller poles from the lecture script, observer poles five times faster
+    controller_poles = np.exp(Ts * np.array([-2, -3]))
+    observer_poles = np.exp(Ts * np.array([-10, -15]))
+    K = ct.place(Ad, Bd, controller_poles)
+    L = observer_gain(Ad, C, observer_poles)
+    L_kalman = observer_gain(Ad, C, Qn=np.diag([1e-4, 1e-2]), Rn=1e-3)
+
+    # the gains place the designed poles, and by the separation principle the closed loop has
+    # exactly the controller poles together with the observer poles
+    def assert_poles(poles, expected, atol=1e-8):
+        assert np.allclose(np.sort_complex(poles), np.sort_complex(expected), rtol=0, atol=atol)
+
+    assert_poles(np.linalg.eigvals(Ad - Bd @ K), controller_poles)
+    assert_poles(np.linalg.eigvals(Ad - L @ C), observer_poles)
+    assert_poles(separation_poles(Ad, Bd, C, K, L), np.concatenate([controller_poles, observer_poles]))
+    kalman_poles = np.linalg.eigvals(Ad - L_kalman @ C)
+    assert np.all(np.abs(kalman_poles) < 1)
+    assert_poles(separation_poles(Ad, Bd, C, K, L_kalman), np.concatenate([controller_poles, kalman_poles]))
+    print(f"Designed poles placed: controller {np.round(controller_poles, 4)}, observer {np.round(observer_poles, 4)}")
+
+    # the estimation error of the running controller obeys e[k+1] = (Ad - L C) e[k], so in the
+    # eigenvector coordinates of Ad - L C each component decays as (designed observer pole)^k
+    X, Xhat = simulate_loop(Ad, Bd, C, ObserverController(Ad, Bd, C, K, L), [0.2, 0.0], 300)
+    E = X[:, 0] - Xhat[:, 0]
+    eigenvalues, V = np.linalg.eig(Ad - L @ C)
+    order = [np.argmin(np.abs(eigenvalues - p)) for p in observer_poles]
+    V = V[:, order]
+    modes = np.linalg.solve(V, E.T).T
+    predicted = modes[0] * observer_poles ** np.arange(len(E))[:, None]
+    decay_error = np.max(np.abs(modes - predicted)) / np.max(np.abs(modes[0]))
+    print(f"Estimation error vs designed observer decay: max relative difference {decay_error:.1e}")
+    assert decay_error < 1e-9
+    assert np.max(np.abs(E[-1])) < 1e-3 * np.max(np.abs(E[0]))
+
+    # === 2. A family of plants A(a) = [[0, 1], [a, 1]], each with its own gains ===
+    a_values = np.linspace(0.5, 4, 200)
+    Ads, Bds = zip(*(discretize(np.array([[0, 1], [a, 1]]), B, Ts) for a in a_values))
+    Ads, Bds = np.array(Ads), np.array(Bds)
+    Cs = np.broadcast_to(C, (len(a_values),) + C.shape)
+    Ks = np.array([ct.place(Ad_i, Bd_i, controller_poles) for Ad_i, Bd_i in zip(Ads, Bds)])
+    Ls = np.array([observer_gain(Ad_i, C, observer_poles) for Ad_i in Ads])
+    krs = np.array([reference_gain(Ad_i, Bd_i, C, K_i) for Ad_i, Bd_i, K_i in zip(Ads, Bds, Ks)])
+    family = ObserverController(Ads, Bds, Cs, Ks, Ls, krs)
+    X, Xhat = simulate_loop(Ads, Bds, Cs, family, np.tile([0.2, 0.0], (len(a_values), 1)), 600, r=np.ones(len(a_values)))
+    final_error = np.max(np.abs(X[-1] - Xhat[-1]))
+    print(f"\nFamily of {len(a_values)} plants: final output {X[-1, :, 0].min():.4f} .. {X[-1, :, 0].max():.4f} "
+          f"(reference 1), final estimation error {final_error:.1e}")
+    assert np.allclose(X[-1, :, 0], 1, atol=0.05) and final_error < 1e-3
+    poles = np.array([np.sort_complex(separation_poles(*M)) for M in zip(Ads, Bds, Cs, Ks, Ls)])
+    expected = np.sort_complex(np.concatenate([controller_poles, observer_poles]))
+    print(f"Separation poles of every member vs design: max difference {np.max(np.abs(poles - expected)):.1e}")
+    assert np.allclose(poles, expected, rtol=0, atol=1e-8)
+
+    # agreement of the vectorized stream with a scalar reference loop
+    rng = np.random.default_rng(1)
+    Y = rng.standard_normal((100, len(a_values), 1))
+    U, _ = ObserverController(Ads, Bds, Cs, Ks, Ls).run(Y)
+    xhat = np.zeros(2)
+    U_ref = np.empty(100)
+    for k in range(100):
+        U_ref[k] = (-Ks[7] @ xhat)[0]
+        xhat = Ads[7] @ xhat + Bds[7] @ (-Ks[7] @ xhat) + Ls[7] @ (Y[k, 7] - C @ xhat)
+    print(f"Vectorized stream vs scalar loop (plant 7): {np.max(np.abs(U[:, 7, 0] - U_ref)):.1e}")
+    assert np.allclose(U[:, 7, 0], U_ref, rtol=1e-12, atol=1e-12)
+
+    # === 3. Latency and throughput ===
+    y = np.zeros((1, 1))
+    single = ObserverController(Ad, Bd, C, K, L)
+    n_samples = 20000
+    start = time.perf_counter()
+    for _ in range(n_samples):
+        single.step(y)
+    latency = (time.perf_counter() - start) / n_samples
+    print(f"\nOne plant: {latency * 1e6:.1f} us per sample ({1 / latency:,.0f} estimates/s)")
+    for n_plants in (100, 10000):
+        for name, controller in [('shared gains', ObserverController(Ad, Bd, C, K, L, n_plants=n_plants)),
+                                 ('per-plant gains', ObserverController(*(np.broadcast_to(M, (n_plants,) + M.shape)
+                                                                          for M in (Ad, Bd, C, K, L))))]:
+            Y = np.zeros((200, n_plants, 1))
+            start = time.perf_counter()
+            controller.run(Y)
+            elapsed = time.perf_counter() - start
+            print(f"{n_plants} plants, {name}: {elapsed / len(Y) * 1e6:.0f} us per sample, "
+                  f"{n_plants * len(Y) / elapsed:,.0f} estimates/s")
+
+    # === 4. Observer-based vs full-state feedback on the lecture plant ===
+    T = np.arange(600) * Ts
+    kr = reference_gain(Ad, Bd, C, K)
+    X_full = np.empty((len(T), 2))
+    x = np.array([0.2, 0.0])
+    for k in range(len(T)):
+        X_full[k] = x
+        x = Ad @ x + Bd @ (-K @ x + kr[0])
+    X_obs, Xhat_obs = simulate_loop(Ad, Bd, C, ObserverController(Ad, Bd, C, K, L, kr), [0.2, 0.0], len(T),
+                                    r=1.0, noise=0.002)
+
+    fig, axes = plt.subplots(2, 1, sharex=True)
+    axes[0].plot(T, X_full[:, 0], label="Full-state feedback")
+    axes[0].plot(T, X_obs[:, 0, 0], label="Observer-based feedback (noisy y)")
+    axes[0].set_ylabel("Output")
+    axes[0].set_title("Closed-loop Step Response with a Luenberger Observer")
+    axes[0].legend()
+    axes[0].grid()
+    axes[1].plot(T, X_obs[:, 0, 0] - Xhat_obs[:, 0, 0], label="x1 - x1hat")
+    axes[1].plot(T, X_obs[:, 0, 1] - Xhat_obs[:, 0, 1], label="x2 - x2hat")
+    axes[1].set_xlabel("Time (s)")
+    axes[1].set_ylabel("Estimation error")
+    axes[1].legend()
+    axes[1].grid()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'luenberger_observer.pdf'))
+    else:
+        plt.show()
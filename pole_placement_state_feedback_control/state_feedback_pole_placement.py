@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import control as ct
 from control.matlab import *
+from controllability_analysis import analyze
 
 # Define an open-loop unstable second-order system
 A = np.array([[0, 1], [2, 1]])  # Unstable: has eigenvalues in the right half-plane
@@ -35,6 +36,14 @@ if 'CONTROL_PLOT_DIR' in os.environ:
 else:
     plt.show()
 
+# Check controllability before placing poles: a badly conditioned Gramian means large gains
+analysis = analyze(A, B, C)
+ctrl = analysis.controllability
+print("\nControllability rank:", ctrl.rank, "of", analysis.n_states, "- controllability indices:", ctrl.indices)
+print("Controllability Gramian condition number:", ctrl.gramian_cond)
+if not ctrl.full_rank:
+    raise ValueError("(A, B) is not controllable: poles cannot be placed arbitrarily")
+
 # State feedback control: Place poles for two stable cases
 desired_poles_fast = np.array([-2, -3])  # Fast response
 desired_poles_slow = np.array([-0.5, -0.8])  # Slow response
@@ -0,0 +1,330 @@
+"""
+This code computes root loci by predictor-corrector continuation instead of solving the
+closed-loop polynomial on a dense gain grid.  Each branch of D(s) + K N(s) = 0 is followed
+with an Euler predictor and a Newton corrector, with the gain step adapted to how far the
+roots move.  Breakaway points and imaginary-axis crossings are computed exactly from
+polynomial conditions first, and the continuation lands on those gains.
+
+"""
+
+import os
+from collections import namedtuple
+import numpy as np
+import matplotlib.pyplot as plt
+import control as ct
+from scipy.optimize import linear_sum_assignment
+
+
+RootLocus = namedtuple('RootLocus', ['gains', 'roots', 'breakaway', 'crossings', 'n_steps', 'n_root_solves'])
+
+
+# --- Polynomial helpers (coefficients are highest power first, as in ct.tf) ---
+def _trim(p):
+    p = np.atleast_1d(np.asarray(p, dtype=float))
+    nonzero = np.flatnonzero(p)
+    return p[nonzero[0]:] if len(nonzero) else np.zeros(1)
+
+
+def _loop_polynomials(sys):
+    """Returns the numerator and denominator of a SISO loop transfer function."""
+    if isinstance(sys, tuple):
+        num, den = sys
+    else:
+        tf = ct.tf(sys)
+        num, den = tf.num[0][0], tf.den[0][0]
+    num, den = _trim(num), _trim(den)
+    if len(num) > len(den):
+        raise ValueError("root locus requires a proper loop transfer function")
+    return num, den
+
+
+def _imaginary_axis_split(p):
+    """Splits p(jw) into real and imaginary polynomials in w."""
+    p = p[::-1]  # lowest power first
+    j_powers = np.array([1, 1j, -1, -1j])[np.arange(len(p)) % 4]
+    terms = p * j_powers
+    return _trim(terms.real[::-1]), _trim(terms.imag[::-1])
+
+
+def _is_real_positive(K, tol=1e-8):
+    return np.isfinite(K) and abs(K.imag) <= tol * max(1.0, abs(K.real)) and K.real > 0
+
+
+def _unique_sorted(values, tol=1e-9):
+    out = []
+    for v in sorted(values, key=lambda item: item[0]):
+        if not out or abs(v[0] - out[-1][0]) > tol * max(1.0, abs(v[0])):
+            out.append(v)
+    return out
+
+
+# --- Exact special gains ---
+def breakaway_points(num, den):
+    """
+    Returns [(K, s), ...] for breakaway/break-in points with K > 0.
+
+    These are the roots of N D' - N' D = 0 at which K = -D(s)/N(s) is real and positive.
+    """
+    cond = _trim(np.polysub(np.polymul(num, np.polyder(den)), np.polymul(np.polyder(num), den)))
+    points = []
+    if len(cond) < 2:
+        return points
+    for s in np.roots(cond):
+        N_s = np.polyval(num, s)
+        if abs(N_s) == 0:
+            continue
+        K = -np.polyval(den, s) / N_s
+        if _is_real_positive(K, tol=1e-6):
+            points.append((K.real, s))
+    return _unique_sorted(points)
+
+
+def imaginary_axis_crossings(num, den):
+    """
+    Returns [(K, w), ...] with w >= 0 for the gains at which a branch crosses the
+    imaginary axis.  These solve Im(D(jw) conj(N(jw))) = 0 with K = -D(jw)/N(jw) > 0.
+    """
+    Dr, Di = _imaginary_axis_split(den)
+    Nr, Ni = _imaginary_axis_split(num)
+    cond = _trim(np.polysub(np.polymul(Di, Nr), np.polymul(Dr, Ni)))
+    candidates = [0.0]
+    if len(cond) > 1:
+        candidates += [w.real for w in np.roots(cond) if abs(w.imag) <= 1e-8 * max(1.0, abs(w)) and w.real >= 0]
+    crossings = []
+    for w in candidates:
+        N_jw = np.polyval(num, 1j * w)
+        if abs(N_jw) == 0:
+            continue
+        K = -np.polyval(den, 1j * w) / N_jw
+        if _is_real_positive(K, tol=1e-6):
+            crossings.append((K.real, abs(w)))
+    return _unique_sorted(crossings)
+
+
+# --- Continuation ---
+def _match(previous, candidates):
+    """Orders candidate roots so that they follow the previous roots."""
+    cost = np.abs(previous[:, None] - candidates[None, :])
+    rows, cols = linear_sum_assignment(cost)
+    matched = np.empty_like(previous)
+    matched[rows] = candidates[cols]
+    return matched
+
+
+def _min_separation(r):
+    if len(r) < 2:
+        return np.inf
+    d = np.abs(r[:, None] - r[None, :])
+    d[np.diag_indices(len(r))] = np.inf
+    return d.min(axis=1)
+
+
+def root_locus(sys, kmax=None, max_move=0.05, tol=1e-10, max_newton=8):
+    """
+    Follows every branch of D(s) + K N(s) = 0 from K = 0 to K = kmax.
+
+    The gain step doubles while the Newton corrector converges within three
+    iterations and is halved whenever a root would move more than max_move
+    (relative to the size of the locus) or come close to another branch.  Steps are
+    clipped to land exactly on the breakaway and imaginary-axis crossing gains, which
+    are reported in the result.  Full polynomial root solves are used only at
+    breakaway points and when the corrector fails.
+    """
+    num, den = _loop_polynomials(sys)
+    dnum, dden = np.polyder(num), np.polyder(den)
+    n = len(den) - 1
+
+    breakaway = breakaway_points(num, den)
+    crossings = imaginary_axis_crossings(num, den)
+    special = sorted([K for K, _ in breakaway] + [K for K, _ in crossings])
+
+    if kmax is None:
+        k_ref = max(special + [abs(den[-1] / num[-1]) if num[-1] != 0 else 1.0, 1e-12])
+        kmax = 20 * k_ref
+    special = [K for K in special if K < kmax]
+    breakaway_gains = {K: s for K, s in breakaway if K < kmax}
+
+    def P(s, K):
+        return np.polyval(den, s) + K * np.polyval(np.pad(num, (n + 1 - len(num), 0)), s)
+
+    def dP(s, K):
+        return np.polyval(dden, s) + K * (np.polyval(dnum, s) if len(num) > 1 else 0)
+
+    def solve(K):
+        return np.roots(np.polyadd(den, K * num))
+
+    scale = max(1.0, np.max(np.abs(np.concatenate([np.roots(den), np.roots(num) if len(num) > 1 else []]))))
+    h_min = 1e-10 * kmax
+    capture = 2 * max_move * scale
+
+    K = 0.0
+    r = np.roots(den).astype(complex)
+    gains, roots = [K], [r.copy()]
+    n_steps, n_root_solves = 0, 1
+    h = 1e-3 * (special[0] if special else kmax)
+    targets = special + [kmax]
+
+    while K < kmax:
+        target = next((t for t in targets if t > K * (1 + 1e-12)), kmax)
+
+        # jump onto a breakaway point once the merging roots are close to it
+        if target in breakaway_gains:
+            s_b = breakaway_gains[target]
+            if np.sum(np.abs(r - s_b) < capture) >= 2:
+                K = target
+                r = _match(r, solve(K))
+                n_root_solves += 1
+                gains.append(K)
+                roots.append(r.copy())
+                # leave the multiple root with a step that moves the roots about capture/2
+                P2 = abs(np.polyval(np.polyder(dden), s_b)
+                         + K * (np.polyval(np.polyder(dnum), s_b) if len(num) > 2 else 0))
+                h = max(h_min, (capture / 2)**2 * max(P2, 1e-12) / (2 * max(abs(np.polyval(num, s_b)), 1e-300)))
+                h = min(h, 0.5 * (next((t for t in targets if t > K), kmax) - K))
+                K_next = K + h
+                r = _match(r, solve(K_next))
+                n_root_solves += 1
+                K = K_next
+                gains.append(K)
+                roots.append(r.copy())
+                continue
+
+        h_step = min(h, target - K)
+        K_next = target if h_step == target - K else K + h_step  # land exactly on the target
+
+        # predictor: dr/dK = -N(r) / P'(r)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            slope = -np.polyval(num, r) / dP(r, K)
+        move = np.abs(h_step * slope)
+        limit = max_move * np.maximum(scale, np.abs(r))
+        limit = limit * np.clip(np.abs(r.real) / limit, 0.2, 1.0)  # slow down near the jw axis
+        limit = np.minimum(limit, 0.3 * _min_separation(r))
+
+        accepted = False
+        if np.all(np.isfinite(move)) and (np.all(move <= limit) or h_step <= h_min):
+            # corrector: Newton on every branch at the new gain
+            r_new = r + h_step * slope
+            converged = False
+            for iters in range(1, max_newton + 1):
+                delta = P(r_new, K_next) / dP(r_new, K_next)
+                r_new = r_new - delta
+                if np.all(np.abs(delta) <= tol * np.maximum(1.0, np.abs(r_new))):
+                    converged = bool(np.all(np.isfinite(r_new)))
+                    break
+            # each branch must stay closest to its own prediction
+            if converged and np.all(np.abs(r_new - (r + h_step * slope)) < 0.5 * _min_separation(r_new)):
+                accepted = True
+                if iters <= 3 and h_step == h:
+                    h *= 2
+                elif iters >= 6:
+                    h *= 0.5
+
+        if not accepted:
+            if h_step > h_min and np.all(np.isfinite(move)):
+                h = max(h_min, 0.5 * h_step)
+                continue
+            r_new = _match(r, solve(K_next))
+            n_root_solves += 1
+
+        K = K_next
+        r = r_new
+        n_steps += 1
+        gains.append(K)
+        roots.append(r.copy())
+
+    return RootLocus(np.array(gains), np.array(roots), breakaway, crossings, n_steps, n_root_solves)
+
+
+# --- Batch evaluation over many loop transfer functions ---
+def closed_loop_poles(nums, dens, gains):
+    """
+    Closed-loop poles of many loops of the same order at many gains.
+
+    nums and dens are (n_sys, n + 1) coefficient arrays (numerators zero-padded on
+    the left), gains is (n_k,) or (n_sys, n_k).  All companion matrices are stacked
+    and solved by one batched eigenvalue call.  Returns an (n_sys, n_k, n) array.
+    """
+    nums = np.atleast_2d(np.asarray(nums, dtype=float))
+    dens = np.atleast_2d(np.asarray(dens, dtype=float))
+    n_sys, n1 = dens.shape
+    nums = np.pad(nums, ((0, 0), (n1 - nums.shape[1], 0)))
+    gains = np.broadcast_to(np.asarray(gains, dtype=float), (n_sys, np.shape(gains)[-1]))
+
+    char = dens[:, None, :] + gains[:, :, None] * nums[:, None, :]
+    char = char / char[:, :, :1]
+    n = n1 - 1
+    companion = np.zeros(char.shape[:2] + (n, n))
+    companion[..., 0, :] = -char[..., 1:]
+    companion[..., np.arange(1, n), np.arange(n - 1)] = 1
+    return np.linalg.eigvals(companion)
+
+
+def crossing_gains_batch(systems):
+    """Exact breakaway and imaginary-axis crossing gains for a list of loops."""
+    results = []
+    for sys in systems:
+        num, den = _loop_polynomials(sys)
+        results.append((breakaway_points(num, den), imaginary_axis_crossings(num, den)))
+    return results
+
+
+def root_locus_batch(systems, **kwargs):
+    """
+    Runs the continuation engine on every loop transfer function in the list.
+
+    This is a convenience loop over root_locus: every locus picks its own adaptive gain
+    steps, so nothing is shared between systems.  For the poles of many loops at a common
+    set of gains use closed_loop_poles, which solves them in one batched call.
+    """
+    return [root_locus(sys, **kwargs) for sys in systems]
+
+
+if __name__ == '__main__':
+
+    # === 1. The spring-mass-damper from public_examples/secord.py ===
+    m = 250.0           # system mass
+    k = 40.0            # spring constant
+    b = 60.0            # damping constant
+    sys_secord = ct.ss([[0, 1.], [-k/m, -b/m]], [[0], [1/m]], [[1., 0]], 0)
+
+    # === 2. A higher order plant with several breakaway points and crossings ===
+    G_high = ct.tf([1, 3], [1, 0]) * ct.tf([1], [1, 1]) * ct.tf([1], [1, 2]) \
+        * ct.tf([1], [1, 4]) * ct.tf([1], [1, 2, 10]) * ct.tf([1], [1, 8])
+
+    systems = [sys_secord, G_high]
+    labels = ["Spring-Mass-Damper", "Sixth-Order Plant"]
+
+    for sys, label, result in zip(systems, labels, root_locus_batch(systems)):
+        print(f"\n=== {label} ===")
+        print(f"Continuation steps: {result.n_steps}, polynomial root solves: {result.n_root_solves}")
+        for K, s in result.breakaway:
+            print(f"Breakaway point s = {s.real:.6f} at K = {K:.6f}")
+        for K, w in result.crossings:
+            print(f"Imaginary-axis crossing at w = {w:.6f} rad/s, K = {K:.6f}")
+
+        # check the crossing gains against the closed-loop poles
+        num, den = _loop_polynomials(sys)
+        for K, w in result.crossings:
+            poles = closed_loop_poles(num, den, [K])[0, 0]
+            print(f"  min |Re(pole)| at K = {K:.6f}: {np.min(np.abs(poles.real)):.2e}")
+
+        fig = plt.figure()
+        plt.plot(result.roots.real, result.roots.imag, '.-', markersize=3)
+        plt.plot(np.roots(den).real, np.roots(den).imag, 'kx', markersize=10, label='Open-loop poles')
+        if len(num) > 1:
+            plt.plot(np.roots(num).real, np.roots(num).imag, 'ko', fillstyle='none', markersize=10,
+                     label='Open-loop zeros')
+        for K, w in result.crossings:
+            plt.plot([0, 0], [w, -w], 'r*', markersize=10)
+        plt.axvline(0, color='k', linestyle='--', linewidth=0.5)
+        plt.title(f"Root Locus (Continuation): {label}")
+        plt.xlabel("Re(s)")
+        plt.ylabel("Im(s)")
+        plt.grid(True)
+        plt.legend()
+
+        if 'CONTROL_PLOT_DIR' in os.environ:
+            filename = label.lower().replace(" ", "_").replace("-", "") + "_root_locus.pdf"
+            fig.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], filename))
+        else:
+            plt.show()
@@ -0,0 +1,273 @@
+"""
+Interactive explorer for second-order systems: drag the sliders and the step response, the
+Bode plot and the pole-zero map update in place.
+
+Instead of creating a new figure per (zeta, w0) value, the line artists are created once and
+updated with set_data.  Redraws use blitting: the static parts of the figure (axes, grids,
+labels) are cached once and only the changing artists are drawn on top of them.  Responses
+are recomputed with small closed-form evaluators (a one-step propagator for the step
+response, polynomial evaluation for the Bode plot), so an update costs well under a
+millisecond of numerics.
+
+Models:
+    second_order   1 / (s^2 + 2 zeta w0 s + w0^2)      (transfer_function_second_order.py)
+    rotation       A = [[alpha, beta], [-beta, alpha]]  (second_order_systems_and_diagonalization.py)
+    cruise         PID cruise control closed loop       (cruise_control_PID.py)
+
+Usage:
+    python second_order_stability_analysis/parameter_explorer.py --model second_order
+
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+import scipy.linalg
+import matplotlib.pyplot as plt
+import control as ct
+from matplotlib.widgets import Slider
+
+
+# === Models: slider specifications (name, min, max, initial) and (num, den) of each ===
+def second_order_tf(zeta, w0):
+    return [1.0], [1.0, 2 * zeta * w0, w0**2]
+
+
+def rotation_tf(alpha, beta):
+    # x' = A x + [0, 1]' u, y = x_1  =>  beta / ((s - alpha)^2 + beta^2)
+    return [beta], [1.0, -2 * alpha, alpha**2 + beta**2]
+
+
+def cruise_tf(Kp, Ki, Kd, m=1000.0, b=50.0):
+    # C(s) = (Kd s^2 + Kp s + Ki) / s with G(s) = 1 / (m s + b), closed loop from reference
+    return [Kd, Kp, Ki], [m + Kd, b + Kp, Ki]
+
+
+MODELS = {
+    'second_order': {
+        'tf': second_order_tf,
+        'sliders': [('zeta', 0.05, 2.0, 0.2), ('w0', 0.2, 3.0, 1.0)],
+        'time_horizon': 30, 'omega': (-2, 2), 'step_ylim': (-0.5, 3.0), 'pz_lim': 6.5,
+    },
+    'rotation': {
+        'tf': rotation_tf,
+        'sliders': [('alpha', -2.0, 0.5, -1.0), ('beta', 0.1, 3.0, 1.0)],
+        'time_horizon': 10, 'omega': (-2, 2), 'step_ylim': (-2.0, 6.0), 'pz_lim': 3.5,
+    },
+    'cruise': {
+        'tf': cruise_tf,
+        'sliders': [('Kp', 0.0, 1000.0, 200.0), ('Ki', 1.0, 200.0, 50.0), ('Kd', 0.0, 500.0, 20.0)],
+        'time_horizon': 50, 'omega': (-3, 1), 'step_ylim': (0.0, 1.6), 'pz_lim': 1.2,
+    },
+}
+
+
+# === Fast evaluators ===
+class StepEvaluator:
+    """
+    Step response of num/den on a fixed uniform time grid.
+
+    The controllable canonical realization, augmented with the constant input, is
+    propagated with one exact one-step matrix exponential, so each evaluation costs a
+    small expm and len(t) tiny matrix-vector products.
+    """
+
+    def __init__(self, t):
+        self.t = np.asarray(t, dtype=float)
+        self.dt = self.t[1] - self.t[0]
+
+    def __call__(self, num, den):
+        num = np.atleast_1d(np.asarray(num, dtype=float))
+        den = np.atleast_1d(np.asarray(den, dtype=float))
+        num, den = num / den[0], den / den[0]
+        n = len(den) - 1
+        num = np.pad(num, (n + 1 - len(num), 0))
+        d = num[0]                              # direct feedthrough
+        c = (num[1:] - d * den[1:])[::-1]       # strictly proper part
+
+        M = np.zeros((n + 1, n + 1))
+        M[:n - 1, 1:n] = np.eye(n - 1)
+        M[n - 1, :n] = -den[1:][::-1]
+        M[n - 1, n] = 1.0                       # input enters the last state
+        Phi = scipy.linalg.expm(M * self.dt)
+
+        X = np.empty((len(self.t), n + 1))
+        x = np.zeros(n + 1)
+        x[n] = 1.0
+        for k in range(len(self.t)):
+            X[k] = x
+            x = Phi @ x
+        return X[:, :n] @ c + d
+
+
+def bode(num, den, omega):
+    """Magnitude (dB) and phase (deg) of num/den on the frequency grid."""
+    s = 1j * omega
+    G = np.polyval(num, s) / np.polyval(den, s)
+    return 20 * np.log10(np.abs(G)), np.degrees(np.unwrap(np.angle(G)))
+
+
+# === Explorer ===
+class ParameterExplorer:
+    """Step, Bode and pole-zero views of a model, redrawn with blitting on slider changes."""
+
+    def __init__(self, model='second_order'):
+        self.model = MODELS[model]
+        self.name = model
+        self.t = np.linspace(0, self.model['time_horizon'], 500)
+        self.omega = np.logspace(*self.model['omega'], 400)
+        self.step = StepEvaluator(self.t)
+
+        self.fig = plt.figure(figsize=(11, 7))
+        grid = self.fig.add_gridspec(3 + len(self.model['sliders']), 2,
+                                     height_ratios=[4, 4, 1] + [0.6] * len(self.model['sliders']))
+        self.ax_step = self.fig.add_subplot(grid[0:2, 0])
+        self.ax_mag = self.fig.add_subplot(grid[0, 1])
+        self.ax_phase = self.fig.add_subplot(grid[1, 1], sharex=self.ax_mag)
+        # the pole-zero map is drawn as an inset of the step response axes
+        self.ax_pz = self.ax_step.inset_axes([0.62, 0.55, 0.36, 0.42])
+
+        self.sliders = []
+        for i, (label, lo, hi, init) in enumerate(self.model['sliders']):
+            ax = self.fig.add_subplot(grid[3 + i, :])
+            slider = Slider(ax, label, lo, hi, valinit=init)
+            slider.drawon = False  # the explorer blits the slider itself
+            slider.on_changed(self.update)
+            self.sliders.append(slider)
+
+        self._setup_axes()
+        self.background = None
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.update()
+
+    def _setup_axes(self):
+        kw = {'animated': True}
+        self.line_step, = self.ax_step.plot([], [], 'b', **kw)
+        self.line_mag, = self.ax_mag.semilogx([], [], 'b', **kw)
+        self.line_phase, = self.ax_phase.semilogx([], [], 'b', **kw)
+        self.poles, = self.ax_pz.plot([], [], 'rx', markersize=9, **kw)
+        self.zeros, = self.ax_pz.plot([], [], 'o', fillstyle='none', markersize=9, **kw)
+        self.text = self.ax_step.text(0.02, 0.95, '', transform=self.ax_step.transAxes, va='top', **kw)
+        self.artists = [self.line_step, self.line_mag, self.line_phase, self.poles, self.zeros, self.text]
+        # the slider axes are small: each is redrawn whole (track, handle, label and value text),
+        # which needs only the public Axes
+        for slider in self.sliders:
+            slider.ax.set_animated(True)
+            self.artists.append(slider.ax)
+
+        self.ax_step.set_xlim(0, self.t[-1])
+        self.ax_step.set_ylim(*self.model['step_ylim'])
+        self.ax_step.set_xlabel("Time (s)")
+        self.ax_step.set_ylabel("Step Response")
+        self.ax_mag.set_xlim(self.omega[0], self.omega[-1])
+        self.ax_mag.set_ylim(-80, 30)
+        self.ax_mag.set_ylabel("Magnitude (dB)")
+        self.ax_phase.set_ylim(-200, 100)
+        self.ax_phase.set_ylabel("Phase (deg)")
+        self.ax_phase.set_xlabel("Frequency (rad/s)")
+        lim = self.model['pz_lim']
+        self.ax_pz.set_xlim(-lim, lim / 3)
+        self.ax_pz.set_ylim(-lim / 1.5, lim / 1.5)
+        self.ax_pz.axhline(0, color='k', linewidth=0.5)
+        self.ax_pz.axvline(0, color='k', linewidth=0.5)
+        self.ax_pz.set_title("Poles / Zeros", fontsize=9)
+        for ax in (self.ax_step, self.ax_mag, self.ax_phase, self.ax_pz):
+            ax.grid(True)
+        self.fig.suptitle(f"Parameter Explorer: {self.name}")
+
+    def values(self):
+        return [s.val for s in self.sliders]
+
+    def _on_draw(self, event):
+        # cache everything that is not animated, then draw the animated artists on top
+        # (savefig draws on a temporary canvas, e.g. the PDF one, which cannot blit)
+        if not event.canvas.supports_blit:
+            return
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_animated()
+
+    def _draw_animated(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def update(self, val=None):
+        num, den = self.model['tf'](*self.values())
+        y = self.step(num, den)
+        mag, phase = bode(num, den, self.omega)
+        p, z = np.roots(den), np.roots(num) if len(np.trim_zeros(num, 'f')) > 1 else np.array([])
+
+        self.line_step.set_data(self.t, y)
+        self.line_mag.set_data(self.omega, mag)
+        self.line_phase.set_data(self.omega, phase)
+        self.poles.set_data(p.real, p.imag)
+        self.zeros.set_data(np.real(z), np.imag(z))
+        self.text.set_text(', '.join(f"{s.label.get_text()} = {s.val:.3g}" for s in self.sliders))
+
+        canvas = self.fig.canvas
+        if self.background is None:
+            canvas.draw()
+            return
+        canvas.restore_region(self.background)
+        self._draw_animated()
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    def snapshot(self, path):
+        """Saves the current state; animated artists are skipped by savefig otherwise."""
+        for artist in self.artists:
+            artist.set_animated(False)
+        try:
+            self.fig.savefig(path)
+        finally:
+            for artist in self.artists:
+                artist.set_animated(True)
+        self.fig.canvas.draw()
+
+    def benchmark(self, n_frames=200, blit=True):
+        """
+        Sweeps the first slider over its range and returns the achieved frames per second.
+
+        With blit=False every frame is a full redraw, for comparison.
+        """
+        self.fig.canvas.draw()
+        slider = self.sliders[0]
+        values = np.linspace(slider.valmin, slider.valmax, n_frames)
+        start = time.perf_counter()
+        for v in values:
+            if not blit:
+                self.background = None
+            slider.set_val(v)
+        return n_frames / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Interactive parameter explorer.')
+    parser.add_argument('--model', choices=list(MODELS), default='second_order')
+    args = parser.parse_args()
+
+    if 'CONTROL_PLOT_DIR' not in os.environ:
+        explorer = ParameterExplorer(args.model)
+        plt.show()
+    else:
+        # headless: check the evaluators, report the redraw rate of every model and save a snapshot
+        t = np.linspace(0, 30, 500)
+        step = StepEvaluator(t)
+        omega = np.logspace(-2, 2, 50)
+        for model in MODELS.values():
+            num, den = model['tf'](*[init for _, _, _, init in model['sliders']])
+            _, y_ref = ct.step_response(ct.tf(num, den), t)
+            mag_ref, phase_ref, _ = ct.frequency_response(ct.tf(num, den), omega)
+            mag, _ = bode(num, den, omega)
+            print(f"{model['tf'].__name__:16s} step error {np.max(np.abs(step(num, den) - y_ref)):.1e}, "
+                  f"magnitude error {np.max(np.abs(mag - 20 * np.log10(mag_ref))):.1e} dB")
+
+        for model in MODELS:
+            explorer = ParameterExplorer(model)
+            fps_full = explorer.benchmark(50, blit=False)
+            fps = explorer.benchmark()
+            print(f"{model:16s} {fps:5.0f} frames per second blitted, {fps_full:5.0f} with full redraws")
+            for slider in explorer.sliders:
+                slider.reset()
+            explorer.snapshot(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'parameter_explorer_' + model + '.pdf'))
+            plt.close(explorer.fig)
@@ -0,0 +1,307 @@
+"""
+This code evaluates frequency and step responses of very large families of second-order systems
+1 / (s^2 + 2 zeta w0 s + w0^2), as swept with damping_list / natfreq_list in
+transfer_function_second_order.py and frequency_domain_tf.py, in reduced precision.
+
+With precision='single' the responses are computed in float32 / complex64, which halves the
+memory traffic of every array and doubles the SIMD width.  Single precision is only accurate
+where the problem is well conditioned, so every result comes with an a-priori error estimate,
+and the entries whose estimate exceeds tol are recomputed in double precision:
+
+- frequency response: d(jw) = (w0^2 - w^2) + 2j zeta w0 w loses relative accuracy
+  eps * (w0^2 + w^2 + 2 zeta w0 w) / |d(jw)| by cancellation near a lightly damped resonance;
+- step response: rounding errors of the one-step recursion x[k+1] = Phi x[k] + Gamma add up
+  over the ~1 / (1 - rho) steps of memory of the system (rho: spectral radius of Phi), like a
+  random walk (sqrt of the number of steps), and grow with the eigenvector condition number,
+  which is unbounded at critical damping (zeta = 1); measured, the growth is only about its
+  fourth root.
+
+The systems are processed in chunks so that the working set stays bounded, and the results are
+stored in a compact dtype (float32 or float16) and optionally in a .npy file on disk
+(np.lib.format.open_memmap) when they do not fit in memory: 10^6 systems x 1000 frequencies are
+16 GB as complex128 but 4 GB as float16 magnitude and phase.  The guard covers the computation
+only: float16 storage itself rounds to about 5e-4 relative (0.03 dB, 0.06 deg).
+
+"""
+
+import os
+import time
+import tracemalloc
+from collections import namedtuple
+import numpy as np
+import matplotlib.pyplot as plt
+
+PRECISIONS = {'double': (np.float64, np.complex128), 'single': (np.float32, np.complex64)}
+EPS32 = np.finfo(np.float32).eps
+# factors on the error estimates eps * condition, from the measured errors (see the demo); the
+# step factor bounds the float32 errors of three families (the demo's, 4000 steps to t = 400
+# and 2000 steps to t = 20) by at least 7%
+FREQUENCY_SAFETY = 2.0
+STEP_SAFETY = 12.0
+
+# mag_db and phase_deg (or y) shaped (n_systems, n_samples) in the storage dtype, the
+# a-priori relative error estimate of the reduced-precision pass and the recomputed mask
+FrequencySweep = namedtuple('FrequencySweep', ['mag_db', 'phase_deg', 'error_estimate', 'recomputed'])
+StepSweep = namedtuple('StepSweep', ['y', 'error_estimate', 'recomputed'])
+
+
+def _output(shape, dtype, path=None):
+    if path is None:
+        return np.empty(shape, dtype=dtype)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+
+# === Frequency response ===
+def _frequency_chunk(zeta, w0, omega, real):
+    """
+    Magnitude (dB), phase (deg) and the relative error factor of |H| in the dtype real
+    (broadcast): the cancellation condition number plus the rounding of the dB value itself.
+    """
+    zeta, w0, omega = (np.asarray(x, dtype=real) for x in (zeta, w0, omega))
+    re = w0 * w0 - omega * omega
+    im = 2 * zeta * w0 * omega
+    mag2 = re * re + im * im
+    mag_db = -10 * np.log10(mag2)
+    cond = (w0 * w0 + omega * omega + np.abs(im)) / np.sqrt(mag2) + real(np.log(10) / 10) * np.abs(mag_db)
+    return mag_db, np.degrees(-np.arctan2(im, re)), cond
+
+
+def frequency_sweep(zeta, w0, omega, precision='single', tol=1e-4, store_dtype=np.float32, chunk=8192, path=None):
+    """
+    Bode magnitude and phase of all systems (zeta[i], w0[i]) on the grid omega.
+
+    With precision='single', the entries whose estimated relative error exceeds tol are
+    recomputed in double precision.  path stores mag_db and phase_deg in path + '_mag.npy' /
+    '_phase.npy'.  Returns a FrequencySweep; recomputed counts the entries of every system.
+    """
+    real = PRECISIONS[precision][0]
+    zeta, w0, omega = np.asarray(zeta, dtype=float), np.asarray(w0, dtype=float), np.asarray(omega, dtype=float)
+    shape = (len(zeta), len(omega))
+    mag = _output(shape, store_dtype, path and path + '_mag.npy')
+    phase = _output(shape, store_dtype, path and path + '_phase.npy')
+    error = np.empty(len(zeta), dtype=np.float32)
+    recomputed = np.zeros(len(zeta), dtype=np.int32)
+    for start in range(0, len(zeta), chunk):
+        rows = slice(start, start + chunk)
+        m, p, cond = _frequency_chunk(zeta[rows, None], w0[rows, None], omega, real)
+        estimate = FREQUENCY_SAFETY * np.finfo(real).eps * cond
+        bad_rows, bad_cols = np.nonzero(estimate > tol)
+        if real is not np.float64 and len(bad_rows):
+            i = bad_rows + start
+            m[bad_rows, bad_cols], p[bad_rows, bad_cols], cond_d = _frequency_chunk(zeta[i], w0[i], omega[bad_cols],
+                                                                                    np.float64)
+            estimate[bad_rows, bad_cols] = FREQUENCY_SAFETY * np.finfo(np.float64).eps * cond_d
+            recomputed[rows] = np.bincount(bad_rows, minlength=m.shape[0])
+        mag[rows] = m
+        phase[rows] = p
+        error[rows] = estimate.max(axis=1)
+    return FrequencySweep(mag, phase, error, recomputed)
+
+
+# === Step response ===
+def _propagators(zeta, w0, h):
+    """
+    Exact one-step matrices Phi (N, 2, 2) and Gamma (N, 2) of the companion realization, in
+    closed form: e^(A h) = e^(-zeta w0 h) (cosh(r h) I + sinh(r h) / r (A + zeta w0 I)) with
+    r = w0 sqrt(zeta^2 - 1), and Gamma = A^-1 (Phi - I) B.
+    """
+    zeta, w0 = np.asarray(zeta, dtype=float), np.asarray(w0, dtype=float)
+    sigma = zeta * w0
+    rh = w0 * h * np.sqrt((zeta ** 2 - 1).astype(complex))
+    c0 = np.cosh(rh).real
+    # sinh(r h) / r, by its series where r h is tiny
+    small = np.abs(rh) < 1e-4
+    c1 = np.where(small, h * (1 + rh ** 2 / 6), np.sinh(rh) * h / np.where(small, 1, rh)).real
+    decay = np.exp(-sigma * h)
+    Phi = np.empty((len(zeta), 2, 2))
+    Phi[:, 0, 0] = decay * (c0 + sigma * c1)
+    Phi[:, 0, 1] = decay * c1
+    Phi[:, 1, 0] = -decay * w0 ** 2 * c1
+    Phi[:, 1, 1] = decay * (c0 - sigma * c1)
+    # A^-1 = [[-2 zeta / w0, -1 / w0^2], [1, 0]] applied to (Phi - I) [0, 1]'
+    Gamma = np.stack([-2 * zeta / w0 * Phi[:, 0, 1] - (Phi[:, 1, 1] - 1) / w0 ** 2, Phi[:, 0, 1]], axis=1)
+    return Phi, Gamma
+
+
+def step_condition(zeta, w0, h, n_steps):
+    """
+    Relative error growth factor of the reduced-precision step recursion: sqrt(effective number
+    of steps m) times the fourth root of the transient growth of Phi^k, the eigenvector condition
+    number of the companion matrix but at most m (the growth of a Jordan block over m steps) near
+    zeta = 1.  The exponent is fitted to measured errors: a linear factor overestimates them by
+    orders of magnitude away from zeta = 1.
+    """
+    root = np.sqrt((zeta ** 2 - 1).astype(complex))
+    lam1, lam2 = w0 * (-zeta + root), w0 * (-zeta - root)
+    rho = np.exp(np.maximum(lam1.real, lam2.real) * h)
+    memory = np.minimum(n_steps, 1 / np.maximum(1 - rho, 1e-300))
+    # columns [1, lam] / |[1, lam]| of the eigenvector matrix: cond = (1 + sqrt(1 - |det|^2)) / |det|
+    det = np.abs(lam2 - lam1) / np.sqrt((1 + np.abs(lam1) ** 2) * (1 + np.abs(lam2) ** 2))
+    with np.errstate(divide='ignore'):
+        cond = (1 + np.sqrt(np.maximum(1 - det ** 2, 0))) / det
+    return np.sqrt(memory) * np.minimum(cond, memory) ** 0.25
+
+
+def _step_chunk(Phi, Gamma, n_steps, real, out=None, block=64):
+    """
+    Step responses (N, n_steps) by the recursion in the dtype real, written to out.
+
+    The state is kept in contiguous (N,) arrays updated in place; the outputs of block steps
+    are buffered and written transposed together, which keeps the writes to out cache-friendly.
+    """
+    p00, p01, p10, p11 = (np.ascontiguousarray(Phi[:, i, j], dtype=real) for i in (0, 1) for j in (0, 1))
+    g0, g1 = (np.ascontiguousarray(Gamma[:, i], dtype=real) for i in (0, 1))
+    out = np.empty((len(Phi), n_steps), dtype=real) if out is None else out
+    buffer = np.empty((block, len(Phi)), dtype=real)
+    x0, x1 = np.zeros(len(Phi), dtype=real), np.zeros(len(Phi), dtype=real)
+    t0, t1 = np.empty_like(x0), np.empty_like(x0)
+    for k in range(n_steps):
+        buffer[k % block] = x0
+        if k % block == block - 1 or k == n_steps - 1:
+            out[:, k - k % block:k + 1] = buffer[:k % block + 1].T
+        # x0 <- p00 x0 + p01 x1 + g0, x1 <- p10 x0 + p11 x1 + g1
+        np.multiply(p00, x0, out=t0)
+        t0 += g0
+        np.multiply(p01, x1, out=t1)
+        t0 += t1
+        np.multiply(p10, x0, out=t1)
+        t1 += g1
+        x1 *= p11
+        x1 += t1
+        x0, t0 = t0, x0
+    return out
+
+
+def step_sweep(zeta, w0, t, precision='single', tol=1e-4, store_dtype=np.float32, chunk=16384, path=None):
+    """
+    Unit step responses of all systems on the uniform time grid t.
+
+    With precision='single', systems whose estimated relative error exceeds tol are recomputed
+    in double precision.  path stores y in a .npy file instead of memory.
+    """
+    real = PRECISIONS[precision][0]
+    zeta, w0 = np.asarray(zeta, dtype=float), np.asarray(w0, dtype=float)
+    h, n_steps = t[1] - t[0], len(t)
+    y = _output((len(zeta), n_steps), store_dtype, path)
+    error = np.empty(len(zeta), dtype=np.float32)
+    recomputed = np.zeros(len(zeta), dtype=bool)
+    for start in range(0, len(zeta), chunk):
+        rows = slice(start, start + chunk)
+        Phi, Gamma = _propagators(zeta[rows], w0[rows], h)
+        estimate = STEP_SAFETY * np.finfo(real).eps * step_condition(zeta[rows], w0[rows], h, n_steps)
+        bad = estimate > tol if real is not np.float64 else np.zeros(len(estimate), dtype=bool)
+        if np.all(bad):
+            _step_chunk(Phi, Gamma, n_steps, np.float64, out=y[rows])
+        else:
+            _step_chunk(Phi, Gamma, n_steps, real, out=y[rows])
+            if np.any(bad):
+                # recompute the ill-conditioned systems in double precision
+                y[np.flatnonzero(bad) + start] = _step_chunk(Phi[bad], Gamma[bad], n_steps, np.float64)
+        estimate[bad] = STEP_SAFETY * np.finfo(np.float64).eps * step_condition(zeta[rows][bad], w0[rows][bad], h,
+                                                                                  n_steps)
+        recomputed[rows] = bad
+        error[rows] = estimate
+    return StepSweep(y, error, recomputed)
+
+
+def _measure(func, *args, **kwargs):
+    """(result, seconds, peak traced memory in bytes); timed without tracing, which slows numpy."""
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = func(*args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+if __name__ == '__main__':
+
+    # === 1. A family of 2 10^4 systems, from very light to heavy damping, some near zeta = 1 ===
+    rng = np.random.default_rng(0)
+    n_systems = 20000
+    zeta = np.concatenate([10 ** rng.uniform(-4, 0.3, n_systems - 400), rng.uniform(0.999, 1.001, 400)])
+    w0 = 10 ** rng.uniform(-1, 1, n_systems)
+    omega = np.logspace(-2, 2, 1000)
+    t = np.linspace(0, 50, 1000)
+
+    # double-precision references, and the unguarded single-precision errors
+    ref = frequency_sweep(zeta, w0, omega, 'double', store_dtype=np.float64)
+    ref_y = step_sweep(zeta, w0, t, 'double', store_dtype=np.float64).y
+    scale = np.abs(ref_y).max(axis=1)
+    m32, _, cond = _frequency_chunk(zeta[:, None], w0[:, None], omega, np.float32)
+    freq_err32 = np.abs(10 ** ((m32.astype(float) - ref.mag_db) / 20) - 1)
+    Phi, Gamma = _propagators(zeta, w0, t[1] - t[0])
+    step_err32 = np.abs(_step_chunk(Phi, Gamma, len(t), np.float32) - ref_y).max(axis=1) / scale
+    step_estimate = STEP_SAFETY * EPS32 * step_condition(zeta, w0, t[1] - t[0], len(t))
+    print(f"Single precision without guard: |H| error up to {freq_err32.max():.1e}, step error up to "
+          f"{step_err32.max():.1e}; the estimates bound them by factors >= "
+          f"{np.min(FREQUENCY_SAFETY * EPS32 * cond / np.maximum(freq_err32, 1e-30)):.2f} and "
+          f"{np.min(step_estimate / step_err32):.2f}")
+    del m32
+
+    # === 2. Benchmark: time, peak memory and error of each mode ===
+    def freq_error(result):
+        mag = np.abs(10 ** ((result.mag_db.astype(float) - ref.mag_db) / 20) - 1).max()
+        return mag, np.abs(result.phase_deg.astype(float) - ref.phase_deg).max()
+
+    modes = [
+        ('double, float64', 'double', np.float64, 1e-4),
+        ('single + guard, float32', 'single', np.float32, 1e-3),
+        ('single + guard, float32', 'single', np.float32, 1e-4),
+        ('single + guard, float32', 'single', np.float32, 1e-5),
+        ('single + guard, float16', 'single', np.float16, 1e-4),
+    ]
+    print(f"\nFrequency responses, {n_systems} systems x {len(omega)} frequencies:")
+    for name, precision, dtype, tol in modes:
+        result, elapsed, peak = _measure(frequency_sweep, zeta, w0, omega, precision, tol, dtype)
+        mag, phase = freq_error(result)
+        print(f"  {name:24s} tol {tol:.0e}: {elapsed:5.2f} s, peak {peak / 2 ** 20:4.0f} MB, output "
+              f"{(result.mag_db.nbytes + result.phase_deg.nbytes) / 2 ** 20:4.0f} MB; error |H| {mag:.1e}, "
+              f"phase {phase:.1e} deg; recomputed {100 * result.recomputed.sum() / ref.mag_db.size:.3f}% of entries")
+
+    print(f"\nStep responses, {n_systems} systems x {len(t)} samples:")
+    for name, precision, dtype, tol in modes:
+        result, elapsed, peak = _measure(step_sweep, zeta, w0, t, precision, tol, dtype)
+        err = np.abs(result.y.astype(float) - ref_y).max(axis=1) / scale
+        print(f"  {name:24s} tol {tol:.0e}: {elapsed:5.2f} s, peak {peak / 2 ** 20:4.0f} MB, output "
+              f"{result.y.nbytes / 2 ** 20:4.0f} MB; error {err.max():.1e}; "
+              f"recomputed {100 * result.recomputed.mean():.1f}% of the systems")
+
+    # sweeps larger than memory: a float16 .npy memmap keeps only one chunk in memory
+    path = os.path.join(os.environ.get('CONTROL_PLOT_DIR', '.'), 'step_sweep_float16.npy')
+    disk, elapsed, peak = _measure(step_sweep, zeta, w0, t, store_dtype=np.float16, path=path)
+    print(f"  into a float16 .npy memmap:        {elapsed:5.2f} s, peak {peak / 2 ** 20:4.0f} MB, "
+          f"file {os.path.getsize(path) / 2 ** 20:.0f} MB")
+    del disk
+    os.remove(path)
+
+    # === 3. Plots ===
+    fig, axes = plt.subplots(1, 2, figsize=(12, 4.5))
+    picks = rng.choice(freq_err32.size, 200000, replace=False)
+    axes[0].loglog(cond.ravel()[picks], np.maximum(freq_err32.ravel()[picks], 1e-10), '.', markersize=1)
+    c = np.array([1, cond.max()])
+    axes[0].loglog(c, FREQUENCY_SAFETY * EPS32 * c, 'r', label="Error estimate")
+    axes[0].axhline(1e-4, color='k', linestyle='--', label="tol = 1e-4")
+    axes[0].set_xlabel("Error factor (condition number + dB rounding)")
+    axes[0].set_ylabel("Single-precision |H| relative error")
+    axes[0].set_title("Frequency Response")
+    axes[0].legend()
+    axes[0].grid()
+    axes[1].loglog(step_estimate, step_err32, '.', markersize=2)
+    e = np.array([step_estimate.min(), step_estimate.max()])
+    axes[1].loglog(e, e, 'r', label="Error = estimate")
+    axes[1].axvline(1e-4, color='k', linestyle='--', label="tol = 1e-4")
+    axes[1].set_xlabel("Error estimate")
+    axes[1].set_ylabel("Single-precision relative error")
+    axes[1].set_title("Step Response")
+    axes[1].legend()
+    axes[1].grid()
+    fig.suptitle("Reduced Precision Sweep: Error vs Conditioning")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'reduced_precision_sweep.pdf'))
+    else:
+        plt.show()
@@ -0,0 +1,210 @@
+"""
+This code draws pole-zero maps of very large families of systems as density images.
+
+ct.pzmap (margins.py, nyquist.py) draws one marker per pole of one system; for the 10^6 closed
+loops of a parameter sweep that is unreadable and slow to render.  Here the poles and zeros of
+all systems are binned into 2-D histograms over a fixed region of the s-plane:
+
+- PoleZeroDensity accumulates stacked (n_systems, n_roots) pole/zero arrays chunk by chunk
+  (NaN entries are ignored, so systems of different orders can share one array), computing the
+  bin of every root with one division and np.bincount; the memory is that of the histograms;
+- plot() draws the pole density as an image (log color scale) and the zero density as contour
+  lines, with optional damping ratio / natural frequency grid lines (sgrid), so the rendering
+  cost depends on the number of bins only, not on the number of systems;
+- stacked_roots() returns the roots of stacked polynomials from batched companion matrices.
+
+"""
+
+import os
+import io
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+
+
+def stacked_roots(coeffs):
+    """Roots (N, n) of the polynomials in the rows of coeffs (N, n + 1), leading coefficients nonzero."""
+    coeffs = np.atleast_2d(np.asarray(coeffs, dtype=float))
+    N, n = coeffs.shape[0], coeffs.shape[1] - 1
+    if n == 0:
+        return np.empty((N, 0), dtype=complex)
+    C = np.zeros((N, n, n))
+    C[:, 0, :] = -coeffs[:, 1:] / coeffs[:, :1]
+    C[:, np.arange(1, n), np.arange(n - 1)] = 1
+    return np.linalg.eigvals(C)
+
+
+class PoleZeroDensity:
+    """
+    Histograms of pole and zero locations over extent = (re_min, re_max, im_min, im_max) with
+    bins = (n_re, n_im) bins.  Roots outside the extent are counted in outside.
+    """
+
+    def __init__(self, extent, bins=(400, 400)):
+        self.extent = tuple(float(x) for x in extent)
+        self.bins = tuple(bins)
+        self.poles = np.zeros(self.bins[::-1], dtype=np.int64)
+        self.zeros = np.zeros(self.bins[::-1], dtype=np.int64)
+        self.outside = {'poles': 0, 'zeros': 0}
+        self.n_systems = 0
+
+    def _bin(self, roots, counts, kind):
+        roots = np.asarray(roots).ravel()
+        roots = roots[~np.isnan(roots)]
+        re_min, re_max, im_min, im_max = self.extent
+        n_re, n_im = self.bins
+        i = np.floor((roots.real - re_min) * (n_re / (re_max - re_min))).astype(np.int64)
+        j = np.floor((roots.imag - im_min) * (n_im / (im_max - im_min))).astype(np.int64)
+        inside = (i >= 0) & (i < n_re) & (j >= 0) & (j < n_im)
+        counts += np.bincount(j[inside] * n_re + i[inside], minlength=n_re * n_im).reshape(counts.shape)
+        self.outside[kind] += int(np.count_nonzero(~inside))
+
+    def add(self, poles, zeros=None):
+        """Adds the stacked poles (and zeros) of a chunk of systems."""
+        poles = np.atleast_2d(poles)
+        self.n_systems += poles.shape[0]
+        self._bin(poles, self.poles, 'poles')
+        if zeros is not None:
+            self._bin(zeros, self.zeros, 'zeros')
+        return self
+
+    def merge(self, other):
+        """Adds the counts of another accumulator over the same grid (e.g. from a worker process)."""
+        if other.extent != self.extent or other.bins != self.bins:
+            raise ValueError("densities must have the same extent and bins")
+        self.poles += other.poles
+        self.zeros += other.zeros
+        for kind in self.outside:
+            self.outside[kind] += other.outside[kind]
+        self.n_systems += other.n_systems
+        return self
+
+    def plot(self, ax=None, zeta=None, wn=None, cmap='viridis', zero_color='tab:red', title=None):
+        """
+        Pole density image and zero density contours on ax, with sgrid lines for the damping
+        ratios zeta and natural frequencies wn if given.  Returns the image.
+        """
+        ax = plt.gca() if ax is None else ax
+        counts = np.where(self.poles > 0, self.poles, np.nan)
+        image = ax.imshow(counts, origin='lower', extent=self.extent, aspect='auto', cmap=cmap,
+                          norm=LogNorm(vmin=1, vmax=max(self.poles.max(), 2)), interpolation='nearest')
+        plt.colorbar(image, ax=ax, label="Poles per bin")
+        if self.zeros.any():
+            re_min, re_max, im_min, im_max = self.extent
+            x = np.linspace(re_min, re_max, self.bins[0] + 1)
+            y = np.linspace(im_min, im_max, self.bins[1] + 1)
+            levels = np.logspace(0, np.log10(max(self.zeros.max(), 10)), 5)
+            ax.contour((x[:-1] + x[1:]) / 2, (y[:-1] + y[1:]) / 2, self.zeros, levels=levels, colors=zero_color,
+                       linewidths=0.8)
+            ax.plot([], [], color=zero_color, linewidth=0.8, label="Zero density")
+            ax.legend(loc='upper left')
+        if zeta is not None or wn is not None:
+            sgrid(ax, zeta, wn, self.extent)
+        ax.axvline(0, color='k', linewidth=0.6)
+        ax.set_xlim(self.extent[:2])
+        ax.set_ylim(self.extent[2:])
+        ax.set_xlabel("Real")
+        ax.set_ylabel("Imaginary")
+        if title is not None:
+            ax.set_title(title)
+        return image
+
+
+def sgrid(ax, zeta=None, wn=None, extent=None):
+    """Constant damping ratio rays and natural frequency semicircles in the left half-plane."""
+    extent = extent or (*ax.get_xlim(), *ax.get_ylim())
+    radius = np.hypot(max(abs(extent[0]), abs(extent[1])), max(abs(extent[2]), abs(extent[3])))
+    for z in np.atleast_1d(zeta if zeta is not None else []):
+        angle = np.arccos(z)
+        ax.plot([0, -radius * z], [0, radius * np.sin(angle)], color='0.5', linewidth=0.6, linestyle='--')
+        ax.plot([0, -radius * z], [0, -radius * np.sin(angle)], color='0.5', linewidth=0.6, linestyle='--')
+        ax.annotate(f"{z:g}", (-radius * z, radius * np.sin(angle)), fontsize=7, color='0.4',
+                    xytext=(-radius * z * 0.9, min(radius * np.sin(angle), extent[3]) * 0.95))
+    theta = np.linspace(np.pi / 2, 3 * np.pi / 2, 200)
+    for w in np.atleast_1d(wn if wn is not None else []):
+        ax.plot(w * np.cos(theta), w * np.sin(theta), color='0.5', linewidth=0.6, linestyle=':')
+
+
+if __name__ == '__main__':
+
+    # === 1. 10^6 cruise control loops: PID with derivative filter, swept gains and mass ===
+    # C(s) = Kp + Ki / s + Kd s / (tau s + 1), P(s) = 1 / (m s + b): closed-loop poles are the
+    # roots of s (tau s + 1)(m s + b) + (Kp (tau s + 1) s + Ki (tau s + 1) + Kd s^2), the zeros
+    # those of the controller numerator
+    rng = np.random.default_rng(0)
+    n_systems = 1000000
+    chunk = 100000
+    tau, b = 0.1, 50.0
+    density = PoleZeroDensity(extent=(-12, 1, -4, 4), bins=(520, 320))
+    start = time.perf_counter()
+    for _ in range(n_systems // chunk):
+        Kp, Ki, Kd = rng.uniform(50, 600, chunk), rng.uniform(5, 300, chunk), rng.uniform(0, 200, chunk)
+        m = rng.uniform(800, 2500, chunk)
+        num = np.stack([Kd + Kp * tau, Kp + Ki * tau, Ki], axis=1)
+        den = np.stack([tau * m, m + tau * b, np.zeros(chunk), np.zeros(chunk)], axis=1)
+        den[:, 1:] += np.stack([Kd + Kp * tau, Kp + Ki * tau, Ki], axis=1)
+        den[:, 2] += b
+        density.add(stacked_roots(den), stacked_roots(num))
+    accumulate = time.perf_counter() - start
+    print(f"{density.n_systems} closed loops: roots and binning in {accumulate:.2f} s; "
+          f"{density.poles.sum()} poles binned, {density.outside['poles']} outside the map; "
+          f"{density.zeros.sum()} zeros binned, {density.outside['zeros']} outside")
+
+    # agreement with np.roots and one-by-one binning on a few systems
+    check = PoleZeroDensity(density.extent, density.bins)
+    roots = stacked_roots(den[:200])
+    check.add(roots)
+    H, _, _ = np.histogram2d(roots.imag.ravel(), roots.real.ravel(), bins=density.bins[::-1],
+                             range=[density.extent[2:], density.extent[:2]])
+    assert np.allclose(np.sort_complex(roots[0]), np.sort_complex(np.roots(den[0])))
+    assert np.array_equal(check.poles, H.astype(np.int64))
+
+    # === 2. Rendering time: constant in the number of systems, unlike one marker per pole ===
+    def render_pdf(fig):
+        start = time.perf_counter()
+        fig.savefig(io.BytesIO(), format='pdf')
+        plt.close(fig)
+        return time.perf_counter() - start
+
+    all_poles = stacked_roots(den)
+    for n in (10000, 100000, 1000000):
+        partial = PoleZeroDensity(density.extent, density.bins)
+        partial.poles = density.poles * n // n_systems
+        partial.zeros = density.zeros * n // n_systems
+        fig = plt.figure()
+        partial.plot(zeta=[0.2, 0.5, 0.8], wn=[2, 5, 10])
+        density_time = render_pdf(fig)
+        message = f"  {n:8d} systems: density map rendered to PDF in {density_time * 1e3:5.0f} ms"
+        if n <= len(all_poles):
+            fig = plt.figure()
+            plt.plot(all_poles[:n].real.ravel(), all_poles[:n].imag.ravel(), 'x', markersize=2)
+            message += f", one marker per pole in {render_pdf(fig) * 1e3:5.0f} ms"
+        print(message)
+
+    # === 3. Plots ===
+    fig, ax = plt.subplots(figsize=(9, 6))
+    density.plot(ax, zeta=[0.2, 0.4, 0.6, 0.8], wn=[1, 2, 5, 10],
+                 title=f"Pole-Zero Density: {density.n_systems} PID Cruise Control Loops")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'pole_zero_density.pdf'))
+    else:
+        plt.show()
+
+    # second-order family 1 / (s^2 + 2 zeta w0 s + w0^2) swept as in transfer_function_second_order.py
+    zeta = rng.uniform(0.05, 1.5, n_systems)
+    w0 = rng.uniform(0.5, 3, n_systems)
+    root = np.sqrt((zeta ** 2 - 1).astype(complex))
+    second_order = PoleZeroDensity(extent=(-9, 0.5, -3.5, 3.5), bins=(380, 280))
+    second_order.add(np.stack([w0 * (-zeta + root), w0 * (-zeta - root)], axis=1))
+    fig, ax = plt.subplots(figsize=(9, 6))
+    second_order.plot(ax, zeta=[0.05, 0.3, 0.7, 1.0], wn=[0.5, 1, 2, 3],
+                      title=f"Pole Density: {n_systems} Second-Order Systems")
+    fig.tight_layout()
+
+    if 'CONTROL_PLOT_DIR' in os.environ:
+        plt.savefig(os.path.join(os.environ['CONTROL_PLOT_DIR'], 'second_order_pole_density.pdf'))
+    else:
+        plt.show()
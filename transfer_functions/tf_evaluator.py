@@ -0,0 +1,348 @@
+"""
+This code evaluates SISO transfer functions G(s) from a pole-residue or factored (zero-pole-gain)
+form that is computed once per system, and memoizes recent frequency grids.
+
+Evaluating num(s)/den(s) from polynomial coefficients loses accuracy near lightly damped
+high-order resonances, and every analysis call (Bode, Nyquist, margins, DC gain) repeats the
+same evaluation.  A TransferFunctionEvaluator stores
+
+    pole-residue:  G(s) = d + sum_i r_i / (s - p_i)          (simple, well separated poles)
+    factored:      G(s) = k prod_i (s - z_i) / (s - p_i)     (zeros paired with nearby poles)
+
+and evaluates it at any complex array in one vectorized expression.  Frequency responses are
+kept in a bounded LRU cache keyed by the frequency grid, so the Bode plot, the Nyquist plot and
+the margin computation of the same loop share one evaluation.
+
+"""
+
+import os
+import time
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import matplotlib.pyplot as plt
+import control as ct
+
+
+class LRUCache:
+    """A bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.data:
+            self.data.move_to_end(key)
+            self.hits += 1
+            return self.data[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def array_key(x):
+    """Cache key of an array: its shape, dtype and a digest of its contents."""
+    x = np.ascontiguousarray(x)
+    return x.shape, x.dtype.str, hashlib.blake2b(x.tobytes(), digest_size=16).digest()
+
+
+def _pair_zeros_with_poles(zeros, poles):
+    """Orders the poles so that zeros[i] is divided by the nearest remaining pole."""
+    remaining = list(poles)
+    paired = []
+    for z in sorted(zeros, key=abs):
+        i = int(np.argmin([abs(z - p) for p in remaining]))
+        paired.append(remaining.pop(i))
+    return np.array(paired + remaining, dtype=complex)
+
+
+class TransferFunctionEvaluator:
+    """
+    Precomputed pole-residue or factored form of a proper SISO system.
+
+    sys is a ct.TransferFunction, a ct.StateSpace or a (num, den) tuple.  form is
+    'residue', 'zpk' or 'auto' (residues when all poles are simple and well separated and
+    the partial fractions agree with the factored form to tol).  The factored form is only as
+    accurate as the poles: for high-order systems pass a StateSpace realization, whose poles
+    are eigenvalues, rather than polynomial coefficients.  Frequency responses and margins
+    are memoized for the last cache_size frequency grids.
+    """
+
+    def __init__(self, sys, form='auto', cache_size=32, separation=1e-3, tol=1e-9):
+        if isinstance(sys, tuple):
+            sys = ct.tf(*sys)
+        if sys.ninputs != 1 or sys.noutputs != 1:
+            raise ValueError("only SISO systems can be evaluated")
+        self.poles = np.asarray(ct.poles(sys), dtype=complex)
+        self.zeros = np.asarray(ct.zeros(sys), dtype=complex)
+        if len(self.zeros) > len(self.poles):
+            raise ValueError("the transfer function must be proper")
+
+        # the gain k of the factored form, matched to the system at a point away from
+        # its poles and zeros
+        s0 = 1j * (1 + 2 * max(np.max(np.abs(self.poles), initial=0), np.max(np.abs(self.zeros), initial=0)))
+        self.poles = _pair_zeros_with_poles(self.zeros, self.poles)
+        self.gain = complex(sys(s0)) / self._factors(np.array(s0))
+        self.gain = self.gain.real if abs(self.gain.imag) <= 1e-9 * abs(self.gain) else self.gain
+        # direct feedthrough G(inf)
+        self.d = self.gain if len(self.zeros) == len(self.poles) else 0.0
+
+        if form not in ('residue', 'zpk', 'auto'):
+            raise ValueError(f"unknown form '{form}', use 'residue', 'zpk' or 'auto'")
+        n = len(self.poles)
+        gaps = np.abs(self.poles[:, None] - self.poles[None, :]) + np.diag(np.full(n, np.inf))
+        scale = max(1.0, np.max(np.abs(self.poles), initial=0))
+        if n and np.min(gaps) <= separation * scale:
+            form = 'zpk'  # (nearly) repeated poles have no stable partial fractions
+        if form != 'zpk':
+            # r_i = k prod_j (p_i - z_j) / prod_{j != i} (p_i - p_j)
+            diff = self.poles[:, None] - self.poles[None, :]
+            np.fill_diagonal(diff, 1)
+            self.residues = self.gain * np.prod(self.poles[:, None] - self.zeros[None, :], axis=1) \
+                / np.prod(diff, axis=1)
+        if form == 'auto':
+            # partial fractions cancel near lightly damped resonances when the residues are
+            # large; keep the residue form only where it agrees with the factored form
+            corners = np.abs(self.poles[self.poles != 0])
+            s = 1j * np.concatenate([corners, np.geomspace(corners.min() / 10, corners.max() * 10, 200)]) \
+                if len(corners) else np.array([1j])
+            self.form = 'zpk'
+            G_zpk = self(s)
+            self.form = 'residue'
+            form = 'residue' if np.max(np.abs(self(s) - G_zpk) / np.abs(G_zpk)) < tol else 'zpk'
+        self.form = form
+        self.cache = LRUCache(cache_size)
+        self._default_omega = None
+
+    @property
+    def order(self):
+        return len(self.poles)
+
+    def _factors(self, s):
+        s = s[..., None]
+        nz = len(self.zeros)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.prod((s - self.zeros) / (s - self.poles[:nz]), axis=-1) \
+                * np.prod(1 / (s - self.poles[nz:]), axis=-1)
+
+    def __call__(self, s):
+        """G(s) at the complex array s (same shape)."""
+        s = np.asarray(s, dtype=complex)
+        if self.form == 'residue':
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return self.d + np.sum(self.residues / (s[..., None] - self.poles), axis=-1)
+        return self.gain * self._factors(s)
+
+    def _memoized(self, kind, omega, compute):
+        key = (kind, array_key(omega))
+        result = self.cache.get(key)
+        if result is None:
+            result = compute(omega)
+            self.cache.put(key, result)
+        return result
+
+    def _read_only(self, *arrays):
+        for a in arrays:
+            a.setflags(write=False)
+        return arrays if len(arrays) > 1 else arrays[0]
+
+    def frequency_response(self, omega):
+        """G(j omega) as a read-only array, memoized per frequency grid."""
+        omega = np.asarray(omega, dtype=float)
+        return self._memoized('response', omega, lambda w: self._read_only(self(1j * w)))
+
+    def bode(self, omega):
+        """Magnitude, phase (rad, unwrapped) and omega, as ct.frequency_response."""
+        omega = np.asarray(omega, dtype=float)
+
+        def compute(w):
+            H = self.frequency_response(w)
+            return self._read_only(np.abs(H), np.unwrap(np.angle(H)), w.copy())
+        return self._memoized('bode', omega, compute)
+
+    def dcgain(self):
+        if np.any(self.poles == 0):
+            return np.inf
+        return self(np.array(0.0)).real
+
+    def default_omega(self, n=2000):
+        """Log-spaced grid two decades beyond the poles and zeros (built once)."""
+        if self._default_omega is None or len(self._default_omega) != n:
+            corners = np.abs(np.concatenate([self.poles, self.zeros]))
+            corners = corners[corners > 0]
+            lo, hi = (corners.min(), corners.max()) if len(corners) else (1.0, 1.0)
+            self._default_omega = self._read_only(np.logspace(np.log10(lo) - 2, np.log10(hi) + 2, n))
+        return self._default_omega
+
+    def margin(self, omega=None):
+        """
+        Gain margin, phase margin (deg) and their crossover frequencies, as ct.margin.
+
+        Crossovers are bracketed on the (cached) grid and refined with secant steps.
+        """
+        omega = self.default_omega() if omega is None else np.asarray(omega, dtype=float)
+        return self._memoized('margin', omega, self._margin)
+
+    def _margin(self, omega):
+        G = self.frequency_response(omega)
+        log_w = np.log(omega)
+
+        def refine(f, i):
+            # secant steps on f(log w), all brackets [i, i + 1] at once
+            x0, x1 = log_w[i], log_w[i + 1]
+            f0, f1 = f(x0), f(x1)
+            for _ in range(6):
+                step = np.where(f1 != f0, f1 * (x1 - x0) / np.where(f1 != f0, f1 - f0, 1), 0)
+                x0, f0, x1 = x1, f1, x1 - step
+                f1 = f(x1)
+            return np.exp(x1)
+
+        wc = refine(lambda x: np.log(np.abs(self(1j * np.exp(x)))),
+                    np.flatnonzero(np.diff(np.sign(np.log(np.abs(G)))) != 0))
+        w180 = refine(lambda x: self(1j * np.exp(x)).imag,
+                      np.flatnonzero((np.diff(np.sign(G.imag)) != 0) & (G.real[:-1] + G.real[1:] < 0)))
+        G0 = self(np.array(0.0))
+        if np.isfinite(G0) and G0.real < 0:
+            w180 = np.append(w180, 0.0)  # the phase is -180 deg at zero frequency
+
+        gm, wpc = np.inf, np.nan
+        if len(w180):
+            margins = 1 / np.abs(self(1j * w180))
+            i = np.argmin(np.abs(np.log(margins)))
+            gm, wpc = margins[i], w180[i]
+        pm, wgc = np.inf, np.nan
+        if len(wc):
+            margins = np.remainder(np.angle(self(1j * wc), deg=True), 360) - 180
+            i = np.argmin(np.abs(margins))
+            pm, wgc = margins[i], wc[i]
+        return gm, pm, wpc, wgc
+
+
+# === Evaluators shared across analyses ===
+_evaluators = LRUCache(maxsize=64)
+
+
+def evaluator(sys, form='auto'):
+    """
+    The (cached) evaluator of sys.  Equal transfer functions (up to scaling) share one
+    evaluator; a StateSpace model is keyed on its own matrices, so that its eigenvalue-based
+    poles are not mixed with those of the equivalent transfer function.
+    """
+    if isinstance(sys, ct.StateSpace):
+        key = ('ss',) + tuple(array_key(np.asarray(M, dtype=float)) for M in (sys.A, sys.B, sys.C, sys.D)) + (form,)
+    else:
+        sys = ct.tf(*sys) if isinstance(sys, tuple) else ct.tf(sys)
+        num, den = np.asarray(sys.num[0][0], dtype=float), np.asarray(sys.den[0][0], dtype=float)
+        key = ('tf', array_key(num / den[0]), array_key(den / den[0]), form)
+    ev = _evaluators.get(key)
+    if ev is None:
+        ev = TransferFunctionEvaluator(sys, form)
+        _evaluators.put(key, ev)
+    return ev
+
+
+if __name__ == '__main__':
+
+    # === 1. Systems from tf_poles_zeros_bode_plot.py and margins.py ===
+    omega_w = 2
+    systems = {
+        "Stable First-Order": ct.tf([1], [1, 1]),
+        "Unstable First-Order": ct.tf([1], [1, -1]),
+        "Underdamped Second-Order": ct.tf([1], [1, 2 * 0.3 * omega_w, omega_w**2]),
+        "Critically Damped": ct.tf([1], [1, 2 * omega_w, omega_w**2]),
+        "Overdamped": ct.tf([1], [1, 2 * 2.0 * omega_w, omega_w**2]),
+        "High-Gain System": ct.tf([10], [1, 2, 1]),
+        "Third-Order Loop": ct.tf([10], [1, 6, 5, 0]),
+    }
+    omega = np.logspace(-2, 2, 1000)
+    print(f"{'system':26s} {'form':8s} {'max rel. error':>14s} {'ct.margin (GM, PM)':>22s} "
+          f"{'evaluator':>20s}")
+    for label, G in systems.items():
+        ev = evaluator(G)
+        ref = ct.frequency_response(G, omega)
+        H_ref = ref.magnitude * np.exp(1j * ref.phase)
+        err = np.max(np.abs(ev.frequency_response(omega) - H_ref) / np.abs(H_ref))
+        gm_ref, pm_ref, _, _ = ct.margin(G)
+        gm, pm, _, _ = ev.margin()
+        print(f"{label:26s} {ev.form:8s} {err:14.1e} {gm_ref:10.4g} {pm_ref:10.4g}   {gm:10.4g} {pm:9.4g}")
+
+    # === 2. A lightly damped high-order resonance ===
+    # 20 structural modes in series; the exact response is the product of the sections
+    modes = np.linspace(1, 20, 20)
+    zeta_flex = 0.002
+    sections = [ct.ss(ct.tf([w**2], [1, 2 * zeta_flex * w, w**2])) for w in modes]
+    G_flex_ss = sections[0]
+    for sec in sections[1:]:
+        G_flex_ss = ct.series(G_flex_ss, sec)
+    den_flex = np.array([1.0])
+    for w in modes:
+        den_flex = np.polymul(den_flex, [1, 2 * zeta_flex * w, w**2])
+    G_flex = ct.tf([np.prod(modes**2)], den_flex)
+
+    omega_flex = np.logspace(-1, 1.6, 20000)
+    s = 1j * omega_flex
+    H_exact = np.prod([w**2 / (s**2 + 2 * zeta_flex * w * s + w**2) for w in modes], axis=0)
+    H_poly = np.polyval(G_flex.num[0][0], s) / np.polyval(G_flex.den[0][0], s)
+    ev_flex = TransferFunctionEvaluator(G_flex_ss)
+    rel = lambda H: np.max(np.abs(H - H_exact) / np.abs(H_exact))
+    print(f"\nOrder-{2 * len(modes)} flexible structure (zeta = {zeta_flex}), max relative error:")
+    print(f"  polynomial num/den                       {rel(H_poly):.1e}")
+    print(f"  factored, poles from the polynomial      {rel(TransferFunctionEvaluator(G_flex, 'zpk')(s)):.1e}")
+    print(f"  {ev_flex.form + ', poles from the state space':40s} {rel(ev_flex(s)):.1e}")
+
+    # === 3. Repeated analyses of one loop ===
+    G = systems["Third-Order Loop"]
+    n_repeat = 20
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        ct.frequency_response(G, omega)   # Bode
+        ct.frequency_response(G, omega)   # Nyquist
+        ct.margin(G)
+        ct.dcgain(G)
+    t_ct = (time.perf_counter() - start) / n_repeat
+
+    def analyses():
+        ev = evaluator(G)
+        ev.bode(omega)
+        ev.frequency_response(omega)
+        ev.margin()
+        ev.dcgain()
+        return ev
+
+    _evaluators.data.clear()
+    start = time.perf_counter()
+    analyses()
+    t_first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n_repeat):
+        ev = analyses()
+    t_ev = (time.perf_counter() - start) / n_repeat
+    print(f"\nBode + Nyquist + margin + dcgain of one loop: python-control {1e3 * t_ct:.2f} ms, "
+          f"evaluator {1e3 * t_first:.2f} ms first, {1e3 * t_ev:.3f} ms repeated ({t_ct / t_ev:.0f}x)")
+    print(f"Frequency response cache: {ev.cache.hits} hits, {ev.cache.misses} misses")
+
+    # === 4. Bode magnitude of the flexible structure ===
+    plt.figure()
+    plt.semilogx(omega_flex, 20 * np.log10(np.abs(H_poly)), label='polynomial num/den')
+    plt.semilogx(omega_flex, 20 * np.log10(np.abs(ev_flex(s))), '--', label=f'{ev_flex.form} evaluator')
+    plt.title(f"Order-{2 * len(modes)} Lightly Damped Structure")
+    plt.xlabel("Frequency (rad/s)")
+    plt.ylabel("Magnitude (dB)")
+    plt.grid()
+    plt.legend()
+
+    if "CONTROL_PLOT_DIR" in os.environ:
+        plt.savefig(os.path.join(os.environ["CONTROL_PLOT_DIR"], "tf_evaluator_flexible_bode.pdf"))
+    else:
+        plt.show()